@@ -0,0 +1,405 @@
+"""
+An asyncio engine for the tracking core
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from coalescer import SessionCoalescer
+from metrics import METRICS
+from sampler import AdaptivePoller
+
+if TYPE_CHECKING:
+    from tracker import Tracker
+
+_TICK_TIME = METRICS.histogram(
+    "scan_tick_seconds", "Time spent sampling and handling the sample per scan tick"
+)
+_EXECUTOR_WAIT = METRICS.histogram(
+    "engine_executor_wait_seconds", "Time a blocking call waited for a free executor slot"
+)
+
+
+class AsyncEngine:
+    """
+    Runs the tracking core as tasks on one asyncio event loop: sampling the
+    active window, coalescing the changes into sessions, writing the sessions
+    and writing metrics snapshots. Blocking calls, the window backend and
+    SQLite, run on a small thread pool, and at most max_pending of them wait
+    for it at a time.
+
+    The loop either runs on its own with run(), or inside Tk: attach() runs
+    every callback that is ready from window.after() every interval
+    milliseconds, so the tasks and the widgets share the Tk thread. More
+    producers, idle detection or a local API for example, are added as tasks
+    with spawn() instead of as more threads.
+
+        Example
+        -------
+            >>> engine = AsyncEngine(tracker)
+            >>> engine.attach(window)
+            >>> engine.start_scan()
+            >>> engine.pause_scan()
+            >>> engine.close()
+
+        Methods
+        --------
+            >>> run(should_continue): Scan until should_continue() is False, headless
+            >>> attach(window, interval): Run the loop from Tk's after()
+            >>> start_scan(): Start sampling the active window
+            >>> pause_scan(): Close the open session and stop sampling
+            >>> push(value): Report a new window from a producer
+            >>> spawn(producer): Run a producer as a task on the loop
+            >>> run_blocking(function, *args): Await a blocking call on the executor
+            >>> close(): Close the open session, write everything and stop
+            >>> stats(): Get the engine counters
+    """
+
+    _NOTHING = object()
+
+    def __init__(
+        self,
+        tracker: Tracker,
+        max_workers: int = 2,
+        max_pending: int = 4,
+        max_batch: int = 100,
+        max_age: float = 5.0,
+        max_stop_latency: float = 1.0,
+        poller: AdaptivePoller = None,
+        metrics_snapshot: str = None,
+        metrics_interval: float = 60.0,
+    ) -> None:
+        """
+        Create the engine and its event loop
+
+            Parameters:
+                tracker (Tracker): Provides the window source, writer and
+                    journal, created with engine="async"
+                max_workers (int): The number of threads for blocking calls
+                max_pending (int): The maximum number of blocking calls waiting
+                    for or running on the threads
+                max_batch (int): The maximum number of sessions per write
+                max_age (float): The maximum number of seconds a session waits
+                    for more to write with it, like BufferedWriter.max_age
+                max_stop_latency (float): The maximum number of seconds
+                    pause_scan() waits for a sample before closing the session
+                poller (AdaptivePoller): Decides the interval between samples
+                metrics_snapshot (str): Write a JSON metrics snapshot to this file
+                metrics_interval (float): The seconds between metrics snapshots
+        """
+        self.tracker = tracker
+        self.max_batch = max_batch
+        self.max_age = max_age
+        self.max_stop_latency = max_stop_latency
+        self.poller = poller or AdaptivePoller()
+        self.metrics_snapshot = metrics_snapshot
+        self.metrics_interval = metrics_interval
+
+        self.loop = asyncio.new_event_loop()
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="AsyncEngine")
+        self._slots = asyncio.Semaphore(max_pending)
+        self._sessions = asyncio.Queue()
+        self._wake = asyncio.Event()
+        self._stopped = asyncio.Event()
+        # Set by a pause or close, the sessions queued so far are written
+        # without waiting for max_age
+        self._flush = asyncio.Event()
+
+        self._pushed = self._NOTHING
+        self._producers = []
+        self._tasks = []
+        self._scan_task = None
+        self._scanning = False
+        self._stop_time = None
+        self._window = None
+        self._after_id = None
+        self.coalescer = None
+
+        self.ticks = 0
+        self.rows_written = 0
+        self.writes = 0
+        self.forced_stops = 0
+
+    async def run_blocking(self, function: callable, *args):
+        """
+        Run a blocking call on the executor, waiting for a free slot first
+
+            Parameters:
+                function (callable): The blocking call
+                *args: The arguments of the call
+
+            Returns:
+                The result of the call
+        """
+        started = time.perf_counter()
+        async with self._slots:
+            _EXECUTOR_WAIT.observe(time.perf_counter() - started)
+            return await self.loop.run_in_executor(self._pool, function, *args)
+
+    def spawn(self, producer: callable) -> None:
+        """
+        Run a producer as a task on the loop, it is cancelled by close()
+
+            Parameters:
+                producer (callable): Called with the engine, returns the
+                    coroutine to run
+        """
+        self._producers.append(producer)
+        if self._tasks:
+            self._tasks.append(self.loop.create_task(producer(self)))
+
+    def push(self, value) -> None:
+        """
+        Report a new window from a producer running on the loop, used
+        instead of sampling the backend at the next tick
+
+            Parameters:
+                value (tuple): The (application, window name) of the window,
+                    or None for a gap
+        """
+        self._pushed = value
+        self._wake.set()
+
+    def _open(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [self.loop.create_task(self._persist())]
+        if self.metrics_snapshot:
+            self._tasks.append(self.loop.create_task(self._snapshots()))
+        self._tasks.extend(
+            self.loop.create_task(producer(self)) for producer in self._producers
+        )
+
+    def start_scan(self) -> None:
+        """
+        Start sampling the active window, call this from the loop's thread
+        """
+        self._open()
+        if self._scan_task is None or self._scan_task.done():
+            self._scanning = True
+            self._stop_time = None
+            self._scan_task = self.loop.create_task(self._scan())
+
+    def pause_scan(self) -> bool:
+        """
+        Close the open session and stop sampling, call this from the loop's
+        thread while the loop is not running, a Tk callback for example.
+        Returns within max_stop_latency seconds
+
+            Returns:
+                bool: False if a sample was still running and was abandoned
+        """
+        if self._scan_task is None:
+            return True
+        return self.loop.run_until_complete(self._pause())
+
+    async def _pause(self) -> bool:
+        self._stop_time = time.time()
+        self._scanning = False
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._scan_task, self.max_stop_latency)
+        except asyncio.TimeoutError:
+            # wait_for cancelled the scan, which closed the session as of
+            # the pause
+            self.forced_stops += 1
+            return False
+        finally:
+            self._scan_task = None
+            self._flush.set()
+        return True
+
+    async def _scan(self) -> None:
+        def on_open(window_name, start_time):
+            if window_name is None:
+                self.tracker.journal.clear()
+            else:
+                self.tracker.journal.begin(window_name, start_time)
+            self.tracker.totals.open(window_name, start_time)
+
+        self.coalescer = coalescer = SessionCoalescer(
+            self._emit, self.tracker.min_dwell, on_open
+        )
+        self.poller.reset()
+        current = self._NOTHING
+        try:
+            while self._scanning:
+                self.ticks += 1
+                tick_started = time.perf_counter()
+                value, self._pushed = self._pushed, self._NOTHING
+                if value is self._NOTHING:
+                    value = await self.run_blocking(self.tracker.current_window)
+                if not self._scanning:
+                    break
+                now = time.time()
+                changed = value != current
+                if changed:
+                    current = value
+                    owner_name, window_name = value or (None, None)
+                    coalescer.change(window_name, now, owner_name)
+                coalescer.tick(now)
+                self.tracker.journal.heartbeat(now)
+                _TICK_TIME.observe(time.perf_counter() - tick_started)
+
+                try:
+                    await asyncio.wait_for(
+                        self._wake.wait(), self.poller.next_interval(changed)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            coalescer.close(self._stop_time or time.time())
+            self.tracker.journal.clear()
+
+    def _emit(self, application_name: str, start_time: float, end_time: float) -> None:
+        record = self.tracker.to_record(application_name, start_time, end_time)
+        if record is None:
+            return
+        self.tracker.hold_closed(record)
+        self._sessions.put_nowait(record)
+        if application_name is not None:
+            self.tracker.totals.add(application_name, start_time, end_time)
+
+    async def _persist(self) -> None:
+        while True:
+            batch = [await self._sessions.get()]
+            deadline = self.loop.time() + self.max_age
+            while len(batch) < self.max_batch:
+                if not self._sessions.empty():
+                    batch.append(self._sessions.get_nowait())
+                    continue
+                remaining = deadline - self.loop.time()
+                if remaining <= 0 or self._flush.is_set():
+                    break
+                record = await self._next_session(remaining)
+                if record is self._NOTHING:
+                    break
+                batch.append(record)
+            if self._sessions.empty():
+                self._flush.clear()
+            try:
+                await self.run_blocking(self._write, batch)
+            except Exception:  # pylint: disable=broad-except
+                # Keep writing the sessions after the failed batch
+                traceback.print_exc()
+            finally:
+                for _ in batch:
+                    self._sessions.task_done()
+
+    async def _next_session(self, timeout: float):
+        # The next queued session, or _NOTHING after timeout seconds or a
+        # flush. A cancelled get() leaves its session on the queue
+        get = self.loop.create_task(self._sessions.get())
+        flush = self.loop.create_task(self._flush.wait())
+        await asyncio.wait((get, flush), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        flush.cancel()
+        if not get.done():
+            get.cancel()
+        await asyncio.gather(get, flush, return_exceptions=True)
+        return self._NOTHING if get.cancelled() else get.result()
+
+    def _write(self, batch: list) -> None:
+        # The writer's batch write, without its thread: the batch shares one
+        # transaction and a failing database is logged and the batch dropped
+        if self.tracker.writer.write(batch):
+            self.rows_written += sum(1 for record in batch if record[0] is not None)
+            self.writes += 1
+
+    async def _snapshots(self) -> None:
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            await self.run_blocking(METRICS.write_snapshot, self.metrics_snapshot)
+
+    def attach(self, window, interval: int = 20) -> None:
+        """
+        Run the loop from Tk: every interval milliseconds the callbacks that
+        are ready run on the Tk thread
+
+            Parameters:
+                window (tk.Misc): The widget whose after() runs the loop
+                interval (int): The milliseconds between runs of the loop
+        """
+        self._window = window
+        self._open()
+
+        def pump():
+            self._run_ready()
+            self._after_id = window.after(interval, pump)
+
+        self._after_id = window.after(interval, pump)
+
+    def _run_ready(self) -> None:
+        # Stops after one pass over the callbacks that are ready now
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+    def run(self, should_continue: callable = None, poll_interval: float = 0.2) -> None:
+        """
+        Scan until should_continue() is False, running the loop on this thread
+
+            Parameters:
+                should_continue (callable): Checked every poll_interval
+                    seconds, by default the scan runs until close()
+                poll_interval (float): The seconds between checks
+        """
+
+        async def main():
+            self.start_scan()
+            while should_continue is None or should_continue():
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), poll_interval)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+
+        self.loop.run_until_complete(main())
+
+    def close(self) -> None:
+        """
+        Close the open session, write every session still queued, cancel
+        the producers and close the loop. Call this from the loop's thread
+        while the loop is not running
+        """
+        if self.loop.is_closed():
+            return
+        if self._window is not None and self._after_id is not None:
+            self._window.after_cancel(self._after_id)
+            self._after_id = None
+        self._stopped.set()
+        self.pause_scan()
+        self.loop.run_until_complete(self._close())
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.loop.close()
+
+    async def _close(self) -> None:
+        if self._tasks:
+            self._flush.set()
+            await self._sessions.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.metrics_snapshot:
+            await self.run_blocking(METRICS.write_snapshot, self.metrics_snapshot)
+
+    def stats(self) -> dict:
+        """
+        Get the engine counters
+
+            Returns:
+                dict: The ticks, rows written, writes, sessions still queued
+                    and forced stops
+        """
+        return {
+            "ticks": self.ticks,
+            "rows_written": self.rows_written,
+            "writes": self.writes,
+            "queued": self._sessions.qsize(),
+            "forced_stops": self.forced_stops,
+        }
@@ -0,0 +1,88 @@
+"""
+Benchmark for merging many databases into one
+
+Generates source databases that overlap in time, as if the same person used
+several machines at once, then merges them and prints the staging and
+import throughput as JSON.
+
+Usage:
+    python -m benchmarks.bench_merge --sources 8 --rows 250000 --policy trim
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from db import Database
+from merge import merge_databases
+
+
+def make_source(path: str, rows: int, seed: int) -> None:
+    """
+    Create a source database with back to back sessions
+
+        Parameters:
+            path (str): The database to create
+            rows (int): The number of sessions
+            seed (int): The random seed, also offsets the start of the sessions
+    """
+    generator = random.Random(seed)
+    now = 1600000000 + seed * 7
+    sessions = []
+    for _ in range(rows):
+        duration = generator.randrange(1, 60)
+        sessions.append((f"App {generator.randrange(200)}", now, now + duration))
+        now += duration + generator.randrange(0, 5)
+    with Database(path) as database:
+        database.add_many(sessions)
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sources", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=100000, help="sessions per source")
+    parser.add_argument("--policy", choices=Database.MERGE_POLICIES, default="trim")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sources = [os.path.join(directory, f"source-{index}.db") for index in range(args.sources)]
+        for index, source in enumerate(sources):
+            make_source(source, args.rows, index)
+
+        first_result = []
+        with Database(os.path.join(directory, "target.db")) as database:
+            started = time.perf_counter()
+            results = merge_databases(
+                database,
+                sources,
+                args.policy,
+                args.workers,
+                on_progress=lambda _: first_result.append(time.perf_counter() - started),
+            )
+            elapsed = time.perf_counter() - started
+
+    rows_read = sum(result["rows_read"] for result in results)
+    print(
+        json.dumps(
+            {
+                "parameters": vars(args),
+                "seconds": elapsed,
+                "first_source_seconds": first_result[0],
+                "rows_read": rows_read,
+                "rows_imported": sum(result["rows_imported"] for result in results),
+                "rows_per_second": rows_read / elapsed if elapsed else 0.0,
+            },
+            indent=4,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
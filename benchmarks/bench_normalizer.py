@@ -0,0 +1,50 @@
+"""
+Micro-benchmark for the title normalizer
+
+Compares the cost of normalizing a title that is already cached with the
+cost of running the combined rule pattern on a title seen for the first time.
+
+Usage:
+    python -m benchmarks.bench_normalizer [--iterations N]
+"""
+
+import argparse
+import timeit
+
+from normalizer import TitleNormalizer
+
+TITLES = [
+    ("Safari", "Pull requests · Birdey/timetracker - Safari"),
+    ("Google Chrome", "Inbox (3) - Gmail - Google Chrome"),
+    ("Code", "time_tracker.py — timetracker"),
+    ("iTerm2", "python main.py"),
+    ("Finder", "Downloads"),
+]
+
+
+def main():
+    """
+    Run the benchmark and print the time per call
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    normalizer = TitleNormalizer.for_backend("darwin")
+    uncached = normalizer._normalize  # pylint: disable=protected-access
+
+    def run(function):
+        for application, window in TITLES:
+            function(application, window)
+
+    calls = args.iterations * len(TITLES)
+    cached_time = timeit.timeit(lambda: run(normalizer.normalize), number=args.iterations)
+    uncached_time = timeit.timeit(lambda: run(uncached), number=args.iterations)
+
+    print(f"cached:   {cached_time / calls * 1e9:8.1f} ns/call")
+    print(f"uncached: {uncached_time / calls * 1e9:8.1f} ns/call")
+    print(normalizer.cache_info())
+
+
+if __name__ == "__main__":
+    main()
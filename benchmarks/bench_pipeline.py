@@ -0,0 +1,318 @@
+"""
+Load generation and benchmark for the tracking pipeline
+
+Drives Tracker.start_scan -> report -> Database with a deterministic
+synthetic focus trace on top of a database prefilled to a given size, and
+writes write throughput, per-tick latency, stats query latency and peak RSS
+as JSON. Passing --compare with an earlier result fails the run when any
+latency got slower than the allowed ratio.
+
+Usage:
+    python -m benchmarks.bench_pipeline --rows 100000 --switches 5000 --output result.json
+    python -m benchmarks.bench_pipeline --rows 100000 --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from db import Database
+from metrics import METRICS
+from sampler import AdaptivePoller
+from tracker import Tracker
+from window_info_graber import SyntheticWindowSource, WindowInfoGetter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+APPLICATIONS = [
+    ("Safari", "Docs"),
+    ("Google Chrome", "Inbox"),
+    ("Code", "Visual Studio Code"),
+    ("iTerm2", "Terminal"),
+    ("Slack", "general"),
+    ("Mail", "Inbox"),
+]
+
+# Day the generated history ends on, so runs are comparable between versions
+END_DAY = 1625097600  # 2021-07-01 00:00 UTC
+
+# Scan measurements checked by --compare, along with every query latency.
+# Larger is worse for all of them.
+COMPARED_KEYS = ["tick_latency_p50", "tick_latency_p99", "write_seconds"]
+
+
+def make_trace(switches: int, switch_rate: float, titles: int, seed: int) -> list:
+    """
+    Generate a deterministic focus trace
+
+        Parameters:
+            switches (int): The number of window switches
+            switch_rate (float): The average number of switches per trace second
+            titles (int): The number of distinct window titles per application
+            seed (int): The random seed
+
+        Returns:
+            list[tuple]: The (seconds, application, window) trace
+    """
+    generator = random.Random(seed)
+    trace = []
+    for _ in range(switches):
+        application, window = generator.choice(APPLICATIONS)
+        title = f"{window} {generator.randrange(titles)}"
+        trace.append((generator.expovariate(switch_rate), application, title))
+    return trace
+
+
+def prefill(database: Database, rows: int, seed: int, chunk_size: int = 50000) -> None:
+    """
+    Fill the database with historic sessions
+
+        Parameters:
+            database (Database): The database to fill
+            rows (int): The number of sessions
+            seed (int): The random seed
+            chunk_size (int): The number of sessions per transaction
+    """
+    generator = random.Random(seed)
+    now = END_DAY - rows * 30
+    written = 0
+    while written < rows:
+        chunk = []
+        for _ in range(min(chunk_size, rows - written)):
+            _, window = generator.choice(APPLICATIONS)
+            duration = generator.randrange(1, 60)
+            chunk.append((f"{window} {generator.randrange(50)}", now, now + duration))
+            now += duration
+        database.add_many(chunk)
+        written += len(chunk)
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Get a percentile of a list of values
+
+        Parameters:
+            values (list[float]): The values
+            fraction (float): The percentile between 0 and 1
+
+        Returns:
+            float: The value at the percentile
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def peak_rss_bytes() -> int:
+    """
+    Get the peak resident set size of this process
+
+        Returns:
+            int: The peak RSS in bytes, or 0 where it can not be measured
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_scan(tracker: Tracker, trace: list, tick_seconds: float) -> dict:
+    """
+    Run the scanner over a trace using a clock that advances one tick per sample
+
+        Parameters:
+            tracker (Tracker): The tracker to drive
+            trace (list[tuple]): The focus trace
+            tick_seconds (float): How much trace time passes per sample
+
+        Returns:
+            dict: The scan measurements
+    """
+    ticks = [0]
+    tick_latencies = []
+    last_tick = [None]
+    source = SyntheticWindowSource(trace, clock=lambda: ticks[0] * tick_seconds)
+
+    def sample():
+        now = time.perf_counter()
+        if last_tick[0] is not None:
+            tick_latencies.append(now - last_tick[0])
+        last_tick[0] = now
+        ticks[0] += 1
+        if source.finished():
+            tracker.scanning = False
+        return source()
+
+    WindowInfoGetter.use_backend(sample)
+    tracker.sampler.poller = AdaptivePoller(0, 0)
+    rows_before = tracker.writer.rows_written
+
+    started = time.perf_counter()
+    tracker.scanning = True
+    tracker.start_scan()
+    tracker.writer.flush()
+    elapsed = time.perf_counter() - started
+
+    sessions = tracker.writer.rows_written - rows_before
+    return {
+        "ticks": ticks[0],
+        "sessions_written": sessions,
+        "write_seconds": elapsed,
+        "write_throughput": sessions / elapsed if elapsed else 0.0,
+        "tick_latency_mean": statistics.fmean(tick_latencies) if tick_latencies else 0.0,
+        "tick_latency_p50": percentile(tick_latencies, 0.5),
+        "tick_latency_p99": percentile(tick_latencies, 0.99),
+        "tick_latency_max": max(tick_latencies, default=0.0),
+        "writer": tracker.writer.stats(),
+        "sampler": tracker.sampler.stats(),
+        "coalescer": tracker.coalescer.stats(),
+    }
+
+
+def time_queries(database: Database, repeat: int) -> dict:
+    """
+    Time the queries behind the stats window
+
+        Parameters:
+            database (Database): The database to query
+            repeat (int): The number of runs per query, the best one is kept
+
+        Returns:
+            dict: The best latency per query in seconds, and the latency of
+                the first run, before the result cache holds the result
+    """
+    queries = {
+        "app_summary": database.app_summary,
+        "total_time_spent": database.total_time_spent,
+        "total_time_spent_on_app": lambda: database.total_time_spent_on_app("Docs 1"),
+        "total_time_spent_on_app_for_dates": lambda: (
+            database.total_time_spent_on_app_for_dates("Docs 1", "2021-01-01", "2021-06-30")
+        ),
+        "total_time_spent_on_app_for_week": lambda: (
+            database.total_time_spent_on_app_for_week("Docs 1", "2021-06-28")
+        ),
+    }
+    latencies = {}
+    for name, query in queries.items():
+        best = None
+        for run in range(repeat):
+            started = time.perf_counter()
+            query()
+            elapsed = time.perf_counter() - started
+            if run == 0:
+                latencies[f"{name}_cold"] = elapsed
+            best = elapsed if best is None else min(best, elapsed)
+        latencies[name] = best
+    return latencies
+
+
+def compare(result: dict, baseline: dict, max_ratio: float) -> list:
+    """
+    Compare a result with a baseline
+
+        Parameters:
+            result (dict): The new result
+            baseline (dict): The earlier result
+            max_ratio (float): How many times slower a value may get
+
+        Returns:
+            list[str]: A description of every regression
+    """
+    regressions = []
+    pairs = [(key, result["scan"][key], baseline["scan"][key]) for key in COMPARED_KEYS]
+    pairs += [
+        (f"query {name}", value, baseline["queries"][name])
+        for name, value in result["queries"].items()
+        if name in baseline["queries"]
+    ]
+    for name, new, old in pairs:
+        if old and new / old > max_ratio:
+            regressions.append(f"{name}: {old:.6f}s -> {new:.6f}s ({new / old:.2f}x)")
+    return regressions
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000, help="historic sessions")
+    parser.add_argument("--switches", type=int, default=2000, help="switches to replay")
+    parser.add_argument(
+        "--switch-rate", type=float, default=0.2, help="switches per trace second"
+    )
+    parser.add_argument("--titles", type=int, default=50, help="titles per application")
+    parser.add_argument(
+        "--tick", type=float, default=0.1, help="trace seconds per scanner tick"
+    )
+    parser.add_argument(
+        "--min-dwell",
+        type=float,
+        default=0.0,
+        help="coalescing threshold in wall clock seconds, the trace runs much "
+        "faster than real time so the default leaves coalescing off",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the result as JSON to this file")
+    parser.add_argument("--compare", help="an earlier JSON result to compare against")
+    parser.add_argument(
+        "--max-ratio", type=float, default=1.5, help="allowed slowdown against --compare"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_name = os.path.join(directory, "bench.db")
+        tracker = Tracker(database_name, args.min_dwell)
+
+        started = time.perf_counter()
+        prefill(tracker.database, args.rows, args.seed)
+        prefill_seconds = time.perf_counter() - started
+
+        trace = make_trace(args.switches, args.switch_rate, args.titles, args.seed)
+        scan = run_scan(tracker, trace, args.tick)
+        queries = time_queries(tracker.database, args.repeat)
+
+        tracker.writer.stop()
+        tracker.journal.close()
+        tracker.database.close()
+        database_bytes = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+        )
+
+    result = {
+        "parameters": vars(args),
+        "python": sys.version.split()[0],
+        "prefill_seconds": prefill_seconds,
+        "database_bytes": database_bytes,
+        "scan": scan,
+        "queries": queries,
+        "metrics": METRICS.snapshot(),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+    print(json.dumps(result, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(result, output, indent=4)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            regressions = compare(result, json.load(baseline_file), args.max_ratio)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Startup time and memory of the entry points
+
+Each mode is started in a fresh interpreter that imports its entry point and
+builds the tracker against a temporary database, then reports how long that
+took and its peak RSS. The gui mode also imports tkinter and the widgets, and
+builds the root window when a display is available. The window is never
+shown, so this also runs on machines without a display. The one-shot CLI commands are timed end to end,
+interpreter startup included.
+
+--check compares the results with the budget in startup_budget.json and
+fails when any of them is over, --importtime prints the slowest imports of
+every CLI command from python -X importtime.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs N] [--output result.json] [--check]
+    python -m benchmarks.bench_startup --importtime
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET = os.path.join(ROOT, "benchmarks", "startup_budget.json")
+
+CLI_COMMANDS = {
+    "help": ["--help"],
+    "stats": ["stats", "--limit", "10"],
+    "rebuild-rollup": ["rebuild-rollup"],
+}
+
+MODES = {
+    # time_tracker imports tkinter lazily, so the child loads the widgets itself
+    "gui": (
+        "from time_tracker import TimeTracker as Tracker\n"
+        "import window_manager\n"
+        "if os.environ.get('DISPLAY') or sys.platform in ('darwin', 'win32'):\n"
+        "    window_manager.WindowManager('Time Tracker', (1080, 970)).destroy()\n"
+        "    window_built = True\n"
+    ),
+    "daemon": "import daemon\nfrom tracker import Tracker",
+}
+
+CHILD = """
+import json, os, sys, time
+started = time.perf_counter()
+window_built = False
+{imports}
+tracker = Tracker(os.path.join(sys.argv[1], "startup.db"))
+elapsed = time.perf_counter() - started
+tracker.shutdown()
+try:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if sys.platform == "darwin" else peak * 1024
+except ImportError:
+    peak = 0
+print(json.dumps({{"seconds": elapsed, "peak_rss_bytes": peak,
+                  "tkinter_loaded": "tkinter" in sys.modules,
+                  "window_built": window_built}}))
+"""
+
+
+def measure(mode: str, runs: int) -> dict:
+    """
+    Start a mode several times and summarize the measurements
+
+        Parameters:
+            mode (str): The name of the mode in MODES
+            runs (int): The number of fresh interpreters to start
+
+        Returns:
+            dict: The median startup time, peak RSS, whether tkinter was loaded
+                and whether the root window was built
+    """
+    samples = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                [sys.executable, "-c", CHILD.format(imports=MODES[mode]), directory],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "seconds": statistics.median(sample["seconds"] for sample in samples),
+        "peak_rss_bytes": statistics.median(sample["peak_rss_bytes"] for sample in samples),
+        "tkinter_loaded": samples[0]["tkinter_loaded"],
+        "window_built": samples[0]["window_built"],
+    }
+
+
+def measure_cli(arguments: list, runs: int) -> float:
+    """
+    Time a main.py command from process start to exit
+
+        Parameters:
+            arguments (list[str]): The arguments to main.py
+            runs (int): The number of runs, the median is kept
+
+        Returns:
+            float: The median wall time in seconds
+    """
+    samples = []
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(runs):
+            started = time.perf_counter()
+            subprocess.run(
+                [sys.executable, os.path.join(ROOT, "main.py"), *arguments],
+                cwd=directory,
+                capture_output=True,
+                check=True,
+            )
+            samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def slowest_imports(arguments: list, count: int = 10) -> list:
+    """
+    Get the slowest imports of a main.py command from python -X importtime
+
+        Parameters:
+            arguments (list[str]): The arguments to main.py
+            count (int): The number of imports to return
+
+        Returns:
+            list[tuple]: (module, self microseconds, cumulative microseconds)
+                for the top level imports, slowest first
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", os.path.join(ROOT, "main.py"), *arguments],
+            cwd=directory,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stderr
+
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time, cumulative, module = line[len("import time:") :].split("|")
+        if not self_time.strip().isdigit() or module.startswith("  "):
+            continue
+        imports.append((module.strip(), int(self_time), int(cumulative)))
+    return sorted(imports, key=lambda item: item[2], reverse=True)[:count]
+
+
+def over_budget(result: dict, budget: dict) -> list:
+    """
+    Compare a result with the startup budget
+
+        Parameters:
+            result (dict): The measurements
+            budget (dict): The maximum seconds per mode and per CLI command
+
+        Returns:
+            list[str]: A description of every measurement over budget
+    """
+    failures = []
+    for section in ("modes", "cli"):
+        for name, limit in budget.get(section, {}).items():
+            value = result[section][name]
+            seconds = value["seconds"] if isinstance(value, dict) else value
+            if seconds > limit:
+                failures.append(f"{section} {name}: {seconds:.3f}s > {limit:.3f}s")
+    return failures
+
+
+def main():
+    """
+    Measure every mode and print the result
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write the result as JSON to this file")
+    parser.add_argument("--check", action="store_true", help="fail when over budget")
+    parser.add_argument(
+        "--importtime", action="store_true", help="show the slowest imports"
+    )
+    args = parser.parse_args()
+
+    if args.importtime:
+        for arguments in CLI_COMMANDS.values():
+            print(f"main.py {' '.join(arguments)}")
+            for module, self_time, cumulative in slowest_imports(arguments):
+                print(f"    {cumulative / 1000:8.1f} ms {self_time / 1000:8.1f} ms  {module}")
+        return
+
+    result = {
+        "modes": {mode: measure(mode, args.runs) for mode in MODES},
+        "cli": {
+            name: measure_cli(arguments, args.runs)
+            for name, arguments in CLI_COMMANDS.items()
+        },
+    }
+    print(json.dumps(result, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(result, output, indent=4)
+
+    if args.check:
+        with open(BUDGET, encoding="utf-8") as budget_file:
+            failures = over_budget(result, json.load(budget_file))
+        for failure in failures:
+            print(f"OVER BUDGET {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Coalescing of window changes into sessions before they are stored
+"""
+
+from metrics import METRICS
+
+_FLICKERS_ABSORBED = METRICS.counter(
+    "flickers_absorbed_total", "Window changes shorter than the minimum dwell time"
+)
+_SESSIONS_MERGED = METRICS.counter(
+    "sessions_merged_total", "Sessions merged into the one before them"
+)
+
+
+class SessionCoalescer:
+    """
+    Turns the stream of window changes into sessions. A window that is left
+    again within min_dwell seconds (an alt-tab pass, a notification, a title
+    that flickers while a page loads) is not a session of its own: its time
+    goes to the session around it, and when the window before it comes back
+    the two halves become one session. Only a window with the same name
+    continues the open session, because the name is what is tracked: YouTube
+    and Gmail in the same browser are two sessions. With merge_same_owner, a
+    new title of the application that owns the open session continues it
+    under its first title instead. A gap, a span where the window is
+    unknown, is never absorbed however short it is, so it stays recorded.
+
+    The open session is only handed to emit once the window after it has
+    been active for min_dwell seconds, because until then it can still grow.
+
+        Example
+        -------
+            >>> coalescer = SessionCoalescer(writer_report, min_dwell=1.0)
+            >>> coalescer.change("Docs", 100.0)
+            >>> coalescer.change("Slack", 200.0)
+            >>> coalescer.change("Docs", 200.4)
+            >>> coalescer.close(300.0)  # emits ("Docs", 100.0, 300.0)
+
+        Methods
+        --------
+            >>> change(application, now, owner): The active window changed
+            >>> tick(now): Time passed without a change
+            >>> close(now): Emit everything, the scan stopped
+            >>> stats(): Get the coalescing counters
+    """
+
+    def __init__(
+        self,
+        emit: callable,
+        min_dwell: float = 1.0,
+        on_open: callable = None,
+        merge_same_owner: bool = False,
+    ) -> None:
+        """
+        Create the coalescer
+
+            Parameters:
+                emit (callable): Called with (application, start_time, end_time)
+                    for every finished session
+                min_dwell (float): Windows active for less than this many
+                    seconds are attributed to the session around them
+                on_open (callable): Called with (application, start_time) when a
+                    new session starts, after the one before it was emitted
+                merge_same_owner (bool): Continue the open session when the
+                    next window has another title but the same owner, off by
+                    default
+        """
+        self.emit = emit
+        self.min_dwell = min_dwell
+        self.on_open = on_open
+        self.merge_same_owner = merge_same_owner
+
+        # The session being built and the window that may replace it, as
+        # [application, start_time, owner]
+        self._session = None
+        self._candidate = None
+
+        self.changes = 0
+        self.sessions = 0
+        self.flickers = 0
+        self.merges = 0
+
+    def change(self, application: str, now: float, owner: str = None) -> None:
+        """
+        The active window changed
+
+            Parameters:
+                application (str): The name the new window is tracked under,
+                    or None for a gap
+                now (float): The unix time of the change
+                owner (str): The application that owns the window, or None
+                    if it is not known
+        """
+        self.changes += 1
+        if self._session is None:
+            self._open(application, now, owner)
+            return
+
+        if self._candidate is not None:
+            if self._settled(now):
+                self._promote()
+            else:
+                self.flickers += 1
+                _FLICKERS_ABSORBED.inc()
+                self._candidate = None
+
+        if self._continues_session(application, owner):
+            self.merges += 1
+            _SESSIONS_MERGED.inc()
+            self._candidate = None
+        else:
+            self._candidate = [application, now, owner]
+
+    def _continues_session(self, application: str, owner: str) -> bool:
+        session_application, _, session_owner = self._session
+        if application == session_application:
+            return True
+        return (
+            self.merge_same_owner
+            and application is not None
+            and session_application is not None
+            and owner is not None
+            and owner == session_owner
+        )
+
+    def _settled(self, now: float) -> bool:
+        # A gap is kept however short it is, only windows can be flickers
+        return self._candidate[0] is None or now - self._candidate[1] >= self.min_dwell
+
+    def tick(self, now: float) -> None:
+        """
+        Time passed without a change, starts the new session once it has
+        lasted min_dwell seconds
+
+            Parameters:
+                now (float): The current unix time
+        """
+        if self._candidate is not None and self._settled(now):
+            self._promote()
+
+    def close(self, now: float) -> None:
+        """
+        Emit everything, the scan stopped
+
+            Parameters:
+                now (float): The unix time the scan stopped
+        """
+        self.tick(now)
+        if self._candidate is not None:
+            self.flickers += 1
+            _FLICKERS_ABSORBED.inc()
+            self._candidate = None
+        if self._session is not None:
+            self._emit(now)
+            self._session = None
+
+    def _open(self, application: str, start_time: float, owner: str = None) -> None:
+        self._session = [application, start_time, owner]
+        if self.on_open is not None:
+            self.on_open(application, start_time)
+
+    def _emit(self, end_time: float) -> None:
+        self.sessions += 1
+        self.emit(self._session[0], self._session[1], end_time)
+
+    def _promote(self) -> None:
+        application, start_time, owner = self._candidate
+        self._candidate = None
+        self._emit(start_time)
+        self._open(application, start_time, owner)
+
+    def stats(self) -> dict:
+        """
+        Get the coalescing counters
+
+            Returns:
+                dict: The changes seen (each one used to be a row), sessions
+                    emitted, flickers absorbed, sessions merged and the
+                    fraction of writes saved
+        """
+        return {
+            "changes": self.changes,
+            "sessions": self.sessions,
+            "flickers": self.flickers,
+            "merges": self.merges,
+            "writes_saved": 1 - self.sessions / self.changes if self.changes else 0.0,
+        }
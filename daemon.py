@@ -0,0 +1,99 @@
+"""
+Headless tracking daemon
+
+Runs the scan loop without a window and without importing tkinter. SIGTERM,
+SIGINT and SIGHUP stop the scan, write the open session and everything still
+queued, and exit.
+"""
+
+import signal
+import time
+
+from metrics import METRICS
+from retention import Compactor
+from tracker import Tracker
+from window_info_graber import WindowInfoGetter
+
+# Seconds between checks for a shutdown request, bounds how long a signal
+# can wait before the shutdown starts
+SHUTDOWN_POLL_INTERVAL = 0.2
+
+
+def run_daemon(
+    database_name: str = "time_tracking.db",
+    metrics_port: int = None,
+    metrics_snapshot: str = None,
+    metrics_interval: float = 60.0,
+    keep_days: int = None,
+    min_dwell: float = 1.0,
+    engine: str = "thread",
+) -> None:
+    """
+    Track the active window until the process is signalled to stop
+
+        Parameters:
+            database_name (str): The database file to write to
+            metrics_port (int): Serve Prometheus metrics on this localhost port
+            metrics_snapshot (str): Write a JSON metrics snapshot to this file
+            metrics_interval (float): The seconds between metrics snapshots
+            keep_days (int): Compact raw sessions older than this in the
+                background, or None to keep them all
+            min_dwell (float): Windows active for less than this many seconds
+                count towards the session around them
+            engine (str): "thread" to scan on the Scanner worker, "async" to
+                scan on an AsyncEngine run on this thread
+    """
+    tracker = Tracker(database_name, min_dwell, engine)
+    if metrics_port is not None:
+        host, port = METRICS.serve(metrics_port)
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+    if metrics_snapshot and engine != "async":
+        METRICS.start_snapshots(metrics_snapshot, metrics_interval)
+    compactor = None
+    if keep_days is not None:
+        compactor = Compactor(tracker.database, keep_days)
+        compactor.start()
+    stop_requested = []
+
+    def request_stop(signum, frame):  # pylint: disable=unused-argument
+        # Only set a flag: locks must not be taken inside a signal handler
+        stop_requested.append(signum)
+
+    for name in ("SIGTERM", "SIGINT", "SIGHUP"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), request_stop)
+
+    backend = WindowInfoGetter.backend_name()
+    print(f"Tracking in the background with the {backend} backend")
+
+    try:
+        if engine == "async":
+            _run_async_engine(tracker, stop_requested, metrics_snapshot, metrics_interval)
+        else:
+            tracker.scanner.start()
+            while not stop_requested and tracker.scanner.is_scanning():
+                time.sleep(SHUTDOWN_POLL_INTERVAL)
+    finally:
+        if tracker.scanner is not None and tracker.scanner.stop():
+            print(f"Scanner stats: {tracker.scanner.stats()}")
+        if compactor is not None:
+            compactor.stop()
+        tracker.shutdown()
+        METRICS.stop()
+        print("Stopped tracking, pending sessions written")
+
+
+def _run_async_engine(
+    tracker: Tracker, stop_requested: list, metrics_snapshot: str, metrics_interval: float
+) -> None:
+    # pylint: disable=import-outside-toplevel
+    from async_engine import AsyncEngine
+
+    engine = AsyncEngine(
+        tracker, metrics_snapshot=metrics_snapshot, metrics_interval=metrics_interval
+    )
+    try:
+        engine.run(lambda: not stop_requested, SHUTDOWN_POLL_INTERVAL)
+    finally:
+        engine.close()
+        print(f"Engine stats: {engine.stats()}")
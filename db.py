@@ -7,10 +7,90 @@ Classes
 -------
 Database
     Class for interacting with the database
+Histogram
+    Time spent per application and time bucket
 """
 
-from datetime import date as Date
+from array import array
+import bisect
+from collections import OrderedDict
+from datetime import date as Date, datetime as DateTime, timedelta as TimeDelta
 import sqlite3
+import threading
+import time as _time
+
+from metrics import METRICS
+
+_WRITE_LATENCY = METRICS.histogram("db_write_seconds", "Database write latency")
+_QUERY_LATENCY = METRICS.histogram("db_query_seconds", "Database query latency")
+_SESSIONS_WRITTEN = METRICS.counter("sessions_written_total", "Sessions written")
+
+
+class Histogram:
+    """
+    Time spent per application and time bucket, as a dense row-major matrix
+
+    Attributes
+    ----------
+    >>> apps : list[str]
+        The application of every row
+
+    >>> buckets : list[str]
+        The label of every column, e.g. "2021-06-28 14", "2021-06-28",
+        "2021-W26" or "2021-06"
+
+    >>> values : array
+        The seconds per cell as a flat array("q") of len(apps) * len(buckets),
+        numpy.frombuffer(values, dtype="int64").reshape(shape) wraps it without a copy
+
+    Methods
+    -------
+    >>> add(application: str, bucket: str, seconds: int) -> None
+        Add time to a cell
+
+    >>> row(application: str) -> memoryview
+        Get the seconds per bucket for one application
+    """
+
+    def __init__(self, apps: list, buckets: list) -> None:
+        self.apps = list(apps)
+        self.buckets = list(buckets)
+        self.values = array("q", bytes(8 * len(self.apps) * len(self.buckets)))
+        self._rows = {application: index for index, application in enumerate(self.apps)}
+        self._columns = {bucket: index for index, bucket in enumerate(self.buckets)}
+
+    @property
+    def shape(self) -> tuple:
+        """
+        The (rows, columns) of the matrix
+        """
+        return len(self.apps), len(self.buckets)
+
+    def add(self, application: str, bucket: str, seconds: int) -> None:
+        """
+        Add time to a cell, time outside the buckets is ignored
+
+            Parameters:
+                application (str): The application of the row
+                bucket (str): The label of the column
+                seconds (int): The time to add
+        """
+        column = self._columns.get(bucket)
+        if column is not None:
+            self.values[self._rows[application] * len(self.buckets) + column] += seconds
+
+    def row(self, application: str) -> memoryview:
+        """
+        Get the seconds per bucket for one application
+
+            Parameters:
+                application (str): The application
+
+            Returns:
+                memoryview: A view of the application's row
+        """
+        start = self._rows[application] * len(self.buckets)
+        return memoryview(self.values)[start : start + len(self.buckets)]
 
 
 class Database:
@@ -22,20 +102,47 @@ class Database:
     >>> database_name : str
         The name of the database
 
+    >>> cache_size : int
+        The number of query results kept in the result cache
+
     Methods
     -------
+    >>> close() -> None
+        Close every connection opened by this database
+
+    >>> cache_stats() -> dict
+        Get the result cache counters
+
     >>> create_database() -> None
         Create the database
 
     >>> add_data(application: str, time: int, date: Date) -> None
         Add data to the database
 
+    >>> add_session(application: str, start_time: float, end_time: float) -> None
+        Add a session to the database
+
+    >>> add_many(sessions: list[tuple], gaps: list[tuple]) -> None
+        Add many sessions and gaps to the database in one transaction
+
+    >>> add_gap(start_time: float, end_time: float, reason: str) -> None
+        Record a time span where the active window is unknown
+
+    >>> gaps(start: Date, end: Date) -> list[tuple]
+        Get the recorded gaps
+
     >>> insert_data(application: str, time: int, date: Date) -> None
         Insert data into the database
 
     >>> view_data() -> None
         View the data in the database
 
+    >>> iter_sessions(application: str, start: Date, end: Date, chunk_size: int, columns: bool) -> Iterator
+        Stream the raw sessions without loading them all into memory
+
+    >>> application_names() -> dict[int, str]
+        Get the name of every application by id
+
     >>> delete_data(application: str) -> None
         Delete data from the database
 
@@ -53,48 +160,581 @@ class Database:
 
     >>> total_time_spent_on_app_for_dates(application: str, start_date: Date, end_date: Date) -> int
         Get the total time spent on a specific application for specific dates
+
+    >>> total_time_spent_on_app_for_week(application: str, date: Date) -> int
+        Get the total time spent on a specific application in the week of a date
+
+    >>> daily_usage(application: str, start_date: Date, end_date: Date) -> list[tuple]
+        Get the per-day time and opens of an application for a range of dates
+
+    >>> app_summary(start: Date, end: Date, limit: int, order_by: str) -> list[tuple]
+        Get the total time and opens per application, sorted
+
+    >>> usage_by_day() -> list[tuple]
+        Get the time and opens of every application on every day
+
+    >>> histogram(apps: list[str], start: Date, end: Date, bucket: str) -> Histogram
+        Get the time spent per application and hour, day, ISO week or month
+
+    >>> rebuild_daily_usage() -> None
+        Recompute the daily rollup from the sessions table
+
+    >>> compact(keep_days: int, batch_size: int, pause: float, vacuum_pages: int, should_continue: callable, today: Date) -> dict
+        Fold raw sessions older than keep_days into the rollup and free the space
+
+    >>> compaction_horizon() -> str
+        Get the first day that still has raw sessions
+
+    >>> vacuum_full() -> int
+        Rewrite the file so compact() can return freed space to the file system
+
+    >>> import_staged(path: str, source: str, fingerprint: str, rows_read: int, policy: str) -> int
+        Copy normalized sessions from a staging database in one transaction
+
+    >>> imported_sources() -> dict[str, str]
+        Get the fingerprint of every source imported so far
     """
 
-    def __init__(self, database_name):
+    # Version stored in PRAGMA user_version once every migration has run
+    SCHEMA_VERSION = 6
+
+    # Number of legacy rows copied per executemany during a migration
+    MIGRATION_CHUNK_SIZE = 10000
+
+    # Number of prepared statements each connection keeps around
+    STATEMENT_CACHE_SIZE = 256
+
+    # Pragmas applied to every new connection. WAL lets the stats window read
+    # while the scanner writes, and synchronous=NORMAL is durable enough in WAL
+    # mode without an fsync on every commit.
+    PRAGMAS = (
+        # Only takes effect on a new file, before the journal mode is written
+        # to it, older files are converted by vacuum_full()
+        "PRAGMA auto_vacuum = INCREMENTAL",
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -8000",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 5000",
+    )
+
+    # Keeps daily_usage current on every insert, import_staged() drops it and
+    # adds the per-session deltas of the imported rows with
+    # _add_to_daily_usage() instead
+    ROLLUP_INSERT_TRIGGER = (
+        "CREATE TRIGGER IF NOT EXISTS sessions_rollup_insert "
+        "AFTER INSERT ON sessions BEGIN "
+        "INSERT INTO daily_usage (app_id, day, seconds, opens) "
+        "VALUES (NEW.app_id, NEW.day, NEW.end_time - NEW.start_time, 1) "
+        "ON CONFLICT (app_id, day) DO UPDATE SET "
+        "seconds = seconds + excluded.seconds, opens = opens + 1; "
+        "END"
+    )
+
+    def __init__(self, database_name, cache_size: int = 256):
         self.database_name = database_name
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._application_ids = {}
+        self._application_ids_lock = threading.Lock()
+
+        # Results of the aggregate queries, keyed by statement and variables,
+        # each stored with the applications and days it was computed from
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._write_generation = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_invalidations = 0
+
         self.create_database()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Get the connection for the calling thread, opening it on first use
+
+            Returns:
+                sqlite3.Connection: The connection owned by the calling thread
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection
+
+        connection = sqlite3.connect(
+            self.database_name,
+            cached_statements=self.STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+        )
+        for pragma in self.PRAGMAS:
+            connection.execute(pragma)
+
+        self._local.connection = connection
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def close(self) -> None:
+        """
+        Close every connection opened by this database
+        """
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
     def _query_commit(self, sql_statement: str, variables: tuple = None) -> None:
-        connection = sqlite3.connect(self.database_name)
-        cursor = connection.cursor()
-        if variables:
-            cursor.execute(sql_statement, variables)
-        else:
-            cursor.execute(sql_statement)
-        connection.commit()
-        connection.close()
+        connection = self._connect()
+        with _WRITE_LATENCY.time(), connection:
+            connection.execute(sql_statement, variables or ())
 
     def _query_fetch(self, sql_statement: str, variables: tuple = None) -> list:
-        connection = sqlite3.connect(self.database_name)
-        cursor = connection.cursor()
-        if variables:
-            cursor.execute(sql_statement, variables)
-        else:
-            cursor.execute(sql_statement)
-        data = cursor.fetchall()
-        connection.close()
+        connection = self._connect()
+        with _QUERY_LATENCY.time():
+            return connection.execute(sql_statement, variables or ()).fetchall()
+
+    def _cached_fetch(
+        self,
+        sql_statement: str,
+        variables: tuple = (),
+        applications: tuple = None,
+        start=None,
+        end=None,
+    ) -> list:
+        """
+        Run a read query through the result cache
+
+            Parameters:
+                sql_statement (str): The query
+                variables (tuple): The query parameters
+                applications (tuple[str]): The applications the result depends
+                    on, or None if it depends on all of them
+                start (date): The first day the result depends on, or None
+                end (date): The last day the result depends on, or None
+
+            Returns:
+                list: The rows
+        """
+        key = (sql_statement, variables)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self._cache_hits += 1
+                return list(entry[0])
+            self._cache_misses += 1
+            generation = self._write_generation
+
+        data = self._query_fetch(sql_statement, variables)
+
+        with self._cache_lock:
+            # A write that finished while the query ran may not be in the result
+            if generation == self._write_generation and self.cache_size > 0:
+                scope = (
+                    None if applications is None else frozenset(applications),
+                    None if start is None else str(start),
+                    None if end is None else str(end),
+                )
+                self._cache[key] = (tuple(data), scope)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
         return data
 
+    def _invalidate(self, changes: dict = None) -> None:
+        """
+        Drop the cached results that depend on changed data
+
+            Parameters:
+                changes (dict[str, set]): The changed days per application, an
+                    application mapped to None changed on every day, and no
+                    changes at all means everything changed
+        """
+        with self._cache_lock:
+            self._write_generation += 1
+            for key, (_, (applications, start, end)) in list(self._cache.items()):
+                if changes is not None and not any(
+                    (applications is None or application in applications)
+                    and (
+                        days is None
+                        or any(
+                            (start is None or start <= day)
+                            and (end is None or day <= end)
+                            for day in days
+                        )
+                    )
+                    for application, days in changes.items()
+                ):
+                    continue
+                del self._cache[key]
+                self._cache_invalidations += 1
+
+    def cache_stats(self) -> dict:
+        """
+        Get the result cache counters
+
+            Returns:
+                dict: The hits, misses, invalidations, size and write generation
+        """
+        with self._cache_lock:
+            return {
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "invalidations": self._cache_invalidations,
+                "size": len(self._cache),
+                "write_generation": self._write_generation,
+            }
+
+    def _query_commit_many(self, sql_statement: str, rows: list) -> None:
+        connection = self._connect()
+        with _WRITE_LATENCY.time(), connection:
+            connection.executemany(sql_statement, rows)
+
     def _query_execute(self, sql_statement: str, variables: tuple = None) -> None:
-        connection = sqlite3.connect(self.database_name)
-        cursor = connection.cursor()
-        if variables:
-            cursor.execute(sql_statement, variables)
-        else:
-            cursor.execute(sql_statement)
-        connection.close()
+        connection = self._connect()
+        connection.execute(sql_statement, variables or ())
+
+    @staticmethod
+    def _day(timestamp: float) -> str:
+        return Date.fromtimestamp(timestamp).isoformat()
+
+    @staticmethod
+    def _start_of_day(date) -> float:
+        if isinstance(date, str):
+            date = Date.fromisoformat(date)
+        return DateTime.combine(date, DateTime.min.time()).timestamp()
+
+    @staticmethod
+    def _create_schema(connection: sqlite3.Connection) -> None:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS applications ("
+            "id INTEGER PRIMARY KEY, "
+            "name TEXT NOT NULL UNIQUE)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id INTEGER PRIMARY KEY, "
+            "app_id INTEGER NOT NULL REFERENCES applications (id), "
+            "start_time INTEGER NOT NULL, "
+            "end_time INTEGER NOT NULL, "
+            "day TEXT NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_app_day ON sessions (app_id, day)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS sessions_day ON sessions (day)")
+
+    def _migrate_to_2(self, connection: sqlite3.Connection) -> None:
+        """
+        Move the flat time_tracker table into applications and sessions
+
+        Legacy rows only know their duration and day, so each day's rows are
+        laid out back to back from midnight in the order they were written.
+        """
+        self._create_schema(connection)
+        legacy = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'time_tracker'"
+        ).fetchone()
+        if legacy is None:
+            return
+
+        application_ids = {}
+        day_offsets = {}
+        chunk = []
+        rows = connection.execute(
+            "SELECT application_name, time_spent, date_used FROM time_tracker ORDER BY rowid"
+        )
+        for application, time_spent, date_used in rows:
+            app_id = application_ids.get(application)
+            if app_id is None:
+                app_id = connection.execute(
+                    "INSERT INTO applications (name) VALUES (?)", (application,)
+                ).lastrowid
+                application_ids[application] = app_id
+
+            day = str(date_used)
+            start = day_offsets.get(day)
+            if start is None:
+                start = self._start_of_day(day)
+            end = start + (time_spent or 0)
+            day_offsets[day] = end
+
+            chunk.append((app_id, round(start), round(end), day))
+            if len(chunk) >= self.MIGRATION_CHUNK_SIZE:
+                connection.executemany(
+                    "INSERT INTO sessions (app_id, start_time, end_time, day) VALUES (?, ?, ?, ?)",
+                    chunk,
+                )
+                chunk = []
+
+        if chunk:
+            connection.executemany(
+                "INSERT INTO sessions (app_id, start_time, end_time, day) VALUES (?, ?, ?, ?)",
+                chunk,
+            )
+        connection.execute("DROP TABLE time_tracker")
+
+    @staticmethod
+    def _migrate_to_3(connection: sqlite3.Connection) -> None:
+        """
+        Add the daily_usage rollup and the triggers that keep it current
+        """
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS daily_usage ("
+            "app_id INTEGER NOT NULL REFERENCES applications (id), "
+            "day TEXT NOT NULL, "
+            "seconds INTEGER NOT NULL, "
+            "opens INTEGER NOT NULL, "
+            "PRIMARY KEY (app_id, day)) WITHOUT ROWID"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS daily_usage_day ON daily_usage (day)"
+        )
+        connection.execute(Database.ROLLUP_INSERT_TRIGGER)
+        connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS sessions_rollup_delete "
+            "AFTER DELETE ON sessions BEGIN "
+            "UPDATE daily_usage SET "
+            "seconds = seconds - (OLD.end_time - OLD.start_time), opens = opens - 1 "
+            "WHERE app_id = OLD.app_id AND day = OLD.day; "
+            "DELETE FROM daily_usage "
+            "WHERE app_id = OLD.app_id AND day = OLD.day AND opens <= 0; "
+            "END"
+        )
+        connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS sessions_rollup_update "
+            "AFTER UPDATE OF app_id, start_time, end_time, day ON sessions BEGIN "
+            "UPDATE daily_usage SET "
+            "seconds = seconds - (OLD.end_time - OLD.start_time), opens = opens - 1 "
+            "WHERE app_id = OLD.app_id AND day = OLD.day; "
+            "DELETE FROM daily_usage "
+            "WHERE app_id = OLD.app_id AND day = OLD.day AND opens <= 0; "
+            "INSERT INTO daily_usage (app_id, day, seconds, opens) "
+            "VALUES (NEW.app_id, NEW.day, NEW.end_time - NEW.start_time, 1) "
+            "ON CONFLICT (app_id, day) DO UPDATE SET "
+            "seconds = seconds + excluded.seconds, opens = opens + 1; "
+            "END"
+        )
+        Database._rebuild_daily_usage(connection)
+
+    @staticmethod
+    def _migrate_to_4(connection: sqlite3.Connection) -> None:
+        """
+        Add the gaps table for spans where the active window was unknown
+        """
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS gaps ("
+            "id INTEGER PRIMARY KEY, "
+            "start_time INTEGER NOT NULL, "
+            "end_time INTEGER NOT NULL, "
+            "day TEXT NOT NULL, "
+            "reason TEXT NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS gaps_day ON gaps (day)")
+
+    @staticmethod
+    def _migrate_to_5(connection: sqlite3.Connection) -> None:
+        """
+        Add the imports table that makes merging other databases resumable
+        """
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS imports ("
+            "source TEXT PRIMARY KEY, "
+            "fingerprint TEXT NOT NULL, "
+            "rows_read INTEGER NOT NULL, "
+            "rows_imported INTEGER NOT NULL, "
+            "imported_at INTEGER NOT NULL)"
+        )
+
+    @staticmethod
+    def _rebuild_daily_usage(connection: sqlite3.Connection, since: str = "") -> None:
+        connection.execute("DELETE FROM daily_usage WHERE day >= (?)", (since,))
+        connection.execute(
+            "INSERT INTO daily_usage (app_id, day, seconds, opens) "
+            "SELECT app_id, day, SUM(end_time - start_time), COUNT(*) "
+            "FROM sessions WHERE day >= (?) GROUP BY app_id, day",
+            (since,),
+        )
+
+    @staticmethod
+    def _migrate_to_6(connection: sqlite3.Connection) -> None:
+        """
+        Record how far raw sessions have been compacted, and stop deleting a
+        compacted session from taking its time out of the rollup
+        """
+        connection.execute("CREATE TABLE IF NOT EXISTS compaction (horizon TEXT NOT NULL)")
+        connection.execute("INSERT INTO compaction (horizon) VALUES ('')")
+        connection.execute("DROP TRIGGER IF EXISTS sessions_rollup_delete")
+        connection.execute(
+            "CREATE TRIGGER sessions_rollup_delete "
+            "AFTER DELETE ON sessions "
+            "WHEN OLD.day >= (SELECT horizon FROM compaction) BEGIN "
+            "UPDATE daily_usage SET "
+            "seconds = seconds - (OLD.end_time - OLD.start_time), opens = opens - 1 "
+            "WHERE app_id = OLD.app_id AND day = OLD.day; "
+            "DELETE FROM daily_usage "
+            "WHERE app_id = OLD.app_id AND day = OLD.day AND opens <= 0; "
+            "END"
+        )
+
+    @staticmethod
+    def _add_to_daily_usage(connection: sqlite3.Connection, last_id: int) -> None:
+        connection.execute(
+            "INSERT INTO daily_usage (app_id, day, seconds, opens) "
+            "SELECT app_id, day, SUM(end_time - start_time), COUNT(*) FROM sessions "
+            "WHERE id > (?) GROUP BY app_id, day "
+            "ON CONFLICT (app_id, day) DO UPDATE SET "
+            "seconds = seconds + excluded.seconds, opens = opens + excluded.opens",
+            (last_id,),
+        )
 
     def create_database(self) -> None:
         """
-        Create the database
+        Create the database, migrating older schema versions in place
+        """
+        migrations = {
+            2: self._migrate_to_2,
+            3: self._migrate_to_3,
+            4: self._migrate_to_4,
+            5: self._migrate_to_5,
+            6: self._migrate_to_6,
+        }
+        connection = self._connect()
+        # Files created before versioning (and new, empty files) are version 1
+        version = max(connection.execute("PRAGMA user_version").fetchone()[0], 1)
+        for target in range(version + 1, self.SCHEMA_VERSION + 1):
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                migrations[target](connection)
+                connection.execute(f"PRAGMA user_version = {target}")
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+
+    def _application_id(self, connection: sqlite3.Connection, application: str) -> int:
+        with self._application_ids_lock:
+            app_id = self._application_ids.get(application)
+        if app_id is not None:
+            return app_id
+
+        connection.execute(
+            "INSERT OR IGNORE INTO applications (name) VALUES (?)", (application,)
+        )
+        app_id = connection.execute(
+            "SELECT id FROM applications WHERE name = (?)", (application,)
+        ).fetchone()[0]
+        with self._application_ids_lock:
+            self._application_ids[application] = app_id
+        return app_id
+
+    def _insert_sessions(self, sessions: list, gaps: list = ()) -> None:
+        connection = self._connect()
+        try:
+            with _WRITE_LATENCY.time(), connection:
+                if gaps:
+                    connection.executemany(
+                        "INSERT INTO gaps (start_time, end_time, day, reason) "
+                        "VALUES (?, ?, ?, ?)",
+                        [
+                            (round(start_time), round(end_time), self._day(start_time), reason)
+                            for start_time, end_time, reason in gaps
+                        ],
+                    )
+                rows = [
+                    (
+                        self._application_id(connection, application),
+                        round(start_time),
+                        round(end_time),
+                        self._day(start_time),
+                    )
+                    for application, start_time, end_time in sessions
+                ]
+                connection.executemany(
+                    "INSERT INTO sessions (app_id, start_time, end_time, day) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error:
+            # Ids interned inside the rolled back transaction no longer exist
+            with self._application_ids_lock:
+                self._application_ids.clear()
+            raise
+
+        _SESSIONS_WRITTEN.inc(len(rows))
+        changes = {}
+        for (application, _, _), (_, _, _, day) in zip(sessions, rows):
+            changes.setdefault(application, set()).add(day)
+        self._invalidate(changes)
+
+    def add_session(self, application: str, start_time: float, end_time: float) -> None:
+        """
+        Add a session to the database
+
+            Parameters:
+                application (str): The name of the application
+                start_time (float): The unix time the session started
+                end_time (float): The unix time the session ended
+        """
+        self._insert_sessions([(application, start_time, end_time)])
+
+    def add_many(self, sessions: list, gaps: list = ()) -> None:
         """
-        sql_statement = "CREATE TABLE IF NOT EXISTS time_tracker (application_name text, time_spent integer, date_used text)"
-        self._query_execute(sql_statement)
+        Add many sessions, and the gaps between them, to the database in one
+        transaction
+
+            Parameters:
+                sessions (list[tuple]): The (application, start_time, end_time) sessions
+                gaps (list[tuple]): The (start_time, end_time, reason) gaps
+        """
+        self._insert_sessions(sessions, gaps)
+
+    def add_gap(self, start_time: float, end_time: float, reason: str) -> None:
+        """
+        Record a time span where the active window is unknown, so it shows up
+        as missing data instead of silently disappearing
+
+            Parameters:
+                start_time (float): The unix time the gap started
+                end_time (float): The unix time the gap ended
+                reason (str): Why the window was unknown
+        """
+        self._query_commit(
+            "INSERT INTO gaps (start_time, end_time, day, reason) VALUES (?, ?, ?, ?)",
+            (round(start_time), round(end_time), self._day(start_time), reason),
+        )
+
+    def gaps(self, start=None, end=None) -> list:
+        """
+        Get the recorded gaps
+
+            Parameters:
+                start (date): The first date to include, or None for no lower bound
+                end (date): The last date to include, or None for no upper bound
+
+            Returns:
+                list[tuple]: The (start_time, end_time, reason) rows in time order
+        """
+        conditions = []
+        variables = []
+        if start is not None:
+            conditions.append("day >= (?)")
+            variables.append(str(start))
+        if end is not None:
+            conditions.append("day <= (?)")
+            variables.append(str(end))
+
+        sql_statement = "SELECT start_time, end_time, reason FROM gaps"
+        if conditions:
+            sql_statement += " WHERE " + " AND ".join(conditions)
+        sql_statement += " ORDER BY start_time"
+        return self._query_fetch(sql_statement, tuple(variables))
 
     def add_data(self, application: str, time: int, date: Date) -> None:
         """
@@ -105,9 +745,8 @@ class Database:
                 time (int): The time spent on the application
                 date (date): The date when the application was used
         """
-        sql_statement = "INSERT INTO time_tracker VALUES (?, ?, ?)"
-        data = (application, time, date)
-        self._query_commit(sql_statement, data)
+        start_time = self._start_of_day(date)
+        self._insert_sessions([(application, start_time, start_time + time)])
 
     def insert_data(self, application: str, time: int, date: Date) -> None:
         """
@@ -118,21 +757,99 @@ class Database:
                 time (int): The time spent on the application
                 date (date): The date when the application was used
         """
-        sql_statement = "INSERT INTO time_tracker VALUES (?, ?, ?)"
-        data = (application, time, date)
-        self._query_commit(sql_statement, data)
+        self.add_data(application, time, date)
 
     def view_data(self):
         """
         View the data in the database
 
             Returns:
-                list: The data from the database
+                list: The (application, time, date) rows from the database
         """
-        sql_statement = "SELECT * FROM time_tracker"
+        sql_statement = (
+            "SELECT applications.name, sessions.end_time - sessions.start_time, sessions.day "
+            "FROM sessions JOIN applications ON applications.id = sessions.app_id "
+            "ORDER BY sessions.id"
+        )
         data = self._query_fetch(sql_statement)
         return data
 
+    def iter_sessions(
+        self, application=None, start=None, end=None, chunk_size=1000, columns=False
+    ):
+        """
+        Stream the raw sessions without loading them all into memory
+
+        With columns set, each chunk is yielded as a dict of columns instead of
+        row by row. The integer columns are array.array("q") buffers, so they
+        can be summed directly or wrapped with numpy.frombuffer without a copy.
+
+            Parameters:
+                application (str): Only sessions of this application, or None for all
+                start (date): The first day to include, or None for no lower bound
+                end (date): The last day to include, or None for no upper bound
+                chunk_size (int): The number of rows fetched from SQLite at a time
+                columns (bool): Yield column-oriented chunks instead of rows
+
+            Yields:
+                tuple: (application, start_time, end_time, day) rows, or
+                dict: {"app_id", "start_time", "end_time", "day"} column chunks
+        """
+        conditions = []
+        variables = []
+        if application is not None:
+            conditions.append(
+                "sessions.app_id = (SELECT id FROM applications WHERE name = (?))"
+            )
+            variables.append(application)
+        if start is not None:
+            conditions.append("sessions.day >= (?)")
+            variables.append(str(start))
+        if end is not None:
+            conditions.append("sessions.day <= (?)")
+            variables.append(str(end))
+
+        if columns:
+            sql_statement = "SELECT app_id, start_time, end_time, day FROM sessions"
+        else:
+            sql_statement = (
+                "SELECT applications.name, sessions.start_time, sessions.end_time, sessions.day "
+                "FROM sessions JOIN applications ON applications.id = sessions.app_id"
+            )
+        if conditions:
+            sql_statement += " WHERE " + " AND ".join(conditions)
+        sql_statement += " ORDER BY sessions.id"
+
+        cursor = self._connect().cursor()
+        cursor.arraysize = chunk_size
+        try:
+            cursor.execute(sql_statement, tuple(variables))
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    return
+                if not columns:
+                    yield from rows
+                    continue
+                app_ids, start_times, end_times, days = zip(*rows)
+                yield {
+                    "app_id": array("q", app_ids),
+                    "start_time": array("q", start_times),
+                    "end_time": array("q", end_times),
+                    "day": list(days),
+                }
+        finally:
+            cursor.close()
+
+    def application_names(self):
+        """
+        Get the name of every application by id
+
+            Returns:
+                dict[int, str]: The application names
+        """
+        return dict(self._query_fetch("SELECT id, name FROM applications"))
+
     def delete_data(self, application):
         """
         Delete data from the database
@@ -140,8 +857,18 @@ class Database:
             Parameters:
                 application (str): The name of the application
         """
-        sql_statement = "DELETE FROM time_tracker WHERE application_name = (?)"
-        self._query_commit(sql_statement, (application,))
+        connection = self._connect()
+        with _WRITE_LATENCY.time(), connection:
+            connection.execute(
+                "DELETE FROM sessions WHERE app_id = (SELECT id FROM applications WHERE name = (?))",
+                (application,),
+            )
+            # Compacted days only exist in the rollup
+            connection.execute(
+                "DELETE FROM daily_usage WHERE app_id = (SELECT id FROM applications WHERE name = (?))",
+                (application,),
+            )
+        self._invalidate({application: None})
 
     def update_data(self, application, time, date):
         """
@@ -152,8 +879,16 @@ class Database:
                 time (int): The time spent on the application
                 date (date): The date when the application was used
         """
-        sql_statement = "UPDATE time_tracker SET time_spent = (?), date_used = (?) WHERE application_name = (?)"
-        self._query_commit(sql_statement, (time, date, application))
+        start_time = round(self._start_of_day(date))
+        sql_statement = (
+            "UPDATE sessions SET start_time = (?), end_time = (?), day = (?) "
+            "WHERE app_id = (SELECT id FROM applications WHERE name = (?))"
+        )
+        self._query_commit(
+            sql_statement,
+            (start_time, start_time + round(time), str(date), application),
+        )
+        self._invalidate({application: None})
 
     def total_time_spent(self):
         """
@@ -162,8 +897,8 @@ class Database:
             Returns:
                 int: The total time spent on all applications
         """
-        sql_statement = "SELECT SUM(time_spent) FROM time_tracker"
-        data = self._query_fetch(sql_statement)
+        sql_statement = "SELECT SUM(seconds) FROM daily_usage"
+        data = self._cached_fetch(sql_statement)
         return data
 
     def total_time_spent_on_app(self, application):
@@ -177,9 +912,10 @@ class Database:
                 int: The total time spent on a specific application
         """
         sql_statement = (
-            "SELECT SUM(time_spent) FROM time_tracker WHERE application_name = (?)"
+            "SELECT SUM(seconds) FROM daily_usage "
+            "WHERE app_id = (SELECT id FROM applications WHERE name = (?))"
         )
-        data = self._query_fetch(sql_statement, (application,))
+        data = self._cached_fetch(sql_statement, (application,), (application,))
         return data[0][0]
 
     def total_time_spent_on_app_on_date(self, application, date):
@@ -193,8 +929,13 @@ class Database:
             Returns:
                 int: The total time spent on a specific application on a specific date
         """
-        sql_statement = "SELECT SUM(time_spent) FROM time_tracker WHERE application_name = (?) AND date_used = (?)"
-        data = self._query_fetch(sql_statement, (application, date))
+        sql_statement = (
+            "SELECT SUM(seconds) FROM daily_usage "
+            "WHERE app_id = (SELECT id FROM applications WHERE name = (?)) AND day = (?)"
+        )
+        data = self._cached_fetch(
+            sql_statement, (application, str(date)), (application,), date, date
+        )
         return data
 
     def total_time_spent_on_app_for_dates(self, application, start_date, end_date):
@@ -209,6 +950,559 @@ class Database:
             Returns:
                 int: The total time spent on a specific application for specific dates
         """
-        sql_statement = "SELECT SUM(time_spent) FROM time_tracker WHERE application_name = (?) AND date_used BETWEEN (?) AND (?)"
-        data = self._query_fetch(sql_statement, (application, start_date, end_date))
+        sql_statement = (
+            "SELECT SUM(seconds) FROM daily_usage "
+            "WHERE app_id = (SELECT id FROM applications WHERE name = (?)) "
+            "AND day BETWEEN (?) AND (?)"
+        )
+        data = self._cached_fetch(
+            sql_statement,
+            (application, str(start_date), str(end_date)),
+            (application,),
+            start_date,
+            end_date,
+        )
         return data
+
+    def total_time_spent_on_app_for_week(self, application, date):
+        """
+        Get the total time spent on a specific application in the week of a date
+
+            Parameters:
+                application (str): The name of the application
+                date (date): Any date in the week, weeks start on Monday
+
+            Returns:
+                int: The total time spent on the application that week
+        """
+        if isinstance(date, str):
+            date = Date.fromisoformat(date)
+        start_date = date - TimeDelta(days=date.weekday())
+        end_date = start_date + TimeDelta(days=6)
+        data = self.total_time_spent_on_app_for_dates(application, start_date, end_date)
+        return data[0][0]
+
+    def daily_usage(self, application, start_date, end_date):
+        """
+        Get the per-day time and opens of an application for a range of dates
+
+            Parameters:
+                application (str): The name of the application
+                start_date (date): The first date of the range
+                end_date (date): The last date of the range
+
+            Returns:
+                list[tuple]: The (day, seconds, opens) rows for days with any usage
+        """
+        sql_statement = (
+            "SELECT day, seconds, opens FROM daily_usage "
+            "WHERE app_id = (SELECT id FROM applications WHERE name = (?)) "
+            "AND day BETWEEN (?) AND (?) ORDER BY day"
+        )
+        return self._cached_fetch(
+            sql_statement,
+            (application, str(start_date), str(end_date)),
+            (application,),
+            start_date,
+            end_date,
+        )
+
+    def app_summary(self, start=None, end=None, limit=None, order_by="time"):
+        """
+        Get the total time and opens per application, sorted
+
+            Parameters:
+                start (date): The first date to include, or None for no lower bound
+                end (date): The last date to include, or None for no upper bound
+                limit (int): The maximum number of rows, or None for all of them
+                order_by (str): "time" or "opens" (largest first), or "name"
+
+            Returns:
+                list[tuple]: The (application, seconds, opens) rows
+        """
+        orderings = {
+            "time": "seconds DESC, applications.name",
+            "opens": "opens DESC, applications.name",
+            "name": "applications.name",
+        }
+        if order_by not in orderings:
+            raise ValueError(f"Unknown order_by: {order_by}")
+
+        conditions = []
+        variables = []
+        if start is not None:
+            conditions.append("daily_usage.day >= (?)")
+            variables.append(str(start))
+        if end is not None:
+            conditions.append("daily_usage.day <= (?)")
+            variables.append(str(end))
+
+        sql_statement = (
+            "SELECT applications.name, SUM(daily_usage.seconds) AS seconds, "
+            "SUM(daily_usage.opens) AS opens "
+            "FROM daily_usage JOIN applications ON applications.id = daily_usage.app_id"
+        )
+        if conditions:
+            sql_statement += " WHERE " + " AND ".join(conditions)
+        sql_statement += f" GROUP BY daily_usage.app_id ORDER BY {orderings[order_by]}"
+        if limit is not None:
+            sql_statement += " LIMIT (?)"
+            variables.append(limit)
+
+        return self._cached_fetch(sql_statement, tuple(variables), None, start, end)
+
+    def usage_by_day(self):
+        """
+        Get the time and opens of every application on every day, read once
+        to seed the in-memory totals of the live dashboard
+
+            Returns:
+                list[tuple]: The (application, day, seconds, opens) rows
+        """
+        sql_statement = (
+            "SELECT applications.name, daily_usage.day, daily_usage.seconds, "
+            "daily_usage.opens FROM daily_usage "
+            "JOIN applications ON applications.id = daily_usage.app_id"
+        )
+        return self._query_fetch(sql_statement)
+
+    @staticmethod
+    def _bucket_labels(start: Date, end: Date, bucket: str) -> list:
+        labels = []
+        day = start
+        while day <= end:
+            if bucket == "hour":
+                labels.extend(f"{day.isoformat()} {hour:02d}" for hour in range(24))
+            elif bucket == "day":
+                labels.append(day.isoformat())
+            elif bucket == "isoweek":
+                year, week, _ = day.isocalendar()
+                labels.append(f"{year}-W{week:02d}")
+            else:
+                labels.append(day.isoformat()[:7])
+            day += TimeDelta(days=1)
+        return list(dict.fromkeys(labels))
+
+    def histogram(self, apps, start, end, bucket="day"):
+        """
+        Get the time spent per application and hour, day, ISO week or month
+
+        Every bucket is computed in one grouped query. Day, week and month
+        buckets are read from the daily rollup. Hour buckets are read from the
+        sessions that overlap the range, clipped to it, which are split at
+        every full local hour they span. Compacted days have no sessions
+        left, so hour buckets are only available from compaction_horizon() on.
+
+            Parameters:
+                apps (list[str]): The applications, or None for every
+                    application used in the range, most used first
+                start (date): The first date to include
+                end (date): The last date to include
+                bucket (str): "hour", "day", "isoweek" or "month"
+
+            Returns:
+                Histogram: The seconds per application and bucket, with every
+                    bucket in the range present even when it is empty
+
+            Raises:
+                ValueError: For an unknown bucket, or hour buckets in a range
+                    that starts before the compaction horizon
+        """
+        if bucket not in ("hour", "day", "isoweek", "month"):
+            raise ValueError(f"Unknown bucket: {bucket}")
+        if isinstance(start, str):
+            start = Date.fromisoformat(start)
+        if isinstance(end, str):
+            end = Date.fromisoformat(end)
+        if bucket == "hour" and start.isoformat() < self.compaction_horizon():
+            raise ValueError(
+                f"Hour buckets need raw sessions, which start at {self.compaction_horizon()}"
+            )
+        if apps is None:
+            apps = [row[0] for row in self.app_summary(start, end)]
+
+        histogram = Histogram(apps, self._bucket_labels(start, end, bucket))
+        if not histogram.apps:
+            return histogram
+
+        app_names = ", ".join("?" for _ in histogram.apps)
+        variables = (*histogram.apps, start.isoformat(), end.isoformat())
+        if bucket == "hour":
+            # Sessions are stored on the day they start, so the ones that run
+            # into the range from the day before are found by their times
+            range_start = int(self._start_of_day(start))
+            range_end = int(self._start_of_day(end + TimeDelta(days=1)))
+            # Pieces are split on local hours: shifted by the UTC offset, so
+            # half and quarter hour time zones split where their hours start.
+            # Daylight saving moves the offset by whole hours, so the offset
+            # at the start of the range splits the whole range
+            local_start = DateTime.fromtimestamp(range_start).astimezone()
+            offset = int(local_start.utcoffset().total_seconds())
+            variables = (
+                range_start,
+                range_end,
+                offset,
+                *histogram.apps,
+                end.isoformat(),
+                range_end,
+                range_start,
+            )
+            next_hour = "((piece_start + offset) / 3600 + 1) * 3600 - offset"
+            sql_statement = (
+                "WITH RECURSIVE pieces (app_id, piece_start, end_time, offset) AS ("
+                "SELECT sessions.app_id, MAX(sessions.start_time, ?), "
+                "MIN(sessions.end_time, ?), ? "
+                "FROM sessions JOIN applications ON applications.id = sessions.app_id "
+                f"WHERE applications.name IN ({app_names}) AND sessions.day <= (?) "
+                "AND sessions.start_time < (?) AND sessions.end_time > (?) "
+                "UNION ALL "
+                f"SELECT app_id, {next_hour}, end_time, offset FROM pieces "
+                f"WHERE {next_hour} < end_time) "
+                "SELECT applications.name, "
+                "strftime('%Y-%m-%d %H', piece_start, 'unixepoch', 'localtime') AS bucket, "
+                f"SUM(MIN(end_time, {next_hour}) - piece_start) "
+                "FROM pieces JOIN applications ON applications.id = pieces.app_id "
+                "GROUP BY pieces.app_id, bucket"
+            )
+        else:
+            label = "substr(daily_usage.day, 1, 7)" if bucket == "month" else "daily_usage.day"
+            sql_statement = (
+                f"SELECT applications.name, {label} AS bucket, SUM(daily_usage.seconds) "
+                "FROM daily_usage JOIN applications ON applications.id = daily_usage.app_id "
+                f"WHERE applications.name IN ({app_names}) "
+                "AND daily_usage.day BETWEEN (?) AND (?) "
+                "GROUP BY daily_usage.app_id, bucket"
+            )
+
+        for application, label, seconds in self._query_fetch(sql_statement, variables):
+            if bucket == "isoweek":
+                year, week, _ = Date.fromisoformat(label).isocalendar()
+                label = f"{year}-W{week:02d}"
+            histogram.add(application, label, seconds)
+        return histogram
+
+    def rebuild_daily_usage(self) -> None:
+        """
+        Recompute the daily rollup from the sessions table. Days that have
+        been compacted only exist in the rollup and are left as they are.
+        """
+        connection = self._connect()
+        with connection:
+            self._rebuild_daily_usage(connection, self.compaction_horizon())
+        self._invalidate()
+
+    # How sessions that overlap existing ones are imported: "keep" imports
+    # them as they are, "skip" drops them and "trim" imports only the parts
+    # that do not overlap
+    MERGE_POLICIES = ("keep", "skip", "trim")
+
+    def import_staged(
+        self,
+        path: str,
+        source: str,
+        fingerprint: str,
+        rows_read: int = 0,
+        policy: str = "trim",
+    ) -> int:
+        """
+        Copy normalized sessions from a staging database, and record the
+        source as imported, in one transaction
+
+        The staging database holds a table staged (app, start_time, end_time,
+        day) without overlaps, as written by merge.stage_source. Sessions that
+        exactly match an existing one are never imported twice.
+
+            Parameters:
+                path (str): The staging database
+                source (str): The name the source is recorded under
+                fingerprint (str): Identifies the version of the source
+                rows_read (int): The number of rows the source had, for the record
+                policy (str): "keep", "skip" or "trim", see MERGE_POLICIES
+
+            Returns:
+                int: The number of sessions imported
+        """
+        if policy not in self.MERGE_POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+
+        connection = self._connect()
+        connection.execute("ATTACH DATABASE (?) AS staging", (path,))
+        try:
+            with _WRITE_LATENCY.time(), connection:
+                connection.execute(
+                    "INSERT OR IGNORE INTO applications (name) "
+                    "SELECT DISTINCT app FROM staging.staged"
+                )
+                # Updating the rollup row by row costs twice the insert itself,
+                # the new sessions are added to it in one go afterwards
+                connection.execute("DROP TRIGGER sessions_rollup_insert")
+                last_id = connection.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM sessions"
+                ).fetchone()[0]
+                days = {
+                    row[0]
+                    for row in connection.execute("SELECT DISTINCT day FROM staging.staged")
+                }
+                if policy == "keep":
+                    imported = connection.execute(
+                        "INSERT INTO sessions (app_id, start_time, end_time, day) "
+                        "SELECT applications.id, staged.start_time, staged.end_time, staged.day "
+                        "FROM staging.staged JOIN applications ON applications.name = staged.app "
+                        "WHERE NOT EXISTS (SELECT 1 FROM sessions WHERE "
+                        "sessions.app_id = applications.id AND sessions.day = staged.day AND "
+                        "sessions.start_time = staged.start_time AND "
+                        "sessions.end_time = staged.end_time)"
+                    ).rowcount
+                else:
+                    imported = self._import_without_overlaps(connection, policy, days)
+                self._add_to_daily_usage(connection, last_id)
+                connection.execute(self.ROLLUP_INSERT_TRIGGER)
+
+                connection.execute(
+                    "INSERT OR REPLACE INTO imports "
+                    "(source, fingerprint, rows_read, rows_imported, imported_at) "
+                    "VALUES (?, ?, ?, ?, strftime('%s', 'now'))",
+                    (source, fingerprint, rows_read, imported),
+                )
+        finally:
+            connection.execute("DETACH DATABASE staging")
+
+        self._invalidate()
+        return imported
+
+    def _import_without_overlaps(
+        self, connection: sqlite3.Connection, policy: str, days: set
+    ) -> int:
+        """
+        Import the staged sessions a day at a time, resolving overlaps with
+        the sessions already there
+
+            Parameters:
+                connection (sqlite3.Connection): The connection with staging attached
+                policy (str): "skip" or "trim"
+                days (set[str]): The staged days
+
+            Returns:
+                int: The number of sessions imported
+        """
+        app_ids = dict(
+            connection.execute(
+                "SELECT name, id FROM applications "
+                "WHERE name IN (SELECT DISTINCT app FROM staging.staged)"
+            )
+        )
+        imported = 0
+        existing = {}
+        for day in sorted(days):
+            # Sessions from the day before can run past midnight into this
+            # day, and this day's sessions can run into the next. Every day
+            # is fetched once, rows imported from this source never overlap
+            # each other so they do not need to be seen.
+            current = Date.fromisoformat(day)
+            window = [str(current + TimeDelta(days=offset)) for offset in (-1, 0, 1)]
+            existing = {key: existing[key] for key in window if key in existing}
+            for key in window:
+                if key not in existing:
+                    existing[key] = connection.execute(
+                        "SELECT start_time, end_time FROM sessions WHERE day = (?)", (key,)
+                    ).fetchall()
+            busy_starts, busy_ends = self._union_intervals(
+                sorted(existing[window[0]] + existing[window[1]] + existing[window[2]])
+            )
+
+            rows = []
+            for application, start_time, end_time in connection.execute(
+                "SELECT app, start_time, end_time FROM staging.staged WHERE day = (?)",
+                (day,),
+            ):
+                app_id = app_ids[application]
+                index = bisect.bisect_right(busy_ends, start_time)
+                if index == len(busy_starts) or busy_starts[index] >= end_time:
+                    rows.append((app_id, start_time, end_time, day))
+                    continue
+                if policy == "skip":
+                    continue
+                pieces = self._subtract_intervals(
+                    start_time, end_time, busy_starts, busy_ends
+                )
+                rows.extend(
+                    (app_id, start, end, day if start == start_time else self._day(start))
+                    for start, end in pieces
+                )
+            connection.executemany(
+                "INSERT INTO sessions (app_id, start_time, end_time, day) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            imported += len(rows)
+        return imported
+
+    @staticmethod
+    def _union_intervals(intervals: list) -> tuple:
+        """
+        Merge sorted (start, end) intervals into disjoint ones
+
+            Parameters:
+                intervals (list[tuple]): The intervals, sorted by start
+
+            Returns:
+                tuple[list, list]: The starts and the ends of the disjoint intervals
+        """
+        starts, ends = [], []
+        for start, end in intervals:
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        return starts, ends
+
+    @staticmethod
+    def _subtract_intervals(start: int, end: int, starts: list, ends: list) -> list:
+        """
+        Get the parts of an interval not covered by disjoint sorted intervals
+
+            Parameters:
+                start (int): The start of the interval
+                end (int): The end of the interval
+                starts (list[int]): The starts of the covering intervals
+                ends (list[int]): The ends of the covering intervals
+
+            Returns:
+                list[tuple]: The uncovered (start, end) pieces
+        """
+        pieces = []
+        index = bisect.bisect_right(ends, start)
+        while start < end and index < len(starts) and starts[index] < end:
+            if starts[index] > start:
+                pieces.append((start, starts[index]))
+            start = max(start, ends[index])
+            index += 1
+        if start < end:
+            pieces.append((start, end))
+        return pieces
+
+    def imported_sources(self) -> dict:
+        """
+        Get the fingerprint of every source imported so far
+
+            Returns:
+                dict[str, str]: The fingerprint per source
+        """
+        return dict(self._query_fetch("SELECT source, fingerprint FROM imports"))
+
+    def compaction_horizon(self) -> str:
+        """
+        Get the first day that still has raw sessions, earlier days only
+        exist in daily_usage
+
+            Returns:
+                str: The day, or "" if nothing has been compacted
+        """
+        return self._query_fetch("SELECT horizon FROM compaction")[0][0]
+
+    def _database_bytes(self) -> int:
+        connection = self._connect()
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        return page_size * page_count
+
+    def compact(
+        self,
+        keep_days: int,
+        batch_size: int = 5000,
+        pause: float = 0.0,
+        vacuum_pages: int = 256,
+        should_continue: callable = None,
+        today: Date = None,
+    ) -> dict:
+        """
+        Fold raw sessions older than keep_days into the rollup and free the space
+
+        The rollup already holds the time and opens of every session, so
+        folding a day means moving the horizon past it and deleting its raw
+        sessions. That happens in transactions of batch_size rows, with a
+        pause in between, so the writer of the scan loop never waits longer
+        than one batch. The freed pages are then returned to the file system
+        with incremental_vacuum, vacuum_pages at a time, if the file has
+        auto_vacuum = INCREMENTAL (see vacuum_full to convert an older file).
+
+            Parameters:
+                keep_days (int): The number of days raw sessions are kept for
+                batch_size (int): The maximum number of sessions deleted per transaction
+                pause (float): The seconds to wait between transactions
+                vacuum_pages (int): The maximum number of pages freed per transaction
+                should_continue (callable): Checked between transactions, the
+                    compaction stops early when it returns False
+                today (date): The day to count back from, today by default
+
+            Returns:
+                dict: The horizon, the number of sessions folded, the number of
+                    transactions, the size before and after, and the bytes reclaimed
+        """
+        should_continue = should_continue or (lambda: True)
+        started = _time.perf_counter()
+        horizon = str((today or Date.today()) - TimeDelta(days=keep_days))
+        bytes_before = self._database_bytes()
+
+        connection = self._connect()
+        with _WRITE_LATENCY.time(), connection:
+            # The horizon only moves forward, raw sessions already folded are gone
+            connection.execute(
+                "UPDATE compaction SET horizon = (?) WHERE horizon < (?)", (horizon, horizon)
+            )
+        horizon = self.compaction_horizon()
+
+        folded = 0
+        transactions = 0
+        while should_continue():
+            with _WRITE_LATENCY.time(), connection:
+                deleted = connection.execute(
+                    "DELETE FROM sessions WHERE id IN "
+                    "(SELECT id FROM sessions WHERE day < (?) LIMIT (?))",
+                    (horizon, batch_size),
+                ).rowcount
+            transactions += 1
+            folded += deleted
+            if deleted < batch_size:
+                break
+            if pause:
+                _time.sleep(pause)
+
+        incremental = connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        while incremental and should_continue():
+            if not connection.execute("PRAGMA freelist_count").fetchone()[0]:
+                break
+            with _WRITE_LATENCY.time():
+                connection.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})").fetchall()
+            transactions += 1
+            if pause:
+                _time.sleep(pause)
+        connection.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+        bytes_after = self._database_bytes()
+        return {
+            "horizon": horizon,
+            "sessions_folded": folded,
+            "transactions": transactions,
+            "incremental_vacuum": incremental,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": bytes_before - bytes_after,
+            "seconds": _time.perf_counter() - started,
+        }
+
+    def vacuum_full(self) -> int:
+        """
+        Rewrite the whole file with auto_vacuum = INCREMENTAL, so compact()
+        can return freed space from then on. This blocks every writer until
+        it is done, so it is not done in the background.
+
+            Returns:
+                int: The bytes reclaimed
+        """
+        bytes_before = self._database_bytes()
+        connection = self._connect()
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        with _WRITE_LATENCY.time():
+            connection.execute("VACUUM")
+        return bytes_before - self._database_bytes()
@@ -0,0 +1,256 @@
+"""
+Crash-safe journal for the session that is still open
+"""
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+# crc32, sequence, start_time, heartbeat (or end_time), length of the
+# application name
+_RECORD = struct.Struct("<IIddH")
+
+
+class SessionJournal:
+    """
+    Keeps the open session in a small memory-mapped file so it survives a
+    crash or kill. Updates are plain memory writes, so heartbeats are cheap
+    enough to do on every tick, and nothing touches SQLite until the session
+    is replayed.
+
+    The file holds two slots that are written alternately, each with a
+    sequence number and a checksum. A write that is torn halfway leaves the
+    other slot intact, and recover() picks the newest valid one.
+
+    A session that closed is held in one of the entries after the slots until
+    the writer has committed it, so the next session can start without losing
+    the one still waiting in the writer's batch. When every entry is in use,
+    further sessions are not held until one is released.
+
+        Example
+        -------
+            >>> journal = SessionJournal("time_tracking.journal")
+            >>> journal.begin("Docs", time.time())
+            >>> journal.heartbeat(time.time())
+            >>> application, start_time, heartbeat = journal.recover()
+            >>> journal.hold("Docs", start_time, end_time)
+            >>> journal.release("Docs", start_time, end_time)
+
+        Methods
+        --------
+            >>> begin(application, start_time): Start journaling a new session
+            >>> heartbeat(now): Record that the session is still open
+            >>> clear(): Record that no session is open
+            >>> recover(): Get the session that was open when the journal was last written
+            >>> hold(application, start_time, end_time): Keep a closed session until it is committed
+            >>> release(application, start_time, end_time): The held session is committed
+            >>> held(): Get the closed sessions that were never committed
+            >>> release_all(): Release every held session
+            >>> flush(): Ask the operating system to write the journal to disk
+            >>> close(): Unmap and close the file
+    """
+
+    slot_size = 2048
+    entry_size = 512
+    entry_count = 128
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the journal, creating it if it does not exist
+
+            Parameters:
+                path (str): The path to the journal file
+        """
+        self.path = path
+        size = self.slot_size * 2 + self.entry_size * self.entry_count
+        if not os.path.exists(path):
+            with open(path, "wb"):
+                pass
+        self._file = open(path, "r+b")  # pylint: disable=consider-using-with
+        if os.path.getsize(path) < size:
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+        self._sequence = max(
+            (record[1] for record in self._read_slots() if record is not None),
+            default=0,
+        )
+        self._application = b""
+        self._start_time = 0.0
+
+        # (application, start_time, end_time) -> entry, for the held sessions
+        self._lock = threading.Lock()
+        self._held = {}
+        for entry, session in enumerate(self._read_entries()):
+            if session is not None:
+                self._held[session] = entry
+
+    def _read_record(self, offset: int, size: int) -> tuple:
+        crc, sequence, start_time, heartbeat, length = _RECORD.unpack_from(self._map, offset)
+        end = offset + _RECORD.size + length
+        if length > size - _RECORD.size or zlib.crc32(self._map[offset + 4 : end]) != crc:
+            return None
+        application = self._map[offset + _RECORD.size : end].decode("utf-8")
+        return application, sequence, start_time, heartbeat
+
+    def _write_record(
+        self, offset: int, sequence: int, start_time: float, heartbeat: float, application: bytes
+    ) -> None:
+        body = _RECORD.pack(0, sequence, start_time, heartbeat, len(application))[4:] + application
+        self._map[offset + 4 : offset + 4 + len(body)] = body
+        self._map[offset : offset + 4] = struct.pack("<I", zlib.crc32(body))
+
+    def _read_slots(self) -> list:
+        return [self._read_record(slot * self.slot_size, self.slot_size) for slot in range(2)]
+
+    def _read_entries(self) -> list:
+        entries = []
+        for entry in range(self.entry_count):
+            record = self._read_record(self._entry_offset(entry), self.entry_size)
+            if record is None or not record[0]:
+                entries.append(None)
+            else:
+                application, _, start_time, end_time = record
+                entries.append((application, start_time, end_time))
+        return entries
+
+    def _entry_offset(self, entry: int) -> int:
+        return self.slot_size * 2 + entry * self.entry_size
+
+    def _write(self, heartbeat: float) -> None:
+        self._sequence += 1
+        offset = (self._sequence % 2) * self.slot_size
+        self._write_record(
+            offset, self._sequence, self._start_time, heartbeat, self._application
+        )
+
+    @staticmethod
+    def _encode(application: str, size: int) -> bytes:
+        # Cut at a character boundary so the name fits the slot or entry
+        encoded = application.encode("utf-8")[: size - _RECORD.size]
+        return encoded.decode("utf-8", "ignore").encode("utf-8")
+
+    def begin(self, application: str, start_time: float) -> None:
+        """
+        Start journaling a new session
+
+            Parameters:
+                application (str): The name of the application
+                start_time (float): The unix time the session started
+        """
+        self._application = self._encode(application, self.slot_size)
+        self._start_time = start_time
+        self._write(start_time)
+
+    def heartbeat(self, now: float) -> None:
+        """
+        Record that the session is still open
+
+            Parameters:
+                now (float): The current unix time
+        """
+        if self._application:
+            self._write(now)
+
+    def clear(self) -> None:
+        """
+        Record that no session is open
+        """
+        self._application = b""
+        self._start_time = 0.0
+        self._write(0.0)
+
+    def recover(self):
+        """
+        Get the session that was open when the journal was last written
+
+            Returns:
+                tuple: (application, start_time, heartbeat), or None if no
+                    session was open
+        """
+        records = [record for record in self._read_slots() if record is not None]
+        if not records:
+            return None
+        application, _, start_time, heartbeat = max(records, key=lambda r: r[1])
+        if not application:
+            return None
+        return application, start_time, heartbeat
+
+    def hold(self, application: str, start_time: float, end_time: float) -> bool:
+        """
+        Keep a closed session until the writer has committed it
+
+            Parameters:
+                application (str): The name of the application
+                start_time (float): The unix time the session started
+                end_time (float): The unix time the session ended
+
+            Returns:
+                bool: False if every entry is in use and the session is not held
+        """
+        session = (application, start_time, end_time)
+        encoded = self._encode(application, self.entry_size)
+        with self._lock:
+            if session in self._held:
+                return True
+            used = set(self._held.values())
+            entry = next((entry for entry in range(self.entry_count) if entry not in used), None)
+            if entry is None:
+                return False
+            self._write_record(self._entry_offset(entry), 0, start_time, end_time, encoded)
+            self._held[session] = entry
+        return True
+
+    def release(self, application: str, start_time: float, end_time: float) -> None:
+        """
+        Free the entry of a held session, it is committed
+
+            Parameters:
+                application (str): The name of the application
+                start_time (float): The unix time the session started
+                end_time (float): The unix time the session ended
+        """
+        with self._lock:
+            entry = self._held.pop((application, start_time, end_time), None)
+            if entry is not None:
+                self._free(entry)
+
+    def _free(self, entry: int) -> None:
+        # A record without a name is never valid
+        offset = self._entry_offset(entry)
+        self._map[offset : offset + _RECORD.size] = bytes(_RECORD.size)
+
+    def held(self) -> list:
+        """
+        Get the closed sessions that are held, the ones the writer had not
+        committed yet when the journal was last written
+
+            Returns:
+                list[tuple]: The (application, start_time, end_time) sessions
+        """
+        with self._lock:
+            return sorted(self._held, key=lambda session: session[1])
+
+    def release_all(self) -> None:
+        """
+        Release every held session
+        """
+        with self._lock:
+            for entry in self._held.values():
+                self._free(entry)
+            self._held = {}
+
+    def flush(self) -> None:
+        """
+        Ask the operating system to write the journal to disk
+        """
+        self._map.flush()
+
+    def close(self) -> None:
+        """
+        Unmap and close the file
+        """
+        self._map.close()
+        self._file.close()
@@ -0,0 +1,185 @@
+"""
+In-memory running totals for the live dashboard
+"""
+
+from datetime import date as Date
+import threading
+
+from db import Database
+
+
+class LiveTotals:
+    """
+    Keeps the time and opens per application and per day in memory. It is
+    seeded once from the rollup, then every session that closes is added as
+    it is reported, so the dashboard never has to read the database. The
+    session that is still open counts up to the time the totals are read.
+
+    Every change bumps a version, and changes(version) only returns the
+    applications that changed after it, plus the open one.
+
+        Example
+        -------
+            >>> totals = LiveTotals()
+            >>> totals.seed(database)
+            >>> totals.open("Docs", 100.0)
+            >>> totals.add("Docs", 100.0, 160.0)
+            >>> version, rows = totals.changes(0, time.time())
+
+        Methods
+        --------
+            >>> seed(database): Load the totals from the daily rollup
+            >>> add(application, start_time, end_time): Count a closed session
+            >>> open(application, start_time): Count a session that is still open
+            >>> rows(now, day): Get the row of every application
+            >>> changes(version, now, day): Get the rows changed since a version
+            >>> day_of(timestamp): Get the day a session is counted on
+    """
+
+    def __init__(self) -> None:
+        """
+        Create empty totals
+        """
+        self._lock = threading.Lock()
+        # application -> [seconds, opens] and day -> {application: seconds}
+        self._applications = {}
+        self._days = {}
+        # (application, start_time) of the session that is still open
+        self._open = None
+        # application -> the version it last changed in
+        self._changed = {}
+        self.version = 0
+
+    @staticmethod
+    def day_of(timestamp: float) -> str:
+        """
+        Get the day a session is counted on, the same as in the database
+
+            Parameters:
+                timestamp (float): The unix time the session started
+
+            Returns:
+                str: The day as YYYY-MM-DD
+        """
+        return Date.fromtimestamp(timestamp).isoformat()
+
+    def seed(self, database: Database) -> None:
+        """
+        Load the totals from the daily rollup, the only read of the database
+
+            Parameters:
+                database (Database): The database to read
+        """
+        applications = {}
+        days = {}
+        for application, day, seconds, opens in database.usage_by_day():
+            totals = applications.setdefault(application, [0, 0])
+            totals[0] += seconds
+            totals[1] += opens
+            days.setdefault(day, {})[application] = seconds
+
+        with self._lock:
+            self._applications = applications
+            self._days = days
+            self.version += 1
+            self._changed = dict.fromkeys(applications, self.version)
+
+    def add(self, application: str, start_time: float, end_time: float) -> None:
+        """
+        Count a closed session
+
+            Parameters:
+                application (str): The name of the application
+                start_time (float): The unix time the session started
+                end_time (float): The unix time the session ended
+        """
+        # Rounded like the database rounds, so the totals stay equal to it
+        seconds = round(end_time) - round(start_time)
+        day = self.day_of(start_time)
+        with self._lock:
+            totals = self._applications.setdefault(application, [0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+            by_application = self._days.setdefault(day, {})
+            by_application[application] = by_application.get(application, 0) + seconds
+            if self._open == (application, start_time):
+                self._open = None
+            self._touch(application)
+
+    def open(self, application: str, start_time: float) -> None:
+        """
+        Count a session that is still open
+
+            Parameters:
+                application (str): The name of the application, or None (or
+                    an empty name) if no session is open
+                start_time (float): The unix time the session started
+        """
+        with self._lock:
+            if self._open is not None:
+                self._touch(self._open[0])
+            if application is None or application.strip() == "":
+                self._open = None
+            else:
+                self._open = (application, start_time)
+                self._touch(application)
+
+    def _touch(self, application: str) -> None:
+        self.version += 1
+        self._changed[application] = self.version
+
+    def _row(self, application: str, now: float, day: str) -> tuple:
+        seconds, opens = self._applications.get(application, (0, 0))
+        today = self._days.get(day, {}).get(application, 0)
+        if self._open is not None and self._open[0] == application:
+            running = max(now - self._open[1], 0)
+            seconds += running
+            opens += 1
+            if self.day_of(self._open[1]) == day:
+                today += running
+        return (application, today, seconds, opens)
+
+    def rows(self, now: float, day: str = None) -> list:
+        """
+        Get the row of every application
+
+            Parameters:
+                now (float): The unix time the open session counts up to
+                day (str): The day counted as today, by default the day of now
+
+            Returns:
+                list[tuple]: The (application, seconds today, seconds, opens) rows
+        """
+        day = day or self.day_of(now)
+        with self._lock:
+            applications = set(self._applications)
+            if self._open is not None:
+                applications.add(self._open[0])
+            return [self._row(application, now, day) for application in applications]
+
+    def changes(self, version: int, now: float, day: str = None) -> tuple:
+        """
+        Get the rows of the applications that changed after a version, the
+        application of the open session always counts as changed
+
+            Parameters:
+                version (int): The version returned by the last call, or -1
+                    for every row
+                now (float): The unix time the open session counts up to
+                day (str): The day counted as today, by default the day of now
+
+            Returns:
+                int, list[tuple]: The current version and the changed
+                    (application, seconds today, seconds, opens) rows
+        """
+        day = day or self.day_of(now)
+        with self._lock:
+            applications = [
+                application
+                for application, changed in self._changed.items()
+                if changed > version
+            ]
+            if self._open is not None and self._open[0] not in applications:
+                applications.append(self._open[0])
+            rows = [self._row(application, now, day) for application in applications]
+            return self.version, rows
@@ -29,14 +29,142 @@ The GUI should also allow you to:
 """
 
 
-from time_tracker import TimeTracker
+import argparse
 
 
 def main():
     """
     This is the main function.
     """
-    time_tracker = TimeTracker()
+    parser = argparse.ArgumentParser(description="Track time spent in applications")
+    commands = parser.add_subparsers(dest="command")
+    gui = commands.add_parser("gui", help="Open the time tracker window (default)")
+    daemon = commands.add_parser(
+        "daemon", help="Track in the background without a window"
+    )
+    daemon.add_argument(
+        "--metrics-port", type=int, help="serve Prometheus metrics on this localhost port"
+    )
+    daemon.add_argument("--metrics-snapshot", help="write JSON metrics to this file")
+    daemon.add_argument(
+        "--metrics-interval", type=float, default=60.0, help="seconds between snapshots"
+    )
+    daemon.add_argument(
+        "--min-dwell",
+        type=float,
+        default=1.0,
+        help="seconds a window must be active to count as its own session",
+    )
+    daemon.add_argument(
+        "--keep-days", type=int, help="compact raw sessions older than this in the background"
+    )
+    for command in (gui, daemon):
+        command.add_argument(
+            "--engine",
+            choices=["thread", "async"],
+            default="thread",
+            help="scan on a worker thread or on an asyncio event loop",
+        )
+    stats = commands.add_parser("stats", help="Print the time spent per application")
+    stats.add_argument("--start", help="first date to include, YYYY-MM-DD")
+    stats.add_argument("--end", help="last date to include, YYYY-MM-DD")
+    stats.add_argument("--limit", type=int, help="number of applications to show")
+    stats.add_argument(
+        "--order-by", choices=["time", "opens", "name"], default="time"
+    )
+    commands.add_parser(
+        "rebuild-rollup", help="Recompute the daily usage rollup from the sessions"
+    )
+    compact = commands.add_parser(
+        "compact", help="Fold old raw sessions into the daily usage rollup"
+    )
+    compact.add_argument(
+        "--keep-days", type=int, default=90, help="days raw sessions are kept for"
+    )
+    compact.add_argument(
+        "--full-vacuum",
+        action="store_true",
+        help="rewrite the file first so freed space can be returned (blocks writers)",
+    )
+    merge = commands.add_parser(
+        "merge", help="Import the sessions of other time tracker databases"
+    )
+    merge.add_argument("sources", nargs="+", help="databases to import")
+    merge.add_argument(
+        "--policy",
+        choices=["trim", "skip", "keep"],
+        default="trim",
+        help="how sessions overlapping existing ones are imported",
+    )
+    merge.add_argument("--workers", type=int, help="number of staging processes")
+    args = parser.parse_args()
+
+    # Each command only imports what it uses, so the daemon and one-shot
+    # commands never load tkinter
+    # pylint: disable=import-outside-toplevel
+    if args.command == "daemon":
+        from daemon import run_daemon
+
+        run_daemon(
+            metrics_port=args.metrics_port,
+            metrics_snapshot=args.metrics_snapshot,
+            metrics_interval=args.metrics_interval,
+            keep_days=args.keep_days,
+            min_dwell=args.min_dwell,
+            engine=args.engine,
+        )
+        return
+
+    if args.command == "stats":
+        from db import Database
+        from utils.string_utils import seconds_to_hms_str
+
+        with Database("time_tracking.db") as database:
+            rows = database.app_summary(args.start, args.end, args.limit, args.order_by)
+        for app_name, app_seconds, app_opens in rows:
+            print(f"{app_name:<50} {seconds_to_hms_str(int(app_seconds)):>12} {app_opens:>8}")
+        return
+
+    if args.command == "rebuild-rollup":
+        from db import Database
+
+        with Database("time_tracking.db") as database:
+            database.rebuild_daily_usage()
+        return
+
+    if args.command == "compact":
+        from db import Database
+
+        with Database("time_tracking.db") as database:
+            if args.full_vacuum:
+                print(f"Full vacuum reclaimed {database.vacuum_full()} bytes")
+            compaction = database.compact(args.keep_days)
+        print(
+            f"Folded {compaction['sessions_folded']} sessions before {compaction['horizon']}, "
+            f"reclaimed {compaction['bytes_reclaimed']} bytes"
+        )
+        return
+
+    if args.command == "merge":
+        from db import Database
+        from merge import merge_databases
+
+        def report(result):
+            if result.get("skipped"):
+                print(f"{result['source']}: already imported")
+            else:
+                print(
+                    f"{result['source']}: {result['rows_imported']} of "
+                    f"{result['rows_read']} sessions imported"
+                )
+
+        with Database("time_tracking.db") as database:
+            merge_databases(database, args.sources, args.policy, args.workers, on_progress=report)
+        return
+
+    from time_tracker import TimeTracker
+
+    time_tracker = TimeTracker(engine=getattr(args, "engine", "thread"))
     time_tracker.run()
 
 
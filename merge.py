@@ -0,0 +1,200 @@
+"""
+Merges the databases of several machines into one
+
+Every source is first normalized into a small staging database by a pool
+of worker processes: names are trimmed, empty and zero length sessions are
+dropped, exact duplicates removed and overlaps within the source trimmed.
+The staging databases are then attached to the target one at a time, in
+the order the sources were given, and copied over in one transaction per
+source. That transaction also records the source in the imports table, so
+an interrupted merge picks up where it left off when run again.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from db import Database
+
+# Rows read from a source and written to its staging database at a time
+STAGE_CHUNK_SIZE = 50000
+
+
+def fingerprint(path: str) -> str:
+    """
+    Identify the version of a source file, a changed file is imported again.
+    Sources are in WAL mode, so sessions that are not checkpointed yet only
+    change the -wal file next to it
+
+        Parameters:
+            path (str): The source database
+
+        Returns:
+            str: The size and modification time of the file and its -wal file
+    """
+    stat = os.stat(path)
+    version = f"{stat.st_size}:{stat.st_mtime_ns}"
+    # Reading the source leaves an empty -wal file behind, which is no change
+    if os.path.exists(path + "-wal") and os.path.getsize(path + "-wal") > 0:
+        wal = os.stat(path + "-wal")
+        version += f":{wal.st_size}:{wal.st_mtime_ns}"
+    return version
+
+
+def _read_sessions(path: str, directory: str):
+    """
+    Open a source for reading without changing it
+
+    Sources with the current layout are opened read only. Older ones are
+    copied into the staging directory and migrated there by Database.
+
+        Parameters:
+            path (str): The source database
+            directory (str): Where a copy can be made
+
+        Returns:
+            sqlite3.Connection: A connection with sessions and applications tables
+    """
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    if connection.execute("PRAGMA user_version").fetchone()[0] >= 2:
+        return connection
+    connection.close()
+
+    copy = os.path.join(directory, "legacy.db")
+    shutil.copyfile(path, copy)
+    Database(copy).close()
+    return sqlite3.connect(copy)
+
+
+def stage_source(source: str, staging_path: str) -> dict:
+    """
+    Normalize one source into a staging database, run in a worker process
+
+        Parameters:
+            source (str): The source database
+            staging_path (str): The staging database to create
+
+        Returns:
+            dict: The source, staging path, fingerprint and row counts
+    """
+    result = {
+        "source": source,
+        "staging_path": staging_path,
+        "fingerprint": fingerprint(source),
+        "rows_read": 0,
+        "rows_staged": 0,
+    }
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(staging_path)) as directory:
+        reader = _read_sessions(source, directory)
+        writer = sqlite3.connect(staging_path)
+        try:
+            writer.execute("PRAGMA journal_mode = OFF")
+            writer.execute("PRAGMA synchronous = OFF")
+            writer.execute("DROP TABLE IF EXISTS staged")
+            writer.execute(
+                "CREATE TABLE staged (app TEXT NOT NULL, start_time INTEGER NOT NULL, "
+                "end_time INTEGER NOT NULL, day TEXT NOT NULL)"
+            )
+            cursor = reader.execute(
+                "SELECT TRIM(applications.name), sessions.start_time, sessions.end_time, "
+                "sessions.day FROM sessions "
+                "JOIN applications ON applications.id = sessions.app_id "
+                "ORDER BY sessions.start_time, sessions.end_time"
+            )
+            last_end = None
+            last_row = None
+            while True:
+                rows = cursor.fetchmany(STAGE_CHUNK_SIZE)
+                if not rows:
+                    break
+                result["rows_read"] += len(rows)
+                staged = []
+                for row in rows:
+                    application, start_time, end_time, day = row
+                    if row == last_row:
+                        continue
+                    last_row = row
+                    # One machine has one active window, so a session that
+                    # starts before the previous one ended is trimmed
+                    if last_end is not None and start_time < last_end:
+                        start_time = last_end
+                        day = Database._day(start_time)  # pylint: disable=protected-access
+                    if not application or end_time <= start_time:
+                        continue
+                    last_end = end_time
+                    staged.append((application, start_time, end_time, day))
+                writer.executemany("INSERT INTO staged VALUES (?, ?, ?, ?)", staged)
+                result["rows_staged"] += len(staged)
+            writer.execute("CREATE INDEX staged_day ON staged (day)")
+            writer.commit()
+        finally:
+            reader.close()
+            writer.close()
+    return result
+
+
+def merge_databases(
+    database: Database,
+    sources: list,
+    policy: str = "trim",
+    workers: int = None,
+    staging_dir: str = None,
+    on_progress: callable = None,
+) -> list:
+    """
+    Merge several source databases into a database
+
+        Parameters:
+            database (Database): The database to merge into
+            sources (list[str]): The source databases, earlier ones win overlaps
+            policy (str): How overlaps with sessions already in the database
+                are resolved, see Database.MERGE_POLICIES
+            workers (int): The number of staging processes, None for one per CPU
+            staging_dir (str): Where the staging databases are written, a
+                temporary directory by default
+            on_progress (callable): Called with the result of every source
+
+        Returns:
+            list[dict]: Per source, the row counts, or "skipped" if it was
+                imported before and has not changed since
+    """
+    if policy not in Database.MERGE_POLICIES:
+        raise ValueError(f"Unknown policy: {policy}")
+
+    imported = database.imported_sources()
+    results = []
+    pending = []
+    for source in sources:
+        source = os.path.abspath(source)
+        if imported.get(source) == fingerprint(source):
+            results.append({"source": source, "skipped": True})
+            if on_progress is not None:
+                on_progress(results[-1])
+        else:
+            pending.append(source)
+    if not pending:
+        return results
+
+    with tempfile.TemporaryDirectory(dir=staging_dir) as directory:
+        staging_paths = [
+            os.path.join(directory, f"staging-{index}.db") for index in range(len(pending))
+        ]
+        with ProcessPoolExecutor(workers) as pool:
+            # map() hands the results back in source order while later
+            # sources are still being staged
+            for result in pool.map(stage_source, pending, staging_paths):
+                result["rows_imported"] = database.import_staged(
+                    result["staging_path"],
+                    result["source"],
+                    result["fingerprint"],
+                    result["rows_read"],
+                    policy,
+                )
+                os.remove(result["staging_path"])
+                del result["staging_path"]
+                results.append(result)
+                if on_progress is not None:
+                    on_progress(result)
+    return results
@@ -0,0 +1,362 @@
+"""
+In-process metrics for the scan loop and the storage
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import bisect
+import json
+import os
+import threading
+import time
+
+# Upper bounds in seconds, from 50 microseconds to 10 seconds
+DEFAULT_BOUNDS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Counter:
+    """
+    A number that only goes up
+
+        Methods
+        --------
+            >>> inc(amount): Add to the counter
+    """
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        """
+        Add to the counter
+
+            Parameters:
+                amount (int): How much to add
+        """
+        with self._lock:
+            self.value += amount
+
+
+class LatencyHistogram:
+    """
+    Counts observations into fixed buckets, so recording one costs a binary
+    search and an increment no matter how many have been recorded
+
+        Example
+        -------
+            >>> histogram = LatencyHistogram("query_seconds", "Query latency")
+            >>> with histogram.time():
+            ...     run_query()
+
+        Methods
+        --------
+            >>> observe(seconds): Record an observation
+            >>> time(): Context manager that records how long its body took
+            >>> quantile(fraction): Estimate a quantile from the buckets
+    """
+
+    def __init__(self, name: str, description: str, bounds: tuple = DEFAULT_BOUNDS) -> None:
+        self.name = name
+        self.description = description
+        self.bounds = tuple(bounds)
+        # One more bucket than bounds, for observations above the last bound
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        """
+        Record an observation
+
+            Parameters:
+                seconds (float): The observed value
+        """
+        index = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def time(self):
+        """
+        Context manager that records how long its body took
+
+            Returns:
+                _Timer: The context manager
+        """
+        return _Timer(self)
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimate a quantile from the buckets
+
+            Parameters:
+                fraction (float): The quantile between 0 and 1
+
+            Returns:
+                float: The upper bound of the bucket holding the quantile, or
+                    infinity if it is above the last bound
+        """
+        with self._lock:
+            buckets, count = list(self.buckets), self.count
+        if not count:
+            return 0.0
+        target = fraction * count
+        seen = 0
+        for index, bucket in enumerate(buckets):
+            seen += bucket
+            if seen >= target and bucket:
+                return self.bounds[index] if index < len(self.bounds) else float("inf")
+        return float("inf")
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: LatencyHistogram) -> None:
+        self.histogram = histogram
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Metrics:
+    """
+    A registry of counters and histograms, with Prometheus text and JSON
+    exports. Everything is kept in memory and only formatted when read, so
+    recording stays cheap enough to leave on.
+
+        Example
+        -------
+            >>> METRICS.counter("sessions_written_total", "Sessions written").inc()
+            >>> METRICS.serve(9464)
+            >>> METRICS.start_snapshots("metrics.json", interval=60)
+
+        Methods
+        --------
+            >>> counter(name, description): Get or create a counter
+            >>> histogram(name, description, bounds): Get or create a histogram
+            >>> render_prometheus(): Format every metric as Prometheus text
+            >>> snapshot(): Get every metric as a dict
+            >>> write_snapshot(path, keep): Write the snapshot as JSON, rotating old files
+            >>> serve(port, host): Serve the Prometheus text over HTTP
+            >>> start_snapshots(path, interval, keep): Write snapshots periodically
+            >>> stop(): Stop the server and the snapshot thread
+    """
+
+    def __init__(self, prefix: str = "timetracker_") -> None:
+        """
+        Create an empty registry
+
+            Parameters:
+                prefix (str): Put in front of every metric name on export
+        """
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._stop_snapshots = threading.Event()
+        self._snapshot_thread = None
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        """
+        Get or create a counter
+
+            Parameters:
+                name (str): The name of the counter
+                description (str): What the counter counts
+
+            Returns:
+                Counter: The counter
+        """
+        return self._get(name, lambda: Counter(name, description))
+
+    def histogram(
+        self, name: str, description: str = "", bounds: tuple = DEFAULT_BOUNDS
+    ) -> LatencyHistogram:
+        """
+        Get or create a histogram
+
+            Parameters:
+                name (str): The name of the histogram
+                description (str): What the histogram measures
+                bounds (tuple[float]): The bucket upper bounds
+
+            Returns:
+                LatencyHistogram: The histogram
+        """
+        return self._get(name, lambda: LatencyHistogram(name, description, bounds))
+
+    def _get(self, name: str, create: callable):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = create()
+            return metric
+
+    def render_prometheus(self) -> str:
+        """
+        Format every metric in the Prometheus text exposition format
+
+            Returns:
+                str: The metrics
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        lines = []
+        for metric in metrics:
+            name = self.prefix + metric.name
+            if metric.description:
+                lines.append(f"# HELP {name} {metric.description}")
+            if isinstance(metric, Counter):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {metric.value}")
+                continue
+
+            lines.append(f"# TYPE {name} histogram")
+            with metric._lock:  # pylint: disable=protected-access
+                buckets, count, total = list(metric.buckets), metric.count, metric.sum
+            cumulative = 0
+            for bound, bucket in zip(metric.bounds, buckets):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{name}_sum {total:.9g}")
+            lines.append(f"{name}_count {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """
+        Get every metric as a dict
+
+            Returns:
+                dict: Counter values, and count, sum and quantiles per histogram
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        snapshot = {"time": time.time(), "counters": {}, "histograms": {}}
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                snapshot["counters"][metric.name] = metric.value
+                continue
+            quantiles = {"p50": metric.quantile(0.5), "p99": metric.quantile(0.99)}
+            snapshot["histograms"][metric.name] = {
+                "count": metric.count,
+                "sum": metric.sum,
+                # Above the last bound is written as null to keep the file valid JSON
+                **{
+                    key: None if value == float("inf") else value
+                    for key, value in quantiles.items()
+                },
+            }
+        return snapshot
+
+    def write_snapshot(self, path: str, keep: int = 5) -> None:
+        """
+        Write the snapshot as JSON, keeping the previous ones as path.1 to path.<keep>
+
+            Parameters:
+                path (str): The file to write
+                keep (int): The number of earlier snapshots to keep
+        """
+        for index in range(keep, 0, -1):
+            older = f"{path}.{index - 1}" if index > 1 else path
+            if os.path.exists(older):
+                os.replace(older, f"{path}.{index}")
+
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file, indent=4)
+        os.replace(temporary, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serve the Prometheus text over HTTP on a background thread
+
+            Parameters:
+                port (int): The port to listen on, 0 picks a free one
+                host (str): The address to listen on, localhost by default
+
+            Returns:
+                tuple: The (host, port) the server listens on
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """
+            Answers every GET with the metrics
+            """
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """
+                Send the metrics
+                """
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=self._server.serve_forever, name="MetricsServer", daemon=True
+        ).start()
+        return self._server.server_address
+
+    def start_snapshots(self, path: str, interval: float = 60.0, keep: int = 5) -> None:
+        """
+        Write a snapshot every interval seconds on a background thread
+
+            Parameters:
+                path (str): The file to write
+                interval (float): The seconds between snapshots
+                keep (int): The number of earlier snapshots to keep
+        """
+
+        def run():
+            while not self._stop_snapshots.wait(interval):
+                self.write_snapshot(path, keep)
+            self.write_snapshot(path, keep)
+
+        self._stop_snapshots.clear()
+        self._snapshot_thread = threading.Thread(
+            target=run, name="MetricsSnapshots", daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the server and the snapshot thread, writing a last snapshot
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._snapshot_thread is not None:
+            self._stop_snapshots.set()
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+
+# The registry the tracker records into
+METRICS = Metrics()
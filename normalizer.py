@@ -0,0 +1,157 @@
+"""
+Rule based normalization of window titles
+"""
+
+import functools
+import json
+import os
+import re
+
+# Each rule matches the application name and the window title of one backend
+# and rewrites either of them. Named groups in the patterns can be used in
+# the replacements, along with {application} and {window} for the originals.
+# The first matching rule wins.
+DEFAULT_RULES = [
+    {
+        "backend": "darwin",
+        "application": "Safari",
+        "window": "(?P<title>.*) - Safari",
+        "set_window": "{title}",
+    },
+    {
+        "backend": "darwin",
+        "application": "Google Chrome",
+        "window": "(?P<title>.*) - Google Chrome",
+        "set_window": "{title}",
+    },
+    {
+        "backend": "darwin",
+        "application": ".*Code.*",
+        "window": ".*",
+        "set_window": "Visual Studio Code",
+    },
+    {
+        "backend": "darwin",
+        "application": "iTerm2",
+        "window": ".*",
+        "set_window": "Terminal",
+    },
+    {
+        "backend": "win32",
+        "application": ".*",
+        "window": "(?:.*[-—])?\\s*(?P<title>[^-—]*?)\\s*[-—]\\s*(?P<app>[^-—]*?)\\s*",
+        "set_application": "{app}",
+        "set_window": "{title}",
+    },
+    {
+        "backend": "x11",
+        "application": ".*",
+        "window": "(?P<title>.*) [-—] (?:Mozilla Firefox|Google Chrome|Chromium)",
+        "set_window": "{title}",
+    },
+]
+
+_GROUP_NAME = re.compile(r"\(\?P<(\w+)>")
+
+
+class TitleNormalizer:
+    """
+    Compiles normalization rules into one combined pattern and remembers the
+    result for every (application, window) pair it has seen, so a repeated
+    title costs a single cache lookup
+
+        Example
+        -------
+            >>> normalizer = TitleNormalizer.for_backend("darwin")
+            >>> normalizer.normalize("Safari", "Docs - Safari")
+            ('Safari', 'Docs')
+
+        Methods
+        --------
+            >>> for_backend(backend, path): Load the rules for a backend
+            >>> normalize(application, window): Normalize a pair of names
+            >>> cache_info(): Get the cache hit and miss counters
+    """
+
+    def __init__(self, rules: list, cache_size: int = 4096) -> None:
+        """
+        Compile the rules
+
+            Parameters:
+                rules (list[dict]): The rules, in order of priority
+                cache_size (int): The number of normalized pairs to remember
+        """
+        self.rules = list(rules)
+        alternatives = []
+        outputs = {}
+        for index, rule in enumerate(self.rules):
+            prefix = f"r{index}_"
+            application = _GROUP_NAME.sub(
+                rf"(?P<{prefix}\1>", rule.get("application", ".*")
+            )
+            window = _GROUP_NAME.sub(rf"(?P<{prefix}\1>", rule.get("window", ".*"))
+            alternatives.append(
+                f"(?P<r{index}>(?:{application})\x00(?:{window}))"
+            )
+            outputs[f"r{index}"] = (
+                prefix,
+                rule.get("set_application"),
+                rule.get("set_window"),
+            )
+        self._pattern = re.compile(
+            "(?:" + "|".join(alternatives) + r")\Z" if alternatives else r"(?!)",
+            re.DOTALL,
+        )
+        # The outer group of the matching rule is always the last one to close
+        self._rule_outputs = {
+            self._pattern.groupindex[name]: output
+            for name, output in outputs.items()
+        }
+        self.normalize = functools.lru_cache(maxsize=cache_size)(self._normalize)
+
+    @classmethod
+    def for_backend(cls, backend: str, path: str = None):
+        """
+        Load the rules for a backend
+
+            Parameters:
+                backend (str): The name of the window source backend
+                path (str): A JSON file with a list of rules, defaults to
+                    $TIMETRACKER_RULES, and the built in rules if that is unset
+
+            Returns:
+                TitleNormalizer: The normalizer
+        """
+        path = path or os.environ.get("TIMETRACKER_RULES")
+        rules = DEFAULT_RULES
+        if path:
+            with open(path, encoding="utf-8") as rules_file:
+                rules = json.load(rules_file)
+        return cls(rule for rule in rules if rule.get("backend", backend) == backend)
+
+    def _normalize(self, application: str, window: str) -> tuple:
+        match = self._pattern.match(f"{application}\x00{window}")
+        if match is None:
+            return application, window
+
+        prefix, set_application, set_window = self._rule_outputs[match.lastindex]
+        groups = {"application": application, "window": window}
+        groups.update(
+            (name[len(prefix) :], value or "")
+            for name, value in match.groupdict().items()
+            if name.startswith(prefix)
+        )
+        if set_application is not None:
+            application = set_application.format(**groups)
+        if set_window is not None:
+            window = set_window.format(**groups)
+        return application, window
+
+    def cache_info(self):
+        """
+        Get the cache hit and miss counters
+
+            Returns:
+                functools._CacheInfo: The cache statistics
+        """
+        return self.normalize.cache_info()
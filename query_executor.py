@@ -0,0 +1,155 @@
+"""
+Runs database queries off the Tk thread
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import traceback
+
+
+class QueryExecutor:
+    """
+    Runs queries on worker threads and hands the results back to Tk by
+    polling a result queue with after(). A query submitted under the same key
+    as an earlier one supersedes it: the earlier one is cancelled if it has
+    not started yet, and its result is thrown away if it has.
+
+        Example
+        -------
+            >>> executor = QueryExecutor(window)
+            >>> executor.submit("stats", database.app_summary, table.set_rows)
+
+        Methods
+        --------
+            >>> submit(key, query, on_result, on_error, on_progress): Run a query
+            >>> cancel(key): Cancel the query running under a key
+            >>> is_busy(key): Whether a query is running under a key
+            >>> shutdown(): Stop the worker threads
+    """
+
+    def __init__(self, window, max_workers: int = 2, poll_interval: int = 50) -> None:
+        """
+        Create the executor
+
+            Parameters:
+                window (tk.Misc): The widget whose after() delivers the results
+                max_workers (int): The number of worker threads
+                poll_interval (int): The milliseconds between polls of the result queue
+        """
+        self.window = window
+        self.poll_interval = poll_interval
+
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="QueryExecutor")
+        self._results = queue.Queue()
+        self._generations = {}
+        self._pending = {}
+        self._polling = False
+
+        self.completed = 0
+        self.discarded = 0
+
+    def submit(
+        self,
+        key: str,
+        query: callable,
+        on_result: callable,
+        on_error: callable = None,
+        on_progress: callable = None,
+    ) -> None:
+        """
+        Run a query on a worker thread, call this from the Tk thread
+
+            Parameters:
+                key (str): Identifies what the query is for, a newer query with
+                    the same key supersedes this one
+                query (callable): Takes no arguments and returns the result
+                on_result (callable): Called on the Tk thread with the result
+                on_error (callable): Called on the Tk thread with the exception
+                on_progress (callable): Called on the Tk thread with True when
+                    the query starts and False when it is done or superseded
+        """
+        self.cancel(key)
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+
+        if on_progress is not None:
+            on_progress(True)
+        future = self._pool.submit(self._run, key, generation, query)
+        self._pending[key] = (future, on_result, on_error, on_progress)
+        self._schedule_poll()
+
+    def cancel(self, key: str) -> None:
+        """
+        Cancel the query running under a key, its result will be discarded
+
+            Parameters:
+                key (str): The key the query was submitted under
+        """
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        future, _, _, on_progress = pending
+        self._generations[key] = self._generations.get(key, 0) + 1
+        future.cancel()
+        if on_progress is not None:
+            on_progress(False)
+
+    def is_busy(self, key: str) -> bool:
+        """
+        Whether a query is running under a key
+
+            Parameters:
+                key (str): The key the query was submitted under
+
+            Returns:
+                bool: True until the result of the query has been delivered
+        """
+        return key in self._pending
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker threads without waiting for running queries
+        """
+        self._pending.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, key: str, generation: int, query: callable) -> None:
+        try:
+            self._results.put((key, generation, query(), None))
+        except Exception as error:  # pylint: disable=broad-except
+            self._results.put((key, generation, None, error))
+
+    def _schedule_poll(self) -> None:
+        if not self._polling:
+            self._polling = True
+            self.window.after(self.poll_interval, self._poll)
+
+    def _poll(self) -> None:
+        while True:
+            try:
+                key, generation, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if generation != self._generations.get(key) or key not in self._pending:
+                self.discarded += 1
+                continue
+
+            _, on_result, on_error, on_progress = self._pending.pop(key)
+            self.completed += 1
+            try:
+                if on_progress is not None:
+                    on_progress(False)
+                if error is None:
+                    on_result(result)
+                elif on_error is not None:
+                    on_error(error)
+                else:
+                    traceback.print_exception(error)
+            except Exception:  # pylint: disable=broad-except
+                # The window the result was for may have been closed
+                traceback.print_exc()
+
+        self._polling = False
+        if self._pending:
+            self._schedule_poll()
@@ -0,0 +1,199 @@
+"""
+Backoff and logging for calls that fail repeatedly
+"""
+
+import logging
+import random
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Stops calling something that keeps failing. After failure_threshold
+    failures in a row the breaker opens and allow() returns False until a
+    delay has passed, then one trial call is let through. Every failed trial
+    doubles the delay up to max_delay, with random jitter so several
+    trackers do not retry in lockstep. A success closes the breaker again.
+
+        Example
+        -------
+            >>> breaker = CircuitBreaker(failure_threshold=3)
+            >>> if breaker.allow():
+            ...     try:
+            ...         value = call()
+            ...         breaker.record_success()
+            ...     except OSError:
+            ...         breaker.record_failure()
+
+        Methods
+        --------
+            >>> allow(): Whether a call may be made now
+            >>> record_success(): Close the breaker
+            >>> record_failure(): Count a failure, opening the breaker at the threshold
+            >>> retry_in(): Get the seconds until the next trial call
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        jitter: float = 0.2,
+        clock: callable = time.monotonic,
+        rand: callable = random.random,
+    ) -> None:
+        """
+        Create a closed breaker
+
+            Parameters:
+                failure_threshold (int): The failures in a row that open the breaker
+                base_delay (float): The seconds the breaker stays open the first time
+                max_delay (float): The longest the breaker stays open
+                jitter (float): The delay is varied by up to this fraction
+                clock (callable): Returns the current time in seconds
+                rand (callable): Returns a random number between 0 and 1
+        """
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock
+        self.rand = rand
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be made now
+
+            Returns:
+                bool: True while closed, and once per delay while open
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() >= self._retry_at:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """
+        Close the breaker
+        """
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trips = 0
+
+    def record_failure(self) -> None:
+        """
+        Count a failure, opening the breaker at the threshold
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures < self.failure_threshold:
+                return
+            delay = min(self.base_delay * 2**self.trips, self.max_delay)
+            delay *= 1 + self.jitter * (2 * self.rand() - 1)
+            self.trips += 1
+            self.state = self.OPEN
+            self._retry_at = self.clock() + delay
+
+    def retry_in(self) -> float:
+        """
+        Get the seconds until the next trial call
+
+            Returns:
+                float: The seconds left, 0 if a call is allowed now
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            return max(self._retry_at - self.clock(), 0.0)
+
+
+class RateLimitedLogger:
+    """
+    Logs key=value messages, at most one per key per interval. Messages
+    dropped in between are counted and reported with the next one.
+
+        Example
+        -------
+            >>> log = RateLimitedLogger(logging.getLogger("timetracker"), interval=60)
+            >>> log.warning("backend_error", backend="x11", error="BadWindow")
+
+        Methods
+        --------
+            >>> warning(event, **fields): Log a warning unless one was logged recently
+            >>> log(level, event, **fields): Log unless one was logged recently
+    """
+
+    def __init__(
+        self, logger: logging.Logger, interval: float = 60.0, clock: callable = time.monotonic
+    ) -> None:
+        """
+        Create the logger
+
+            Parameters:
+                logger (logging.Logger): Where the messages go
+                interval (float): The minimum seconds between messages per event
+                clock (callable): Returns the current time in seconds
+        """
+        self.logger = logger
+        self.interval = interval
+        self.clock = clock
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def log(self, level: int, event: str, **fields) -> bool:
+        """
+        Log unless a message for the same event was logged recently
+
+            Parameters:
+                level (int): The logging level
+                event (str): The kind of message, rate limited separately
+                fields: Values logged as key=value pairs
+
+            Returns:
+                bool: Whether the message was logged
+        """
+        now = self.clock()
+        with self._lock:
+            last = self._last.get(event)
+            if last is not None and now - last < self.interval:
+                self._suppressed[event] = self._suppressed.get(event, 0) + 1
+                return False
+            self._last[event] = now
+            suppressed = self._suppressed.pop(event, 0)
+
+        if suppressed:
+            fields["suppressed"] = suppressed
+        message = " ".join(
+            [f"event={event}"] + [f"{key}={value!r}" for key, value in fields.items()]
+        )
+        self.logger.log(level, message, extra={"event": event, "fields": fields})
+        return True
+
+    def warning(self, event: str, **fields) -> bool:
+        """
+        Log a warning unless one was logged for the same event recently
+
+            Parameters:
+                event (str): The kind of message, rate limited separately
+                fields: Values logged as key=value pairs
+
+            Returns:
+                bool: Whether the message was logged
+        """
+        return self.log(logging.WARNING, event, **fields)
@@ -0,0 +1,120 @@
+"""
+Background compaction of old raw sessions
+"""
+
+import threading
+import traceback
+
+from db import Database
+from metrics import METRICS
+
+_SESSIONS_FOLDED = METRICS.counter(
+    "sessions_folded_total", "Raw sessions folded into the daily rollup"
+)
+_BYTES_RECLAIMED = METRICS.counter(
+    "compaction_bytes_reclaimed_total", "Bytes returned to the file system by compaction"
+)
+
+
+class Compactor:
+    """
+    Applies a retention policy: raw sessions are kept for keep_days and the
+    daily rollup forever. Runs Database.compact once or periodically on a
+    background thread. Every transaction is small, so the scan loop's writer
+    keeps writing while a compaction runs.
+
+        Example
+        -------
+            >>> compactor = Compactor(database, keep_days=30)
+            >>> compactor.start()
+            >>> compactor.stop()
+
+        Methods
+        --------
+            >>> run_once(): Compact now and return the report
+            >>> start(): Compact periodically on a background thread
+            >>> stop(): Stop after the current transaction
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        keep_days: int = 90,
+        batch_size: int = 5000,
+        pause: float = 0.05,
+        vacuum_pages: int = 256,
+        interval: float = 6 * 60 * 60,
+    ) -> None:
+        """
+        Create the compactor
+
+            Parameters:
+                database (Database): The database to compact
+                keep_days (int): The number of days raw sessions are kept for
+                batch_size (int): The maximum number of sessions folded per transaction
+                pause (float): The seconds between transactions
+                vacuum_pages (int): The maximum number of pages freed per transaction
+                interval (float): The seconds between compactions in the background
+        """
+        self.database = database
+        self.keep_days = keep_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.interval = interval
+        self.last_report = None
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> dict:
+        """
+        Compact now, stopping early if stop() is called
+
+            Returns:
+                dict: The report of Database.compact
+        """
+        report = self.database.compact(
+            self.keep_days,
+            self.batch_size,
+            self.pause,
+            self.vacuum_pages,
+            should_continue=lambda: not self._stop.is_set(),
+        )
+        _SESSIONS_FOLDED.inc(report["sessions_folded"])
+        _BYTES_RECLAIMED.inc(max(report["bytes_reclaimed"], 0))
+        self.last_report = report
+        return report
+
+    def start(self) -> None:
+        """
+        Compact right away and then every interval seconds on a
+        background thread
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="Compactor", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:  # pylint: disable=broad-except
+                # A failed compaction is retried at the next interval, the
+                # folded batches are already committed
+                traceback.print_exc()
+            self._stop.wait(self.interval)
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stop after the current transaction
+
+            Parameters:
+                timeout (float): The maximum number of seconds to wait
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
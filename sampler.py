@@ -0,0 +1,236 @@
+"""
+Adaptive sampling of the active window
+"""
+
+import threading
+import time
+
+from metrics import METRICS
+
+_TICK_JITTER = METRICS.histogram(
+    "scan_tick_jitter_seconds", "How much later than planned a scan tick woke up"
+)
+_TICK_TIME = METRICS.histogram(
+    "scan_tick_seconds", "Time spent sampling and handling the sample per scan tick"
+)
+_TICKS_OVER_BUDGET = METRICS.counter(
+    "scan_ticks_over_budget_total", "Scan ticks that took longer than the tick budget"
+)
+_WAKEUPS = METRICS.counter("scan_wakeups_total", "Times the scan loop woke up to sample")
+_WINDOW_CHANGES = METRICS.counter("window_changes_total", "Samples that found a new window")
+
+
+class AdaptivePoller:
+    """
+    Decides how long to sleep between samples. The interval grows while the
+    active window stays the same and drops back to the minimum after a change.
+
+        Example
+        -------
+            >>> poller = AdaptivePoller(min_interval=0.1, max_interval=2.0)
+            >>> interval = poller.next_interval(changed=False)
+
+        Methods
+        --------
+            >>> next_interval(changed): Get the time to sleep before the next sample
+            >>> reset(): Go back to the minimum interval
+    """
+
+    def __init__(
+        self, min_interval: float = 0.1, max_interval: float = 2.0, backoff: float = 1.5
+    ) -> None:
+        """
+        Create the poller
+
+            Parameters:
+                min_interval (float): The interval used right after a change
+                max_interval (float): The longest interval while the window is stable
+                backoff (float): The factor the interval grows by per stable sample
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def next_interval(self, changed: bool) -> float:
+        """
+        Get the time to sleep before the next sample
+
+            Parameters:
+                changed (bool): Whether the last sample differed from the one before
+
+            Returns:
+                float: The number of seconds to sleep
+        """
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.interval
+
+    def reset(self) -> None:
+        """
+        Go back to the minimum interval
+        """
+        self.interval = self.min_interval
+
+
+class Sampler:
+    """
+    Samples a source until told to stop and reports every change. Polling
+    backs off through an AdaptivePoller, and push based backends can report
+    focus changes directly through push().
+
+        Example
+        -------
+            >>> sampler = Sampler(WindowInfoGetter.get_current_window)
+            >>> sampler.run(on_change, lambda: scanning)
+
+        Methods
+        --------
+            >>> run(on_change, should_continue, on_tick): Sample until should_continue() is False
+            >>> push(value): Report a new value from a push based backend
+            >>> attach(backend): Subscribe to a push based backend
+            >>> wake(): Interrupt the current sleep
+            >>> stats(): Get the sampling overhead and wakeup counters
+    """
+
+    _NOTHING = object()
+
+    def __init__(
+        self, source: callable, poller: AdaptivePoller = None, tick_budget: float = None
+    ) -> None:
+        """
+        Create the sampler
+
+            Parameters:
+                source (callable): Returns the current value when called
+                poller (AdaptivePoller): Decides the interval between samples
+                tick_budget (float): The seconds a tick, sampling and handling
+                    the sample, should take at most, ticks over it are counted
+        """
+        self.source = source
+        self.poller = poller or AdaptivePoller()
+        self.tick_budget = tick_budget
+
+        self._wake = threading.Event()
+        self._pushed = self._NOTHING
+        self._pushed_lock = threading.Lock()
+
+        self.wakeups = 0
+        self.changes = 0
+        self.pushes = 0
+        self.sample_time = 0.0
+        self.running_time = 0.0
+        self.tick_time = 0.0
+        self.max_tick_time = 0.0
+        self.over_budget = 0
+
+    def attach(self, backend) -> None:
+        """
+        Subscribe to a push based backend
+
+            Parameters:
+                backend: Any object with subscribe(callback), where the callback
+                    is called with the new value whenever the focus changes
+        """
+        backend.subscribe(self.push)
+
+    def push(self, value) -> None:
+        """
+        Report a new value from a push based backend
+
+            Parameters:
+                value: The new value, used instead of polling the source
+        """
+        with self._pushed_lock:
+            self._pushed = value
+            self.pushes += 1
+        self._wake.set()
+
+    def wake(self) -> None:
+        """
+        Interrupt the current sleep so the next sample is taken right away
+        """
+        self._wake.set()
+
+    def _sample(self):
+        with self._pushed_lock:
+            value, self._pushed = self._pushed, self._NOTHING
+        if value is not self._NOTHING:
+            return value
+
+        started = time.perf_counter()
+        value = self.source()
+        self.sample_time += time.perf_counter() - started
+        return value
+
+    def run(
+        self, on_change: callable, should_continue: callable, on_tick: callable = None
+    ) -> None:
+        """
+        Sample until should_continue() is False
+
+            Parameters:
+                on_change (callable): Called with (value, timestamp) on every change
+                should_continue (callable): Checked before every sample
+                on_tick (callable): Called with the timestamp after every sample
+        """
+        started = time.perf_counter()
+        self.poller.reset()
+        current = self._NOTHING
+        try:
+            while should_continue():
+                self.wakeups += 1
+                _WAKEUPS.inc()
+                tick_started = time.perf_counter()
+                value = self._sample()
+                now = time.time()
+                changed = value != current
+                if changed:
+                    self.changes += 1
+                    _WINDOW_CHANGES.inc()
+                    current = value
+                    on_change(value, now)
+                if on_tick is not None:
+                    on_tick(now)
+                self._measure_tick(time.perf_counter() - tick_started)
+
+                interval = self.poller.next_interval(changed)
+                slept = time.perf_counter()
+                if not self._wake.wait(interval):
+                    # Woken early on purpose is not jitter, only oversleeping is
+                    _TICK_JITTER.observe(max(time.perf_counter() - slept - interval, 0.0))
+                self._wake.clear()
+        finally:
+            self.running_time += time.perf_counter() - started
+
+    def _measure_tick(self, seconds: float) -> None:
+        self.tick_time += seconds
+        self.max_tick_time = max(self.max_tick_time, seconds)
+        _TICK_TIME.observe(seconds)
+        if self.tick_budget is not None and seconds > self.tick_budget:
+            self.over_budget += 1
+            _TICKS_OVER_BUDGET.inc()
+
+    def stats(self) -> dict:
+        """
+        Get the sampling overhead and wakeup counters
+
+            Returns:
+                dict: The counters
+        """
+        minutes = self.running_time / 60
+        return {
+            "wakeups": self.wakeups,
+            "changes": self.changes,
+            "pushes": self.pushes,
+            "wakeups_per_minute": self.wakeups / minutes if minutes else 0.0,
+            "avg_sample_time": self.sample_time / self.wakeups if self.wakeups else 0.0,
+            "sample_overhead": (
+                self.sample_time / self.running_time if self.running_time else 0.0
+            ),
+            "avg_tick_time": self.tick_time / self.wakeups if self.wakeups else 0.0,
+            "max_tick_time": self.max_tick_time,
+            "ticks_over_budget": self.over_budget,
+        }
@@ -0,0 +1,183 @@
+"""
+The long-lived scan worker
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from metrics import METRICS
+
+if TYPE_CHECKING:
+    from tracker import Tracker
+
+_STOP_LATENCY = METRICS.histogram(
+    "scan_stop_latency_seconds", "Time from a pause or stop request to the closed session"
+)
+_FORCED_STOPS = METRICS.counter(
+    "scan_forced_stops_total", "Pauses that closed the session for a worker stuck in a tick"
+)
+
+
+class Scanner:
+    """
+    Runs the scan loop of a Tracker on one worker thread for the lifetime
+    of the program. Start, pause and stop only set events, so pressing Start
+    again never starts a second scan loop next to the first one.
+
+    Pausing wakes the sampler and waits at most max_stop_latency seconds for
+    the worker to close the open session. A worker stuck in a slow backend
+    call cannot be interrupted, so after that the session is closed for it at
+    the time of the request and whatever the worker samples next is dropped.
+
+        Example
+        -------
+            >>> scanner = Scanner(tracker)
+            >>> scanner.start()
+            >>> scanner.pause()
+            >>> scanner.stop()
+
+        Methods
+        --------
+            >>> start(): Start or resume scanning
+            >>> pause(): Close the open session and wait for the next start()
+            >>> stop(): Close the open session and end the worker
+            >>> is_scanning(): Check if the worker is scanning or about to
+            >>> stats(): Get the tick budget and stop latency counters
+    """
+
+    def __init__(
+        self, tracker: Tracker, max_stop_latency: float = 1.0, tick_budget: float = 0.05
+    ) -> None:
+        """
+        Create the scanner, the worker is started by the first start()
+
+            Parameters:
+                tracker (Tracker): The tracker to run the scan loop of
+                max_stop_latency (float): The maximum number of seconds pause()
+                    and stop() wait before the open session is closed
+                tick_budget (float): The seconds a scan tick should take at most
+        """
+        self.tracker = tracker
+        self.max_stop_latency = max_stop_latency
+        self.tracker.sampler.tick_budget = tick_budget
+
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._scanning = threading.Event()
+        self._stopping = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+
+        self.last_stop_latency = None
+        self.max_observed_stop_latency = 0.0
+        self.forced_stops = 0
+
+    def start(self) -> None:
+        """
+        Start or resume scanning, starts the worker the first time
+        """
+        with self._thread_lock:
+            if self._stopping.is_set():
+                raise RuntimeError("The scanner has been stopped")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="Scanner", daemon=True
+                )
+                self._thread.start()
+            self._idle.clear()
+            self._scanning.set()
+
+    def _should_continue(self) -> bool:
+        return self._scanning.is_set() and not self._stopping.is_set()
+
+    def _run(self) -> None:
+        while True:
+            self._scanning.wait()
+            if self._stopping.is_set():
+                break
+            try:
+                self.tracker.start_scan(self._should_continue)
+            finally:
+                # Under the lock so a start() right now cannot be marked idle
+                with self._thread_lock:
+                    if not self._should_continue():
+                        self._idle.set()
+        self._idle.set()
+
+    def pause(self) -> bool:
+        """
+        Close the open session and wait for the next start(). Returns within
+        max_stop_latency seconds
+
+            Returns:
+                bool: True if the worker closed the session itself, False if it
+                    was stuck in a tick and the session was closed for it
+        """
+        requested = time.time()
+        self._scanning.clear()
+        return self._wait_for_idle(requested)
+
+    def stop(self) -> bool:
+        """
+        Close the open session and end the worker. Returns within
+        max_stop_latency seconds, the worker is a daemon thread so one that is
+        still stuck in a tick does not keep the program alive
+
+            Returns:
+                bool: True if the worker ended in time
+        """
+        requested = time.time()
+        self._stopping.set()
+        self._scanning.clear()
+        stopped = self._wait_for_idle(requested)
+        # Let the worker leave its wait for the next start()
+        self._scanning.set()
+        if self._thread is not None:
+            self._thread.join(max(self.max_stop_latency - (time.time() - requested), 0))
+            stopped = stopped and not self._thread.is_alive()
+        return stopped
+
+    def _wait_for_idle(self, requested: float) -> bool:
+        self.tracker.sampler.wake()
+        in_time = self._idle.wait(self.max_stop_latency)
+        if not in_time:
+            # The worker is stuck in a tick: close the session as of the request
+            self.forced_stops += 1
+            _FORCED_STOPS.inc()
+            self.tracker.finish_scan(requested)
+        latency = time.time() - requested
+        self.last_stop_latency = latency
+        self.max_observed_stop_latency = max(self.max_observed_stop_latency, latency)
+        _STOP_LATENCY.observe(latency)
+        return in_time
+
+    def is_scanning(self) -> bool:
+        """
+        Check if the worker is scanning or about to
+
+            Returns:
+                bool: True between start() and the next pause() or stop()
+        """
+        return self._should_continue()
+
+    def stats(self) -> dict:
+        """
+        Get the tick budget and stop latency counters
+
+            Returns:
+                dict: The tick times and ticks over budget of the sampler, the
+                    last and longest stop latency and the forced stops
+        """
+        sampler = self.tracker.sampler.stats()
+        return {
+            "tick_budget": self.tracker.sampler.tick_budget,
+            "avg_tick_time": sampler["avg_tick_time"],
+            "max_tick_time": sampler["max_tick_time"],
+            "ticks_over_budget": sampler["ticks_over_budget"],
+            "last_stop_latency": self.last_stop_latency,
+            "max_stop_latency": self.max_observed_stop_latency,
+            "forced_stops": self.forced_stops,
+        }
@@ -0,0 +1,144 @@
+# unit tests for async_engine.py
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from async_engine import AsyncEngine
+from sampler import AdaptivePoller
+from tracker import Tracker
+
+
+class FakeWindow:
+    """Collects after() callbacks so a test can run them like Tk would"""
+
+    def __init__(self):
+        self.callbacks = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):  # pylint: disable=unused-argument
+        """Schedule a callback"""
+        self.next_id += 1
+        self.callbacks[self.next_id] = callback
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        """Cancel a callback"""
+        self.callbacks.pop(after_id, None)
+
+    def run_for(self, seconds):
+        """Run the scheduled callbacks for a while"""
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            callbacks, self.callbacks = self.callbacks, {}
+            for callback in callbacks.values():
+                callback()
+            time.sleep(0.002)
+
+
+class TestAsyncEngine(unittest.TestCase):
+    """Unit tests for async_engine.py"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tracker = Tracker(
+            os.path.join(self.directory.name, "test.db"), min_dwell=0, engine="async"
+        )
+        self.windows = iter([("Editor", "Docs")] * 2 + [("Mail", "Mail")] * 3)
+        self.tracker.current_window = lambda: next(self.windows, ("Editor", "Code"))
+        self.engine = AsyncEngine(self.tracker, poller=AdaptivePoller(0.01, 0.01))
+
+    def tearDown(self):
+        self.engine.close()
+        self.tracker.shutdown()
+        self.directory.cleanup()
+
+    def applications(self):
+        """Get the applications of the stored sessions, in time order"""
+        rows = sorted(self.tracker.database.iter_sessions(), key=lambda row: row[1])
+        return [row[0] for row in rows]
+
+    def test_run_headless(self):
+        """Test that sampling, coalescing and writing run on the loop"""
+        self.engine.run(lambda: self.engine.ticks < 8, poll_interval=0.01)
+        self.engine.close()
+        self.assertEqual(self.applications(), ["Docs", "Mail", "Code"])
+        self.assertGreater(self.engine.stats()["writes"], 0)
+        self.assertEqual(self.engine.stats()["queued"], 0)
+        self.assertEqual(self.tracker.journal.held(), [])
+
+    def test_sessions_are_batched_by_age(self):
+        """Test that sessions closed within max_age share one write"""
+        self.engine.close()
+        self.engine = AsyncEngine(
+            self.tracker, max_age=60, poller=AdaptivePoller(0.01, 0.01)
+        )
+        self.engine.run(lambda: self.engine.ticks < 8, poll_interval=0.01)
+        self.assertEqual(self.applications(), [])
+        self.engine.close()
+        self.assertEqual(self.applications(), ["Docs", "Mail", "Code"])
+        self.assertEqual(self.engine.stats()["writes"], 1)
+
+    def test_tk_pumping(self):
+        """Test that the loop runs from after() and pausing closes the session"""
+        window = FakeWindow()
+        self.engine.attach(window, interval=5)
+        self.engine.start_scan()
+        window.run_for(0.2)
+        self.assertTrue(self.engine.pause_scan())
+        window.run_for(0.05)
+        self.assertEqual(self.applications(), ["Docs", "Mail", "Code"])
+
+        self.engine.close()
+        self.assertEqual(window.callbacks, {})
+
+    def test_executor_is_bounded(self):
+        """Test that no more than max_pending blocking calls run at a time"""
+        self.engine.close()
+        self.engine = AsyncEngine(self.tracker, max_workers=4, max_pending=2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def blocking_call():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+        async def calls():
+            await asyncio.gather(*(self.engine.run_blocking(blocking_call) for _ in range(6)))
+
+        self.engine.loop.run_until_complete(calls())
+        self.assertEqual(max(peak), 2)
+
+    def test_producers_push_windows(self):
+        """Test that a spawned producer can report windows without a thread"""
+
+        async def idle_detector(engine):
+            await asyncio.sleep(0.05)
+            engine.push(("Idle", "Idle"))
+
+        self.tracker.current_window = lambda: ("Editor", "Docs")
+        self.engine.spawn(idle_detector)
+        self.engine.run(lambda: self.engine.ticks < 12, poll_interval=0.01)
+        self.engine.close()
+        self.assertIn("Idle", self.applications())
+
+    def test_no_writer_thread_or_scanner(self):
+        """Test that the async engine writes without the writer thread or the Scanner"""
+        self.assertIsNone(self.tracker.scanner)
+        threads = threading.active_count()
+        self.engine.run(lambda: self.engine.ticks < 8, poll_interval=0.01)
+        self.engine.close()
+        self.assertEqual(self.tracker.writer.stats()["rows_written"], 3)
+        self.assertLessEqual(threading.active_count(), threads + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# unit tests for coalescer.py
+
+import unittest
+
+from coalescer import SessionCoalescer
+
+
+class TestSessionCoalescer(unittest.TestCase):
+    """Unit tests for SessionCoalescer"""
+
+    def setUp(self):
+        self.sessions = []
+        self.opened = []
+        self.coalescer = SessionCoalescer(
+            lambda *session: self.sessions.append(session),
+            min_dwell=1.0,
+            on_open=lambda *session: self.opened.append(session),
+        )
+
+    def test_long_sessions_pass_through(self):
+        """Test that windows active longer than the dwell time are kept apart"""
+        self.coalescer.change("Docs", 100)
+        self.coalescer.change("Mail", 110)
+        self.coalescer.tick(111)
+        self.assertEqual(self.sessions, [("Docs", 100, 110)])
+        self.coalescer.close(120)
+        self.assertEqual(self.sessions, [("Docs", 100, 110), ("Mail", 110, 120)])
+        self.assertEqual(self.opened, [("Docs", 100), ("Mail", 110)])
+
+    def test_flicker_is_merged(self):
+        """Test that a short visit to another window does not split a session"""
+        self.coalescer.change("Docs", 100)
+        self.coalescer.change("Slack", 200)
+        self.coalescer.change("Docs", 200.4)
+        self.coalescer.close(300)
+        self.assertEqual(self.sessions, [("Docs", 100, 300)])
+        self.assertAlmostEqual(self.coalescer.stats()["writes_saved"], 2 / 3)
+
+    def test_flicker_goes_to_the_session_before(self):
+        """Test that a flicker between two windows counts for the one before it"""
+        self.coalescer.change("Docs", 100)
+        self.coalescer.change("Slack", 200)
+        self.coalescer.change("Mail", 200.5)
+        self.coalescer.change("Code", 202)
+        self.coalescer.close(300)
+        self.assertEqual(
+            self.sessions,
+            [("Docs", 100, 200.5), ("Mail", 200.5, 202), ("Code", 202, 300)],
+        )
+        self.assertEqual(self.coalescer.stats()["flickers"], 1)
+
+    def test_session_waits_for_the_dwell_time(self):
+        """Test that a session is only emitted once it can no longer grow"""
+        self.coalescer.change("Docs", 100)
+        self.coalescer.change("Slack", 200)
+        self.coalescer.tick(200.5)
+        self.assertEqual(self.sessions, [])
+        self.coalescer.tick(201)
+        self.assertEqual(self.sessions, [("Docs", 100, 200)])
+
+    def test_titles_of_the_same_application_are_kept_apart(self):
+        """Test that by default another title of the same application is its own session"""
+        self.coalescer.change("YouTube", 100, "Chrome")
+        self.coalescer.change("Gmail", 150, "Chrome")
+        self.coalescer.close(300)
+        self.assertEqual(self.sessions, [("YouTube", 100, 150), ("Gmail", 150, 300)])
+        self.assertEqual(self.coalescer.stats()["merges"], 0)
+
+    def test_same_application_is_merged_when_asked(self):
+        """Test that merge_same_owner continues the session for a new title of its application"""
+        self.coalescer.merge_same_owner = True
+        self.coalescer.change("Docs", 100, "Safari")
+        self.coalescer.change("Mail", 150, "Safari")
+        self.coalescer.change("Code", 200, "Editor")
+        self.coalescer.close(300)
+        self.assertEqual(self.sessions, [("Docs", 100, 200), ("Code", 200, 300)])
+        self.assertEqual(self.coalescer.stats()["merges"], 1)
+
+    def test_short_gap_is_kept(self):
+        """Test that a gap shorter than the dwell time is not absorbed"""
+        self.coalescer.change("Docs", 100)
+        self.coalescer.change(None, 200)
+        self.coalescer.change("Docs", 200.3)
+        self.coalescer.close(300)
+        self.assertEqual(
+            self.sessions, [("Docs", 100, 200), (None, 200, 200.3), ("Docs", 200.3, 300)]
+        )
+        self.assertEqual(self.coalescer.stats()["flickers"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,288 @@
+# unit tests for db.py
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+
+from db import Database
+
+
+class TestDatabase(unittest.TestCase):
+    """Unit tests for db.py"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.directory.name, "test.db"))
+
+    def tearDown(self):
+        self.database.close()
+        self.directory.cleanup()
+
+    def test_connection_is_reused(self):
+        """Test that a thread keeps using the same connection"""
+        self.assertIs(self.database._connect(), self.database._connect())
+
+    def test_wal_mode(self):
+        """Test that connections are opened in WAL mode"""
+        mode = self.database._query_fetch("PRAGMA journal_mode")[0][0]
+        self.assertEqual(mode, "wal")
+
+    def test_add_data_from_threads(self):
+        """Test writing from several threads at once"""
+
+        def write():
+            for _ in range(50):
+                self.database.add_session("App", 1000, 1001)
+
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 200)
+
+    def test_sessions_are_interned(self):
+        """Test that application names are stored once"""
+        self.database.add_many([("App", 0, 10), ("Other", 10, 15), ("App", 15, 20)])
+        applications = self.database._query_fetch("SELECT name FROM applications")
+        self.assertEqual(sorted(applications), [("App",), ("Other",)])
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 15)
+
+    def test_range_queries(self):
+        """Test the per-day and date range totals"""
+        self.database.add_data("App", 10, "2021-06-27")
+        self.database.add_data("App", 20, "2021-06-28")
+        self.database.add_data("App", 40, "2021-06-29")
+
+        on_date = self.database.total_time_spent_on_app_on_date("App", "2021-06-28")
+        for_dates = self.database.total_time_spent_on_app_for_dates(
+            "App", "2021-06-28", "2021-06-29"
+        )
+        self.assertEqual(on_date[0][0], 20)
+        self.assertEqual(for_dates[0][0], 60)
+
+    def test_daily_usage_rollup(self):
+        """Test that the daily rollup follows inserts, updates and deletes"""
+        self.database.add_data("App", 10, "2021-06-28")
+        self.database.add_data("App", 20, "2021-06-28")
+        self.database.add_data("App", 40, "2021-06-30")
+        self.database.add_data("Other", 5, "2021-06-28")
+        self.assertEqual(
+            self.database.daily_usage("App", "2021-06-28", "2021-07-04"),
+            [("2021-06-28", 30, 2), ("2021-06-30", 40, 1)],
+        )
+        self.assertEqual(
+            self.database.total_time_spent_on_app_for_week("App", "2021-07-01"), 70
+        )
+
+        self.database.delete_data("Other")
+        self.database.update_data("App", 1, "2021-07-01")
+        self.assertEqual(
+            self.database._query_fetch("SELECT * FROM daily_usage"),
+            [(1, "2021-07-01", 3, 3)],
+        )
+
+    def test_rebuild_daily_usage(self):
+        """Test that the rollup can be recomputed from the sessions"""
+        self.database.add_many([("App", 0, 10), ("App", 10, 25)])
+        rollup = self.database._query_fetch("SELECT * FROM daily_usage")
+        self.database._query_commit("DELETE FROM daily_usage")
+        self.database.rebuild_daily_usage()
+        self.assertEqual(self.database._query_fetch("SELECT * FROM daily_usage"), rollup)
+
+    def test_app_summary(self):
+        """Test the grouped and sorted application summary"""
+        self.database.add_data("App", 10, "2021-06-28")
+        self.database.add_data("App", 20, "2021-06-29")
+        self.database.add_data("Other", 25, "2021-06-28")
+        self.database.add_data("Other", 1, "2021-06-28")
+        self.database.add_data("Other", 1, "2021-06-28")
+
+        self.assertEqual(
+            self.database.app_summary(), [("App", 30, 2), ("Other", 27, 3)]
+        )
+        self.assertEqual(
+            self.database.app_summary(order_by="opens", limit=1), [("Other", 27, 3)]
+        )
+        self.assertEqual(
+            self.database.app_summary(start="2021-06-29"), [("App", 20, 1)]
+        )
+        with self.assertRaises(ValueError):
+            self.database.app_summary(order_by="date")
+
+    def test_iter_sessions(self):
+        """Test streaming sessions as rows and as column chunks"""
+        self.database.add_many([("App", 1000, 1010), ("Other", 1010, 1015)] * 3)
+
+        rows = list(self.database.iter_sessions(application="App", chunk_size=2))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0][:3], ("App", 1000, 1010))
+
+        chunks = list(self.database.iter_sessions(chunk_size=4, columns=True))
+        self.assertEqual([len(chunk["app_id"]) for chunk in chunks], [4, 2])
+        durations = sum(
+            sum(chunk["end_time"]) - sum(chunk["start_time"]) for chunk in chunks
+        )
+        self.assertEqual(durations, 45)
+        names = self.database.application_names()
+        self.assertEqual(names[chunks[0]["app_id"][0]], "App")
+
+    def test_histogram_days_weeks_months(self):
+        """Test the day, ISO week and month buckets"""
+        self.database.add_data("App", 10, "2021-06-27")
+        self.database.add_data("App", 20, "2021-06-28")
+        self.database.add_data("Other", 5, "2021-07-01")
+
+        days = self.database.histogram(["App", "Other"], "2021-06-27", "2021-07-01")
+        self.assertEqual(days.shape, (2, 5))
+        self.assertEqual(list(days.row("App")), [10, 20, 0, 0, 0])
+        self.assertEqual(list(days.row("Other")), [0, 0, 0, 0, 5])
+
+        weeks = self.database.histogram(None, "2021-06-27", "2021-07-01", "isoweek")
+        self.assertEqual(weeks.buckets, ["2021-W25", "2021-W26"])
+        self.assertEqual(weeks.apps, ["App", "Other"])
+        self.assertEqual(list(weeks.values), [10, 20, 0, 5])
+
+        months = self.database.histogram(["App"], "2021-06-27", "2021-07-01", "month")
+        self.assertEqual(list(months.values), [30, 0])
+
+    def test_histogram_hours(self):
+        """Test that hour buckets split sessions at full hours"""
+        start = self.database._start_of_day("2021-06-28") + 3600 * 9 + 1800
+        self.database.add_session("App", start, start + 3600)
+
+        hours = self.database.histogram(["App", "Missing"], "2021-06-28", "2021-06-28", "hour")
+        self.assertEqual(hours.shape, (2, 24))
+        self.assertEqual(hours.row("App")[9], 1800)
+        self.assertEqual(hours.row("App")[10], 1800)
+        self.assertEqual(sum(hours.row("Missing")), 0)
+        with self.assertRaises(ValueError):
+            self.database.histogram(["App"], "2021-06-28", "2021-06-28", "year")
+
+    @unittest.skipUnless(hasattr(time, "tzset"), "needs time.tzset")
+    def test_histogram_hours_in_a_half_hour_time_zone(self):
+        """Test that hour buckets split on local hours in a +05:30 time zone"""
+        previous = os.environ.get("TZ")
+        os.environ["TZ"] = "Asia/Kolkata"
+        time.tzset()
+        try:
+            self.test_histogram_hours()
+        finally:
+            if previous is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = previous
+            time.tzset()
+
+    def test_histogram_hours_clip_to_the_range(self):
+        """Test that a session started the day before counts from midnight on"""
+        midnight = self.database._start_of_day("2021-06-28")
+        self.database.add_session("App", midnight - 1800, midnight + 900)
+        self.database.add_session("App", midnight + 3600 * 24 - 600, midnight + 3600 * 24 + 600)
+
+        hours = self.database.histogram(["App"], "2021-06-28", "2021-06-28", "hour")
+        self.assertEqual(hours.row("App")[0], 900)
+        self.assertEqual(hours.row("App")[23], 600)
+        self.assertEqual(sum(hours.row("App")), 1500)
+
+        self.database.compact(keep_days=1, today=datetime(2021, 6, 30).date())
+        with self.assertRaises(ValueError):
+            self.database.histogram(["App"], "2021-06-28", "2021-06-28", "hour")
+
+    def test_migrate_legacy_database(self):
+        """Test that a flat time_tracker database is migrated in place"""
+        path = os.path.join(self.directory.name, "legacy.db")
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE time_tracker (application_name text, time_spent integer, date_used text)"
+        )
+        connection.executemany(
+            "INSERT INTO time_tracker VALUES (?, ?, ?)",
+            [
+                ("App", 10, "2021-06-28"),
+                ("Other", 5.5, "2021-06-28"),
+                ("App", 20, "2021-06-29"),
+            ],
+        )
+        connection.commit()
+        connection.close()
+
+        with Database(path) as database:
+            version = database._query_fetch("PRAGMA user_version")[0][0]
+            tables = database._query_fetch(
+                "SELECT name FROM sqlite_master WHERE name = 'time_tracker'"
+            )
+            self.assertEqual(version, Database.SCHEMA_VERSION)
+            self.assertEqual(tables, [])
+            self.assertEqual(database.total_time_spent_on_app("App"), 30)
+            self.assertEqual(
+                [row[0] for row in database.view_data()], ["App", "Other", "App"]
+            )
+
+    def test_close_and_reopen(self):
+        """Test that the database can be used again after close"""
+        self.database.add_session("App", 1000, 1005)
+        self.database.close()
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 5)
+
+    def test_context_manager(self):
+        """Test that the context manager closes the connections"""
+        with Database(os.path.join(self.directory.name, "other.db")) as database:
+            database.add_data("App", 5, "2021-06-28")
+        self.assertEqual(database._connections, [])
+
+    def test_gaps(self):
+        """Test that gaps are stored apart from the sessions"""
+        start = datetime(2021, 6, 28, 12).timestamp()
+        self.database.add_gap(start, start + 30, "OSError")
+        self.assertEqual(
+            self.database.gaps("2021-06-28", "2021-06-28"),
+            [(round(start), round(start) + 30, "OSError")],
+        )
+        self.assertEqual(self.database.gaps("2021-06-29"), [])
+        self.assertEqual(self.database.total_time_spent(), [(None,)])
+
+    def test_result_cache(self):
+        """Test that cached results are reused until a write touches them"""
+        self.database.add_data("App", 10, "2021-06-28")
+        self.database.add_data("Other", 20, "2021-06-29")
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 10)
+        self.assertEqual(
+            self.database.total_time_spent_on_app_on_date("Other", "2021-06-29"), [(20,)]
+        )
+        self.database.total_time_spent_on_app("App")
+        self.assertEqual(self.database.cache_stats()["hits"], 1)
+
+        # Another app and another day leave the cached results alone
+        self.database.add_data("Other", 5, "2021-06-30")
+        self.database.total_time_spent_on_app("App")
+        self.database.total_time_spent_on_app_on_date("Other", "2021-06-29")
+        self.assertEqual(self.database.cache_stats()["hits"], 3)
+
+        self.database.add_data("App", 5, "2021-06-28")
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 15)
+        self.database.delete_data("Other")
+        self.assertEqual(
+            self.database.total_time_spent_on_app_on_date("Other", "2021-06-29"),
+            [(None,)],
+        )
+        self.assertEqual(self.database.cache_stats()["hits"], 3)
+
+    def test_result_cache_is_bounded(self):
+        """Test that the least recently used results are evicted"""
+        database = Database(os.path.join(self.directory.name, "small.db"), cache_size=2)
+        for application in ("A", "B", "C"):
+            database.total_time_spent_on_app(application)
+        database.total_time_spent_on_app("A")
+        stats = database.cache_stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (2, 0, 4))
+        database.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
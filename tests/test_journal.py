@@ -0,0 +1,147 @@
+# unit tests for journal.py
+
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from journal import SessionJournal
+from tracker import Tracker
+
+# Scans Docs, switches to Slack and is killed before the writer commits Docs
+KILLED_AFTER_SWITCH = textwrap.dedent(
+    """
+    import os, sys, time
+    from sampler import AdaptivePoller
+    from tracker import Tracker
+
+    tracker = Tracker(sys.argv[1], min_dwell=0)
+    tracker.writer.max_age = 60
+    tracker.sampler.poller = AdaptivePoller(0.01, 0.01)
+    started = time.time()
+    tracker.sampler.source = lambda: (
+        ("Editor", "Docs") if time.time() - started < 0.5 else ("Chat", "Slack")
+    )
+    tracker.scanner.start()
+    time.sleep(0.8)
+    os._exit(0)
+    """
+)
+
+
+class TestSessionJournal(unittest.TestCase):
+    """Unit tests for journal.py"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.journal")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_empty_journal(self):
+        """Test that a new journal has no open session"""
+        journal = SessionJournal(self.path)
+        self.assertIsNone(journal.recover())
+        journal.close()
+
+    def test_recover_after_reopen(self):
+        """Test that the last heartbeat survives closing and reopening"""
+        journal = SessionJournal(self.path)
+        journal.begin("Docs", 1000.0)
+        journal.heartbeat(1005.0)
+        journal.heartbeat(1010.0)
+        journal.close()
+
+        journal = SessionJournal(self.path)
+        self.assertEqual(journal.recover(), ("Docs", 1000.0, 1010.0))
+        journal.clear()
+        self.assertIsNone(journal.recover())
+        journal.close()
+
+    def test_torn_write_falls_back(self):
+        """Test that a corrupted newest slot falls back to the older one"""
+        journal = SessionJournal(self.path)
+        journal.begin("Docs", 1000.0)
+        journal.heartbeat(1005.0)
+        newest = (journal._sequence % 2) * SessionJournal.slot_size
+        journal._map[newest + 10] ^= 0xFF
+        self.assertEqual(journal.recover(), ("Docs", 1000.0, 1000.0))
+        journal.close()
+
+    def test_long_names_are_truncated(self):
+        """Test that a name longer than a slot is cut at a character boundary"""
+        journal = SessionJournal(self.path)
+        journal.begin("å" * 5000, 1000.0)
+        application, _, _ = journal.recover()
+        self.assertTrue(application and set(application) == {"å"})
+        journal.close()
+
+    def test_replay_commits_before_clearing(self):
+        """Test that a replayed session is in the database before the journal is cleared"""
+        journal = SessionJournal(os.path.join(self.directory.name, "test.journal"))
+        journal.begin("Docs", 1000.0)
+        journal.heartbeat(1010.0)
+        journal.close()
+
+        tracker = Tracker(os.path.join(self.directory.name, "test.db"))
+        try:
+            self.assertEqual(tracker.database.total_time_spent_on_app("Docs"), 10)
+            self.assertIsNone(tracker.journal.recover())
+        finally:
+            tracker.shutdown()
+
+    def test_hold_and_release(self):
+        """Test that held sessions survive reopening until they are released"""
+        journal = SessionJournal(self.path)
+        journal.hold("Docs", 1000.0, 1010.0)
+        journal.hold("Mail", 1010.0, 1020.0)
+        journal.release("Docs", 1000.0, 1010.0)
+        journal.close()
+
+        journal = SessionJournal(self.path)
+        self.assertEqual(journal.held(), [("Mail", 1010.0, 1020.0)])
+        journal.release_all()
+        self.assertEqual(journal.held(), [])
+        journal.close()
+        self.assertEqual(SessionJournal(self.path).held(), [])
+
+    def test_replay_skips_committed_sessions(self):
+        """Test that a held session the writer committed before the crash is not written twice"""
+        database_name = os.path.join(self.directory.name, "test.db")
+        tracker = Tracker(database_name)
+        tracker.database.add_session("Docs", 1000.0, 1010.0)
+        tracker.journal.hold("Docs", 1000.0, 1010.0)
+        tracker.journal.hold("Mail", 1010.0, 1020.0)
+        tracker.shutdown()
+
+        tracker = Tracker(database_name)
+        try:
+            self.assertEqual(tracker.database.app_summary(), [("Docs", 10, 1), ("Mail", 10, 1)])
+        finally:
+            tracker.shutdown()
+
+    def test_kill_between_switch_and_flush(self):
+        """Test that a session closed but not yet written survives a kill"""
+        database_name = os.path.join(self.directory.name, "test.db")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run(
+            [sys.executable, "-c", KILLED_AFTER_SWITCH, database_name],
+            cwd=root,
+            check=True,
+            timeout=30,
+        )
+
+        tracker = Tracker(database_name)
+        try:
+            sessions = sorted(tracker.database.iter_sessions(), key=lambda row: row[1])
+            self.assertEqual([row[0] for row in sessions], ["Docs", "Slack"])
+            self.assertEqual(tracker.journal.held(), [])
+        finally:
+            tracker.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
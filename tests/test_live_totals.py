@@ -0,0 +1,83 @@
+# unit tests for live_totals.py
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from db import Database
+from live_totals import LiveTotals
+
+NOON = datetime(2021, 6, 28, 12).timestamp()
+DAY = "2021-06-28"
+
+
+class TestLiveTotals(unittest.TestCase):
+    """Unit tests for live_totals.py"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.directory.name, "test.db"))
+        self.database.add_many(
+            [
+                ("Docs", NOON, NOON + 60),
+                ("Mail", NOON + 60, NOON + 90),
+                ("Docs", NOON - 86400, NOON - 86400 + 30),
+            ]
+        )
+        self.totals = LiveTotals()
+        self.totals.seed(self.database)
+
+    def tearDown(self):
+        self.database.close()
+        self.directory.cleanup()
+
+    def test_seed_matches_the_database(self):
+        """Test that the seeded totals equal the rollup"""
+        rows = self.totals.rows(NOON + 100, DAY)
+        self.assertEqual(
+            sorted((app, seconds, opens) for app, _, seconds, opens in rows),
+            sorted(self.database.app_summary()),
+        )
+        self.assertEqual(sorted(rows)[0], ("Docs", 60, 90, 2))
+
+    def test_sessions_keep_the_totals_equal(self):
+        """Test that counting sessions as they close matches writing them"""
+        sessions = [("Docs", NOON + 90.4, NOON + 120.6), ("Code", NOON + 121, NOON + 130)]
+        self.database.add_many(sessions)
+        for session in sessions:
+            self.totals.add(*session)
+
+        rows = self.totals.rows(NOON + 200, DAY)
+        self.assertEqual(
+            sorted((app, seconds, opens) for app, _, seconds, opens in rows),
+            sorted(self.database.app_summary()),
+        )
+
+    def test_open_session_counts_up(self):
+        """Test that the open session is counted until it is added"""
+        self.totals.open("Mail", NOON + 100)
+        rows = dict((row[0], row) for row in self.totals.rows(NOON + 110, DAY))
+        self.assertEqual(rows["Mail"], ("Mail", 40, 40, 2))
+
+        self.totals.add("Mail", NOON + 100, NOON + 120)
+        rows = dict((row[0], row) for row in self.totals.rows(NOON + 500, DAY))
+        self.assertEqual(rows["Mail"], ("Mail", 50, 50, 2))
+
+    def test_changes_only_returns_changed_rows(self):
+        """Test that changes() returns the changed and open rows without reading the database"""
+        version, rows = self.totals.changes(-1, NOON + 100, DAY)
+        self.assertEqual(len(rows), 2)
+        self.database.close()
+
+        self.totals.add("Code", NOON + 100, NOON + 110)
+        self.totals.open("Docs", NOON + 110)
+        version, rows = self.totals.changes(version, NOON + 115, DAY)
+        self.assertEqual(sorted(rows), [("Code", 10, 10, 1), ("Docs", 65, 95, 3)])
+
+        version, rows = self.totals.changes(version, NOON + 120, DAY)
+        self.assertEqual(rows, [("Docs", 70, 100, 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# unit tests for merge.py
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+
+from db import Database
+from merge import merge_databases, stage_source
+
+NOON = round(datetime(2021, 6, 28, 12).timestamp())
+
+
+class TestMerge(unittest.TestCase):
+    """Unit tests for merge.py"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.target = Database(self.path("target.db"))
+
+    def tearDown(self):
+        self.target.close()
+        self.directory.cleanup()
+
+    def path(self, name):
+        """Get a path in the test directory"""
+        return os.path.join(self.directory.name, name)
+
+    def make_source(self, name, sessions):
+        """Create a source database with the given sessions"""
+        with Database(self.path(name)) as database:
+            database.add_many(sessions)
+        return self.path(name)
+
+    def sessions(self):
+        """Get the sessions in the target, in time order"""
+        return sorted(
+            (row[1], row[2], row[0]) for row in self.target.iter_sessions()
+        )
+
+    def test_stage_source_normalizes(self):
+        """Test that a source is trimmed, deduplicated and cleaned while staging"""
+        source = self.make_source(
+            "a.db",
+            [
+                (" Docs ", NOON, NOON + 10),
+                ("Docs", NOON, NOON + 10),
+                ("Mail", NOON + 5, NOON + 20),
+                ("Empty", NOON + 30, NOON + 30),
+                ("  ", NOON + 40, NOON + 50),
+            ],
+        )
+        result = stage_source(source, self.path("staging.db"))
+        self.assertEqual((result["rows_read"], result["rows_staged"]), (5, 2))
+        connection = sqlite3.connect(self.path("staging.db"))
+        self.assertEqual(
+            connection.execute("SELECT app, start_time, end_time FROM staged").fetchall(),
+            [("Docs", NOON, NOON + 10), ("Mail", NOON + 10, NOON + 20)],
+        )
+        connection.close()
+
+    def test_merge_policies(self):
+        """Test that overlaps with existing sessions are trimmed, skipped or kept"""
+        self.target.add_session("Docs", NOON, NOON + 10)
+        source = self.make_source(
+            "a.db", [("Mail", NOON + 5, NOON + 20), ("Code", NOON + 30, NOON + 40)]
+        )
+
+        for policy, expected in (
+            ("trim", [(NOON + 10, NOON + 20, "Mail")]),
+            ("skip", []),
+            ("keep", [(NOON + 5, NOON + 20, "Mail")]),
+        ):
+            with self.subTest(policy=policy):
+                self.target.close()
+                os.remove(self.path("target.db"))
+                self.target = Database(self.path("target.db"))
+                self.target.add_session("Docs", NOON, NOON + 10)
+                merge_databases(self.target, [source], policy, workers=1)
+                self.assertEqual(
+                    self.sessions(),
+                    sorted(
+                        [(NOON, NOON + 10, "Docs"), (NOON + 30, NOON + 40, "Code")]
+                        + expected
+                    ),
+                )
+
+    def test_merge_is_resumable(self):
+        """Test that sources already imported are skipped"""
+        first = self.make_source("a.db", [("Docs", NOON, NOON + 10)])
+        second = self.make_source("b.db", [("Docs", NOON + 10, NOON + 20)])
+        merge_databases(self.target, [first], workers=1)
+        results = merge_databases(self.target, [first, second], workers=2)
+
+        self.assertTrue(results[0]["skipped"])
+        self.assertEqual(results[1]["rows_imported"], 1)
+        self.assertEqual(self.target.total_time_spent_on_app("Docs"), 20)
+        self.assertEqual(self.target.app_summary(), [("Docs", 20, 2)])
+
+        # The rollup trigger is back in place after the import
+        self.target.add_session("Docs", NOON + 20, NOON + 25)
+        self.assertEqual(self.target.app_summary(), [("Docs", 25, 3)])
+        self.assertEqual(
+            set(self.target.imported_sources()),
+            {os.path.abspath(first), os.path.abspath(second)},
+        )
+
+    def test_merge_sees_the_wal_file(self):
+        """Test that sessions only written to a source's -wal file count as a change"""
+        with Database(self.path("a.db")) as source:
+            source.add_session("Docs", NOON, NOON + 10)
+            merge_databases(self.target, [self.path("a.db")], workers=1)
+            source.add_session("Mail", NOON + 10, NOON + 20)
+            results = merge_databases(self.target, [self.path("a.db")], workers=1)
+
+        self.assertFalse(results[0].get("skipped"))
+        self.assertEqual(self.target.total_time_spent_on_app("Mail"), 10)
+
+    def test_merge_legacy_source(self):
+        """Test that a legacy source is migrated on a copy, not in place"""
+        path = self.path("legacy.db")
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE time_tracker (application_name text, time_spent integer, date_used text)"
+        )
+        connection.execute("INSERT INTO time_tracker VALUES ('Docs', 10, '2021-06-28')")
+        connection.commit()
+        connection.close()
+
+        merge_databases(self.target, [path], workers=1)
+        self.assertEqual(self.target.total_time_spent_on_app("Docs"), 10)
+        connection = sqlite3.connect(path)
+        self.assertEqual(connection.execute("PRAGMA user_version").fetchone()[0], 0)
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# unit tests for metrics.py
+
+import json
+import os
+import tempfile
+import unittest
+from urllib.request import urlopen
+
+from metrics import LatencyHistogram, Metrics
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Unit tests for LatencyHistogram"""
+
+    def test_buckets_and_quantiles(self):
+        """Test that observations land in the right buckets"""
+        histogram = LatencyHistogram("test", "", bounds=(0.1, 1.0))
+        for seconds in (0.05, 0.05, 0.5, 5.0):
+            histogram.observe(seconds)
+        self.assertEqual(histogram.buckets, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.75), 1.0)
+        self.assertEqual(histogram.quantile(1.0), float("inf"))
+
+    def test_timer(self):
+        """Test that the timer records one observation"""
+        histogram = LatencyHistogram("test", "")
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count, 1)
+
+
+class TestMetrics(unittest.TestCase):
+    """Unit tests for Metrics"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.metrics = Metrics()
+        self.metrics.counter("written_total", "Written").inc(3)
+        self.metrics.histogram("query_seconds", "Query", bounds=(0.1,)).observe(0.05)
+
+    def tearDown(self):
+        self.metrics.stop()
+        self.directory.cleanup()
+
+    def test_render_prometheus(self):
+        """Test the Prometheus text format"""
+        text = self.metrics.render_prometheus()
+        self.assertIn("# TYPE timetracker_written_total counter", text)
+        self.assertIn("timetracker_written_total 3", text)
+        self.assertIn('timetracker_query_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('timetracker_query_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn("timetracker_query_seconds_count 1", text)
+
+    def test_snapshot_rotation(self):
+        """Test that older snapshots are kept up to the limit"""
+        path = os.path.join(self.directory.name, "metrics.json")
+        for _ in range(4):
+            self.metrics.write_snapshot(path, keep=2)
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            ["metrics.json", "metrics.json.1", "metrics.json.2"],
+        )
+        with open(path, encoding="utf-8") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        self.assertEqual(snapshot["counters"]["written_total"], 3)
+        self.assertEqual(snapshot["histograms"]["query_seconds"]["p50"], 0.1)
+
+    def test_serve(self):
+        """Test that the endpoint serves the metrics on localhost"""
+        host, port = self.metrics.serve(0)
+        self.assertEqual(host, "127.0.0.1")
+        with urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            self.assertIn(b"timetracker_written_total 3", response.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
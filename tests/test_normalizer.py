@@ -0,0 +1,72 @@
+# unit tests for normalizer.py
+
+import json
+import os
+import tempfile
+import unittest
+
+from normalizer import TitleNormalizer
+
+
+class TestTitleNormalizer(unittest.TestCase):
+    """Unit tests for normalizer.py"""
+
+    def test_darwin_rules(self):
+        """Test the built in macOS rules"""
+        normalizer = TitleNormalizer.for_backend("darwin")
+        self.assertEqual(
+            normalizer.normalize("Safari", "Docs - Safari"), ("Safari", "Docs")
+        )
+        self.assertEqual(
+            normalizer.normalize("Google Chrome", "A - B - Google Chrome"),
+            ("Google Chrome", "A - B"),
+        )
+        self.assertEqual(
+            normalizer.normalize("Code", "main.py"), ("Code", "Visual Studio Code")
+        )
+        self.assertEqual(normalizer.normalize("iTerm2", "zsh"), ("iTerm2", "Terminal"))
+        self.assertEqual(normalizer.normalize("Finder", "Home"), ("Finder", "Home"))
+
+    def test_win32_rules(self):
+        """Test the built in Windows rules"""
+        normalizer = TitleNormalizer.for_backend("win32")
+        self.assertEqual(
+            normalizer.normalize("Chrome_WidgetWin_1", "Page - Site - Google Chrome"),
+            ("Google Chrome", "Site"),
+        )
+        self.assertEqual(
+            normalizer.normalize("Notepad", "Untitled — Notepad"),
+            ("Notepad", "Untitled"),
+        )
+        self.assertEqual(
+            normalizer.normalize("CabinetWClass", "Home"), ("CabinetWClass", "Home")
+        )
+
+    def test_rules_from_file(self):
+        """Test loading rules from a JSON file"""
+        rules = [
+            {"application": "Slack", "window": "(?P<channel>\\w+) .*", "set_window": "#{channel}"},
+            {"backend": "darwin", "application": ".*", "set_window": "never"},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rules.json")
+            with open(path, "w", encoding="utf-8") as rules_file:
+                json.dump(rules, rules_file)
+            normalizer = TitleNormalizer.for_backend("x11", path)
+
+        self.assertEqual(
+            normalizer.normalize("Slack", "general | Team"), ("Slack", "#general")
+        )
+        self.assertEqual(normalizer.normalize("Other", "x"), ("Other", "x"))
+
+    def test_repeated_titles_are_cached(self):
+        """Test that a repeated title is answered from the cache"""
+        normalizer = TitleNormalizer.for_backend("darwin")
+        for _ in range(3):
+            normalizer.normalize("Safari", "Docs - Safari")
+        info = normalizer.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# unit tests for query_executor.py
+
+import threading
+import time
+import unittest
+
+from query_executor import QueryExecutor
+
+
+class FakeWindow:
+    """Collects after() callbacks so the test can run them"""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, _, callback):
+        """Queue a callback"""
+        self.callbacks.append(callback)
+
+    def run_until_idle(self, timeout=5):
+        """Run queued callbacks until none are left"""
+        deadline = time.monotonic() + timeout
+        while self.callbacks and time.monotonic() < deadline:
+            self.callbacks.pop(0)()
+            time.sleep(0.001)
+
+
+class TestQueryExecutor(unittest.TestCase):
+    """Unit tests for query_executor.py"""
+
+    def setUp(self):
+        self.window = FakeWindow()
+        self.executor = QueryExecutor(self.window, max_workers=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_result_is_delivered(self):
+        """Test that the result and progress reach the callbacks"""
+        results = []
+        progress = []
+        self.executor.submit("stats", lambda: 42, results.append, None, progress.append)
+        self.assertTrue(self.executor.is_busy("stats"))
+
+        self.window.run_until_idle()
+        self.assertEqual(results, [42])
+        self.assertEqual(progress, [True, False])
+        self.assertFalse(self.executor.is_busy("stats"))
+
+    def test_superseded_result_is_discarded(self):
+        """Test that only the newest query for a key is delivered"""
+        release = threading.Event()
+        results = []
+
+        def slow_query():
+            release.wait(5)
+            return "old"
+
+        self.executor.submit("stats", slow_query, results.append)
+        self.executor.submit("stats", lambda: "new", results.append)
+        release.set()
+
+        self.window.run_until_idle()
+        self.assertEqual(results, ["new"])
+        self.assertEqual(self.executor.discarded, 1)
+
+    def test_error_is_delivered(self):
+        """Test that an exception from the query reaches on_error"""
+        errors = []
+
+        def failing_query():
+            raise ValueError("broken")
+
+        self.executor.submit("stats", failing_query, None, errors.append)
+        self.window.run_until_idle()
+        self.assertIsInstance(errors[0], ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# unit tests for resilience.py
+
+import logging
+import unittest
+
+from resilience import CircuitBreaker, RateLimitedLogger
+
+
+class FakeClock:
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Unit tests for CircuitBreaker"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_threshold=2, base_delay=1, max_delay=4, jitter=0,
+            clock=self.clock,
+        )
+
+    def test_opens_at_threshold(self):
+        """Test that the breaker opens after enough failures in a row"""
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_in(), 1)
+
+    def test_backoff_doubles_and_caps(self):
+        """Test that every failed trial doubles the delay up to the maximum"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        delays = []
+        for _ in range(4):
+            delays.append(self.breaker.retry_in())
+            self.clock.now += self.breaker.retry_in()
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())
+            self.breaker.record_failure()
+        self.assertEqual(delays, [1, 2, 4, 4])
+
+    def test_success_closes(self):
+        """Test that a successful trial closes the breaker"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 1
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_jitter(self):
+        """Test that the delay is varied by at most the jitter fraction"""
+        breaker = CircuitBreaker(
+            failure_threshold=1, base_delay=10, jitter=0.5, clock=self.clock,
+            rand=lambda: 1.0,
+        )
+        breaker.record_failure()
+        self.assertEqual(breaker.retry_in(), 15)
+
+
+class TestRateLimitedLogger(unittest.TestCase):
+    """Unit tests for RateLimitedLogger"""
+
+    def test_rate_limit(self):
+        """Test that repeated events are suppressed and counted"""
+        clock = FakeClock()
+        log = RateLimitedLogger(logging.getLogger("test.resilience"), 60, clock)
+        with self.assertLogs("test.resilience", logging.WARNING) as logs:
+            self.assertTrue(log.warning("backend_error", error="OSError"))
+            self.assertFalse(log.warning("backend_error", error="OSError"))
+            self.assertFalse(log.warning("backend_error", error="OSError"))
+            self.assertTrue(log.warning("other", error="ValueError"))
+            clock.now = 60
+            self.assertTrue(log.warning("backend_error", error="OSError"))
+        self.assertEqual(len(logs.records), 3)
+        self.assertEqual(
+            logs.records[-1].getMessage(),
+            "event=backend_error error='OSError' suppressed=2",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# unit tests for retention.py and Database.compact
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta
+
+from db import Database
+from retention import Compactor
+
+TODAY = date.today()
+
+
+class TestCompaction(unittest.TestCase):
+    """Unit tests for retention.py and Database.compact"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.directory.name, "test.db"))
+        sessions = []
+        for days_ago in range(10):
+            noon = datetime.combine(TODAY - timedelta(days=days_ago), datetime.min.time())
+            noon = noon.timestamp() + 12 * 3600
+            for index in range(500):
+                start = noon + index * 10
+                sessions.append(("Docs" if index % 2 else "Mail", start, start + 5))
+        self.database.add_many(sessions)
+
+    def tearDown(self):
+        self.database.close()
+        self.directory.cleanup()
+
+    def test_compact_keeps_aggregates(self):
+        """Test that folded sessions still count in the rollup"""
+        summary = self.database.app_summary()
+        old_day = str(TODAY - timedelta(days=8))
+        on_date = self.database.total_time_spent_on_app_on_date("Docs", old_day)
+
+        report = self.database.compact(keep_days=5, batch_size=300, today=TODAY)
+
+        self.assertEqual(report["horizon"], str(TODAY - timedelta(days=5)))
+        self.assertEqual(report["sessions_folded"], 4 * 500)
+        self.assertGreater(report["transactions"], 4 * 500 // 300)
+        self.assertTrue(report["incremental_vacuum"])
+        self.assertGreater(report["bytes_reclaimed"], 0)
+        self.assertEqual(len(list(self.database.iter_sessions())), 6 * 500)
+        self.assertEqual(self.database.app_summary(), summary)
+        self.assertEqual(self.database.total_time_spent(), [(10 * 500 * 5,)])
+        self.assertEqual(
+            self.database.total_time_spent_on_app_on_date("Docs", old_day), on_date
+        )
+
+    def test_horizon_only_moves_forward(self):
+        """Test that a longer retention does not bring back folded days"""
+        self.database.compact(keep_days=5, today=TODAY)
+        report = self.database.compact(keep_days=9, today=TODAY)
+        self.assertEqual(report["horizon"], str(TODAY - timedelta(days=5)))
+        self.assertEqual(report["sessions_folded"], 0)
+
+    def test_rebuild_and_delete_after_compaction(self):
+        """Test that rebuilding keeps folded days and deleting removes them"""
+        summary = self.database.app_summary()
+        self.database.compact(keep_days=5, today=TODAY)
+        self.database.rebuild_daily_usage()
+        self.assertEqual(self.database.app_summary(), summary)
+
+        self.database.delete_data("Docs")
+        self.assertEqual([row[0] for row in self.database.app_summary()], ["Mail"])
+
+    def test_writes_during_background_compaction(self):
+        """Test that the scan loop can keep writing while compaction runs"""
+        compactor = Compactor(self.database, keep_days=5, batch_size=100, pause=0.001)
+        compactor.start()
+        writer = threading.Thread(
+            target=lambda: [
+                self.database.add_session("Live", 2000000000 + i, 2000000000 + i + 1)
+                for i in range(50)
+            ]
+        )
+        writer.start()
+        writer.join(timeout=10)
+        for _ in range(1000):
+            if compactor.last_report is not None:
+                break
+            time.sleep(0.01)
+        compactor.stop(timeout=10)
+
+        self.assertEqual(self.database.total_time_spent_on_app("Live"), 50)
+        self.assertEqual(compactor.last_report["sessions_folded"], 4 * 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
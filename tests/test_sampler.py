@@ -0,0 +1,64 @@
+# unit tests for sampler.py
+
+import threading
+import unittest
+
+from sampler import AdaptivePoller, Sampler
+
+
+class TestAdaptivePoller(unittest.TestCase):
+    """Unit tests for AdaptivePoller"""
+
+    def test_backoff_and_reset(self):
+        """Test that the interval grows while stable and resets on change"""
+        poller = AdaptivePoller(min_interval=0.1, max_interval=0.4, backoff=2)
+        self.assertEqual(poller.next_interval(False), 0.2)
+        self.assertEqual(poller.next_interval(False), 0.4)
+        self.assertEqual(poller.next_interval(False), 0.4)
+        self.assertEqual(poller.next_interval(True), 0.1)
+
+
+class TestSampler(unittest.TestCase):
+    """Unit tests for Sampler"""
+
+    def test_reports_changes_only(self):
+        """Test that on_change is only called when the value changes"""
+        values = iter(["a", "a", "b", "b", "b", "a"])
+        changes = []
+        sampler = Sampler(lambda: next(values), AdaptivePoller(0, 0))
+        remaining = [6]
+
+        def should_continue():
+            remaining[0] -= 1
+            return remaining[0] >= 0
+
+        sampler.run(lambda value, now: changes.append(value), should_continue)
+        self.assertEqual(changes, ["a", "b", "a"])
+        self.assertEqual(sampler.stats()["wakeups"], 6)
+
+    def test_push_wakes_sampler(self):
+        """Test that a pushed value is picked up without waiting for the poll"""
+        changes = []
+        sampler = Sampler(lambda: "polled", AdaptivePoller(60, 60))
+        running = threading.Event()
+        running.set()
+
+        def on_change(value, now):
+            changes.append(value)
+            if value == "pushed":
+                running.clear()
+                sampler.wake()
+
+        thread = threading.Thread(
+            target=sampler.run, args=(on_change, running.is_set)
+        )
+        thread.start()
+        sampler.push("pushed")
+        thread.join(timeout=5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(changes[-1], "pushed")
+
+
+if __name__ == "__main__":
+    unittest.main()
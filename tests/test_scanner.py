@@ -0,0 +1,90 @@
+# unit tests for scanner.py
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from sampler import AdaptivePoller
+from tracker import Tracker
+
+
+class TestScanner(unittest.TestCase):
+    """Unit tests for scanner.py"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tracker = Tracker(os.path.join(self.directory.name, "test.db"), min_dwell=0)
+        self.tracker.sampler.poller = AdaptivePoller(0.01, 0.01)
+        self.tracker.sampler.source = lambda: ("Editor", "Docs")
+        self.scanner = self.tracker.scanner
+
+    def tearDown(self):
+        self.tracker.shutdown()
+        self.directory.cleanup()
+
+    def sessions(self):
+        """Get the stored sessions, in time order"""
+        self.tracker.writer.flush()
+        return sorted(self.tracker.database.iter_sessions(), key=lambda row: row[1])
+
+    def test_one_worker_for_start_pause_start(self):
+        """Test that starting again resumes the same worker instead of adding one"""
+        threads = threading.active_count()
+        self.scanner.start()
+        time.sleep(0.05)
+        self.scanner.start()
+        self.assertTrue(self.scanner.pause())
+        self.scanner.start()
+        time.sleep(0.05)
+        self.assertEqual(threading.active_count(), threads + 1)
+        self.assertTrue(self.scanner.stop())
+
+        sessions = self.sessions()
+        self.assertEqual([row[0] for row in sessions], ["Docs", "Docs"])
+        self.assertLessEqual(sessions[0][2], sessions[1][1])
+        self.assertFalse(self.scanner.is_scanning())
+        self.assertRaises(RuntimeError, self.scanner.start)
+
+    def test_start_opens_no_empty_session(self):
+        """Test that the first sample opens the first session, nothing is emitted before it"""
+        self.scanner.start()
+        time.sleep(0.05)
+        self.assertTrue(self.scanner.stop())
+
+        self.assertEqual([row[0] for row in self.sessions()], ["Docs"])
+        self.assertEqual(self.tracker.coalescer.stats()["sessions"], 1)
+
+    def test_stop_latency_is_bounded(self):
+        """Test that a tick stuck in the backend does not hold up a pause"""
+        self.tracker.sampler.source = lambda: time.sleep(0.5) or ("Mail", "Inbox")
+        self.scanner.max_stop_latency = 0.1
+        self.scanner.start()
+        time.sleep(0.05)
+
+        requested = time.time()
+        self.assertFalse(self.scanner.pause())
+        self.assertLess(time.time() - requested, 0.3)
+        self.assertEqual(self.scanner.stats()["forced_stops"], 1)
+
+        # What the stuck tick sampled after the pause is not stored
+        time.sleep(0.6)
+        self.assertEqual(self.sessions(), [])
+
+    def test_tick_budget(self):
+        """Test that ticks longer than the budget are counted"""
+        self.tracker.sampler.source = lambda: time.sleep(0.02) or ("Editor", "Docs")
+        self.tracker.sampler.tick_budget = 0.01
+        self.scanner.start()
+        time.sleep(0.1)
+        self.scanner.stop()
+
+        stats = self.scanner.stats()
+        self.assertGreater(stats["ticks_over_budget"], 0)
+        self.assertGreaterEqual(stats["max_tick_time"], 0.02)
+        self.assertIsNotNone(stats["last_stop_latency"])
+
+
+if __name__ == "__main__":
+    unittest.main()
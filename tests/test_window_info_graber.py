@@ -0,0 +1,91 @@
+# unit tests for window_info_graber.py
+
+import logging
+import unittest
+
+from window_info_graber import GAP, SyntheticWindowSource, WindowInfoGetter
+
+
+TRACE = [(5, "Safari", "Docs"), (2, "iTerm2", "Terminal"), (1, "Mail", "Inbox")]
+
+
+def fake_clock(times):
+    """Return a clock that returns the given times in order"""
+    times = iter(times)
+    return lambda: next(times)
+
+
+class TestSyntheticWindowSource(unittest.TestCase):
+    """Unit tests for SyntheticWindowSource"""
+
+    def test_replay(self):
+        """Test that the trace is replayed in order and stays on the last entry"""
+        source = SyntheticWindowSource(TRACE, clock=fake_clock([0, 0, 4.9, 5, 7, 100]))
+        self.assertEqual(
+            [source() for _ in range(5)],
+            [
+                ("Safari", "Docs"),
+                ("Safari", "Docs"),
+                ("iTerm2", "Terminal"),
+                ("Mail", "Inbox"),
+                ("Mail", "Inbox"),
+            ],
+        )
+
+    def test_speed_and_loop(self):
+        """Test that speed scales the trace time and loop wraps around"""
+        source = SyntheticWindowSource(
+            TRACE, speed=10, loop=True, clock=fake_clock([0, 0.6, 0.85])
+        )
+        self.assertEqual(source(), ("iTerm2", "Terminal"))
+        self.assertEqual(source(), ("Safari", "Docs"))
+
+    def test_empty_trace(self):
+        """Test that an empty trace is rejected"""
+        with self.assertRaises(ValueError):
+            SyntheticWindowSource([])
+
+
+class TestWindowInfoGetter(unittest.TestCase):
+    """Unit tests for the backend registry"""
+
+    def tearDown(self):
+        WindowInfoGetter._active = None
+        WindowInfoGetter._active_name = None
+
+    def test_use_backend_callable(self):
+        """Test that a callable backend is used by get_current_window"""
+        WindowInfoGetter.use_backend(SyntheticWindowSource(TRACE))
+        self.assertEqual(WindowInfoGetter.get_current_window(), ("Safari", "Docs"))
+        self.assertEqual(WindowInfoGetter.backend_name(), "SyntheticWindowSource")
+
+    def test_use_backend_by_name(self):
+        """Test that a registered backend can be picked by name"""
+        WindowInfoGetter.register_backend("test", lambda: False, lambda: ("App", "Win"))
+        try:
+            WindowInfoGetter.use_backend("test")
+            self.assertEqual(WindowInfoGetter.get_current_window(), ("App", "Win"))
+        finally:
+            del WindowInfoGetter._backends["test"]
+
+    def test_failing_backend_returns_gap(self):
+        """Test that a failing backend is backed off instead of blocking"""
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise OSError("display went away")
+
+        WindowInfoGetter.use_backend(failing)
+        logging.disable(logging.WARNING)
+        try:
+            windows = [WindowInfoGetter.get_current_window() for _ in range(10)]
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertEqual(windows, [GAP] * 10)
+        self.assertEqual(len(calls), WindowInfoGetter.breaker.failure_threshold)
+        self.assertEqual(WindowInfoGetter.last_error, "OSError")
+
+
+if __name__ == "__main__":
+    unittest.main()
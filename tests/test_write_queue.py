@@ -0,0 +1,131 @@
+# unit tests for write_queue.py
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db import Database
+from write_queue import BufferedWriter
+
+
+class TestBufferedWriter(unittest.TestCase):
+    """Unit tests for write_queue.py"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.directory.name, "test.db"))
+
+    def tearDown(self):
+        self.database.close()
+        self.directory.cleanup()
+
+    def test_flush_writes_batch(self):
+        """Test that flush writes everything queued in one batch"""
+        writer = BufferedWriter(self.database, max_batch=1000, max_age=60)
+        writer.start()
+        for _ in range(10):
+            writer.put(("App", 1000, 1002))
+        self.assertTrue(writer.flush(timeout=5))
+        writer.stop()
+
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 20)
+        self.assertEqual(writer.flush_count, 1)
+        self.assertEqual(writer.rows_written, 10)
+
+    def test_batch_size_limit(self):
+        """Test that a full batch is written without an explicit flush"""
+        writer = BufferedWriter(self.database, max_batch=5, max_age=60)
+        writer.start()
+        for _ in range(10):
+            writer.put(("App", 1000, 1001))
+        writer.stop()
+
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 10)
+        self.assertEqual(writer.flush_count, 2)
+
+    def test_stop_without_start(self):
+        """Test that stopping a writer that never started still writes"""
+        writer = BufferedWriter(self.database)
+        writer.put(("App", 1000, 1003))
+        writer.stop()
+
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 3)
+        self.assertEqual(writer.stats()["queue_depth"], 0)
+
+    def test_gaps_share_the_batch(self):
+        """Test that gaps are written in the same batch as the sessions"""
+        writer = BufferedWriter(self.database, max_age=60)
+        writer.start()
+        writer.put(("App", 1000, 1004))
+        writer.put((None, 1004, 1010, "OSError"))
+        self.assertTrue(writer.flush(timeout=5))
+        writer.stop()
+
+        self.assertEqual(writer.flush_count, 1)
+        self.assertEqual(writer.rows_written, 1)
+        self.assertEqual(self.database.gaps(), [(1004, 1010, "OSError")])
+
+    def test_failed_write_is_retried(self):
+        """Test that a failing write is retried instead of killing the thread"""
+        failures = [sqlite3.OperationalError("database is locked")]
+        add_many = self.database.add_many
+
+        def flaky_add_many(sessions, gaps=()):
+            if failures:
+                raise failures.pop()
+            add_many(sessions, gaps)
+
+        self.database.add_many = flaky_add_many
+        writer = BufferedWriter(self.database, max_age=60, retry_delay=0.01)
+        writer.start()
+        writer.put(("App", 1000, 1004))
+        self.assertTrue(writer.flush(timeout=5))
+        writer.stop()
+
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 4)
+        self.assertEqual((writer.write_errors, writer.rows_dropped), (1, 0))
+
+    def test_batch_is_dropped_after_retries(self):
+        """Test that a batch that keeps failing is dropped and flush returns"""
+
+        def failing_add_many(sessions, gaps=()):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        self.database.add_many = failing_add_many
+        writer = BufferedWriter(self.database, max_age=60, max_retries=2, retry_delay=0.01)
+        writer.start()
+        writer.put(("App", 1000, 1004))
+        self.assertTrue(writer.flush(timeout=5))
+        writer.put(("App", 1004, 1005))
+        writer.stop(timeout=5)
+
+        # Both batches are tried three times, stop() retries like the thread
+        self.assertEqual(writer.write_errors, 6)
+        self.assertEqual(writer.rows_dropped, 2)
+
+    def test_locked_database_is_never_dropped(self):
+        """Test that a batch keeps being retried while the database is locked"""
+        failures = [sqlite3.OperationalError("database is locked")] * 6
+        add_many = self.database.add_many
+
+        def locked_add_many(sessions, gaps=()):
+            if failures:
+                raise failures.pop()
+            add_many(sessions, gaps)
+
+        self.database.add_many = locked_add_many
+        writer = BufferedWriter(
+            self.database, max_age=60, max_retries=1, retry_delay=0.001, max_retry_delay=0.01
+        )
+        writer.start()
+        writer.put(("App", 1000, 1004))
+        self.assertTrue(writer.flush(timeout=5))
+        writer.stop()
+
+        self.assertEqual(self.database.total_time_spent_on_app("App"), 4)
+        self.assertEqual((writer.write_errors, writer.rows_dropped), (6, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
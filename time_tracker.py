@@ -5,47 +5,77 @@ Author: Christoffer von Matérn @Birdey
 
 Date: 28-06-2021
 
-Version: 1.0
+Version: 1.4
 
 Version history:
     1.0: Created the class
+    1.1: Moved scanning and storage into Tracker
+    1.2: Start and Stop pause and resume the one Scanner worker
+    1.3: Optional asyncio engine run from the Tk loop
+    1.4: A live dashboard of the in-memory totals next to the stats window
 """
 
-import datetime
-import threading
+from __future__ import annotations
+
 import time
-import tkinter
-from window_info_graber import WindowInfoGetter
+from typing import TYPE_CHECKING
 
-from window_manager import WindowManager
-from db import Database
+from tracker import Tracker
 from utils.string_utils import seconds_to_hms_str
 
+# tkinter and the widgets are imported when the window is first opened, so
+# importing this module does not pay for them
+# pylint: disable=import-outside-toplevel
+if TYPE_CHECKING:
+    import tkinter
+
+    from async_engine import AsyncEngine
+    from query_executor import QueryExecutor
+    from window_manager import WindowManager
 
-class TimeTracker:
+
+class TimeTracker(Tracker):
     """
     The main class for the TimeTracker
     """
 
     main_window: tkinter.Tk
     window_manager: WindowManager
-    database: Database
+    query_executor: QueryExecutor
+    engine: AsyncEngine
 
     start_button: tkinter.Button
     stop_button: tkinter.Button
     stats_button: tkinter.Button
+    live_button: tkinter.Button
 
-    scanning: bool
+    def __init__(self, database_name: str = "time_tracking.db", engine: str = "thread") -> None:
+        """
+        Create the tracker
 
-    def __init__(self) -> None:
-        self.database = Database("time_tracking.db")
-        self.scanning = False
+            Parameters:
+                database_name (str): The database file to write to
+                engine (str): "thread" to scan on the Scanner worker, "async"
+                    to scan on an AsyncEngine run from the Tk loop
+        """
+        super().__init__(database_name, engine=engine)
+        self.query_executor = None
+        self.engine = None
 
     def run(self) -> None:
         """
         Run the program
         """
+        from query_executor import QueryExecutor
+        from window_manager import WindowManager
+
         self.main_window = WindowManager("Time Tracker", (1080, 970))
+        self.query_executor = QueryExecutor(self.main_window.window)
+        if self.engine_name == "async":
+            from async_engine import AsyncEngine
+
+            self.engine = AsyncEngine(self)
+            self.engine.attach(self.main_window.window)
 
         # Terminate the program when the window is closed
         self.main_window.window.protocol("WM_DELETE_WINDOW", func=self.quit_app)
@@ -72,6 +102,9 @@ class TimeTracker:
         self.stats_button = self.main_window.add_button(
             "Stats", (10, 70), (50, 20), self.show_stats_window
         )
+        self.live_button = self.main_window.add_button(
+            "Live", (10, 100), (50, 20), self.show_live_window
+        )
 
         self.stop_button["state"] = "disabled"
 
@@ -81,128 +114,88 @@ class TimeTracker:
         """
         Creates a new window that shows the stats for the application
         """
-        print(event)
-        app_data = self.database.view_data()
-
-        pos_x = 20
-        pos_y = 70
-
-        app_time_total = {}
-        for data in app_data:
-            name, app_time, _ = data
-            if name in app_time_total:
-                app_time_total[name]["time"] += app_time
-                app_time_total[name]["opens"] += 1
-            else:
-                app_time_total[name] = {
-                    "time": app_time,
-                    "opens": 1,
-                }
-
-        # Sort app_time_total
-        app_time_total = {
-            k: v
-            for k, v in sorted(
-                app_time_total.items(), key=lambda item: item[1]["time"], reverse=True
-            )
-        }
+        from window_manager import WindowManager
 
+        print(event)
         stats_window = WindowManager("Stats", (600, 700))
 
         stats_window.add_text("Stats", (150, 10))
+        status = stats_window.add_text("", (300, 10))
+        table = stats_window.add_table(
+            [
+                ("App:", 200),
+                ("Time:", 100, lambda seconds: seconds_to_hms_str(int(seconds))),
+                ("Opens:", 100),
+            ],
+            [],
+            (20, 70),
+            (560, 610),
+        )
 
-        stats_window.add_text("App:", (pos_x, pos_y))
-        stats_window.add_text("Time:", (pos_x + 200, pos_y))
-        stats_window.add_text("Opens:", (pos_x + 300, pos_y))
+        def on_progress(busy):
+            status["text"] = "Loading..." if busy else ""
 
-        pos_y += 20
+        def on_error(error):
+            status["text"] = f"Could not load stats: {error}"
 
-        for app in app_time_total.items():
-            app_name = app[0]
-            app_time = seconds_to_hms_str(int(app[1]["time"]))
-            app_opens = app[1]["opens"]
-            stats_window.add_text(f"{app_name}:", (pos_x, pos_y))
-            stats_window.add_text(f"{app_time}", (pos_x + 200, pos_y))
-            stats_window.add_text(f"{app_opens}", (pos_x + 300, pos_y))
-            pos_y += 20
+        self.query_executor.submit(
+            "stats",
+            self.database.app_summary,
+            table.set_rows,
+            on_error,
+            on_progress,
+        )
 
         stats_window.show()
 
-    def show_stats(self, event):
+    def show_live_window(self, event) -> None:  # pylint: disable=unused-argument
         """
-        Show the stats window
+        Creates a new window that follows the in-memory totals a few times
+        per second, including the open session, without reading the database
         """
+        from window_manager import WindowManager
 
-        print(event)
-        app_data = self.database.view_data()
-
-        pos_x = 20
-        pos_y = 70
-
-        app_time_total = {}
-        for data in app_data:
-            name, app_time, _ = data
-            if name in app_time_total:
-                app_time_total[name]["time"] += app_time
-                app_time_total[name]["opens"] += 1
-            else:
-                app_time_total[name] = {
-                    "time": app_time,
-                    "opens": 1,
-                }
-
-        # Sort app_time_total
-        app_time_total = {
-            k: v
-            for k, v in sorted(
-                app_time_total.items(), key=lambda item: item[1]["time"], reverse=True
-            )
-        }
-
-        stats_window = WindowManager("Stats", (600, 700))
+        live_window = WindowManager("Live", (700, 700))
 
-        stats_window.add_text("Stats", (150, 10))
+        live_window.add_text("Live", (150, 10))
+        shown = {"version": -1, "day": None}
 
-        stats_window.add_text("App:", (pos_x, pos_y))
-        stats_window.add_text("Time:", (pos_x + 200, pos_y))
-        stats_window.add_text("Opens:", (pos_x + 300, pos_y))
+        def poll():
+            now = time.time()
+            day = self.totals.day_of(now)
+            if day != shown["day"]:
+                # Every row has a new value for today after midnight
+                shown["version"], shown["day"] = -1, day
+            shown["version"], rows = self.totals.changes(shown["version"], now, day)
+            return rows
 
-        pos_y += 20
+        def hms(seconds):
+            return seconds_to_hms_str(int(seconds))
 
-        for app in app_time_total.items():
-            app_name = app[0]
-            app_time = seconds_to_hms_str(int(app[1]["time"]))
-            app_opens = app[1]["opens"]
-            stats_window.add_text(f"{app_name}:", (pos_x, pos_y))
-            stats_window.add_text(f"{app_time}", (pos_x + 200, pos_y))
-            stats_window.add_text(f"{app_opens}", (pos_x + 300, pos_y))
-            pos_y += 20
+        table = live_window.add_live_table(
+            [("App:", 250), ("Today:", 100, hms), ("Time:", 100, hms), ("Opens:", 100)],
+            poll,
+            (20, 70),
+            (660, 610),
+        )
+        table.sort_by(2, reverse=True)
 
-        stats_window.show()
+        live_window.show()
 
-    def report(self, application_name: str, start_time: int, end_time: int):
+    def show_stats(self, event):
         """
-        Saves reported data to the database
-
-            Parameters:
-                application_name (str): The name of the application
-                start_time (int): The start time
-                end_time (int): The end time
+        Show the stats window
         """
-        if application_name.strip() == "":
-            print("Not reporting app because it's empty.")
-            print(f"time: {seconds_to_hms_str(end_time - start_time)}")
-            return
-        running_time = end_time - start_time
-        self.database.add_data(application_name, running_time, datetime.date.today())
+        self.show_stats_window(event)
 
     def start_button_callback(self, event):  # pylint: disable=unused-argument
         """
         Start scanning for the current window
         """
-
-        self.scanning = True
-        threading.Thread(target=self.start_scan).start()
+        if self.engine is not None:
+            self.engine.start_scan()
+        else:
+            self.scanner.start()
         self.start_button["state"] = "disabled"
         self.stop_button["state"] = "normal"
 
@@ -210,37 +203,29 @@ class TimeTracker:
         """
         Stop scanning for the current window
         """
-        self.scanning = False
+        if self.engine is not None:
+            self.engine.pause_scan()
+        else:
+            self.scanner.pause()
+            self.writer.flush()
 
         self.start_button["state"] = "normal"
         self.stop_button["state"] = "disabled"
 
-    def start_scan(self):
-        """
-        Start scanning for the current window
-        """
-        print("Scanning")
-        current_application = ""
-        start_time = time.time()
-        while self.scanning:
-            owner_name, window_name = WindowInfoGetter.get_current_window()
-            if window_name == "Unknown":
-                window_name = owner_name + " - Application"
-
-            if window_name != current_application:
-                self.report(current_application, start_time, time.time())
-                current_application = window_name
-                start_time = time.time()
-
-            time.sleep(0.1)
-
     def quit_app(self):
         """
-        Quit the program
+        Quit the program, after the open session is closed and written
         """
+        if self.engine is not None:
+            self.engine.close()
+        if self.scanner is not None:
+            self.scanner.stop()
+        if self.query_executor is not None:
+            self.query_executor.shutdown()
         if self.main_window is not None:
             self.main_window.destroy()
 
+        self.shutdown()
         quit()
 
     def update(self) -> None:
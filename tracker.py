@@ -0,0 +1,281 @@
+"""
+The tracking core of the TimeTracker, without any GUI
+"""
+
+import logging
+import os
+import threading
+import time
+
+from coalescer import SessionCoalescer
+from db import Database
+from journal import SessionJournal
+from live_totals import LiveTotals
+from metrics import METRICS
+from resilience import RateLimitedLogger
+from sampler import Sampler
+from scanner import Scanner
+from window_info_graber import GAP, WindowInfoGetter
+from write_queue import BufferedWriter
+
+_SESSIONS_DROPPED = METRICS.counter(
+    "sessions_dropped_total", "Sessions dropped because the window had no name"
+)
+_GAPS_RECORDED = METRICS.counter(
+    "gaps_recorded_total", "Spans recorded while the window backend was failing"
+)
+_LOG = RateLimitedLogger(logging.getLogger("timetracker.scan"), interval=60.0)
+
+
+class Tracker:
+    """
+    Samples the active window and stores the sessions. This class does not
+    import tkinter, so it can run headless.
+    """
+
+    database: Database
+    writer: BufferedWriter
+    journal: SessionJournal
+    sampler: Sampler
+    coalescer: SessionCoalescer
+    scanner: Scanner
+    totals: LiveTotals
+
+    scanning: bool
+
+    def __init__(
+        self,
+        database_name: str = "time_tracking.db",
+        min_dwell: float = 1.0,
+        engine: str = "thread",
+    ) -> None:
+        """
+        Open the storage and recover the session left open by a crash
+
+            Parameters:
+                database_name (str): The database file to write to
+                min_dwell (float): Windows active for less than this many
+                    seconds count towards the session around them
+                engine (str): "thread" to scan on the Scanner worker and
+                    write on the writer thread, "async" to leave both to an
+                    AsyncEngine, which writes its batches with writer.write()
+        """
+        self.min_dwell = min_dwell
+        self.engine_name = engine
+        self.database = Database(database_name)
+        # Seeded before the journal is replayed, so the recovered sessions
+        # are counted once
+        self.totals = LiveTotals()
+        self.totals.seed(self.database)
+        self.journal = SessionJournal(os.path.splitext(database_name)[0] + ".journal")
+        self.replay_journal()
+        self.writer = BufferedWriter(self.database, on_written=self.release_written)
+        if engine == "thread":
+            self.writer.start()
+        self.sampler = Sampler(self.current_window)
+        self.coalescer = None
+        self.scanning = False
+        # Guards the open session, so a pause can close it while the scan
+        # loop is stuck in a tick
+        self._scan_lock = threading.Lock()
+        self._scan_open = False
+        self.scanner = Scanner(self) if engine == "thread" else None
+
+    def report(self, application_name: str, start_time: int, end_time: int):
+        """
+        Saves reported data to the database
+
+            Parameters:
+                application_name (str): The name of the application, or None
+                    for a span where the window could not be determined
+                start_time (int): The start time
+                end_time (int): The end time
+        """
+        record = self.to_record(application_name, start_time, end_time)
+        if record is None:
+            return
+        self.hold_closed(record)
+        # Gaps go through the writer too, so a flapping backend does not
+        # cost a commit per flap on the scan thread
+        self.writer.put(record)
+        if application_name is not None:
+            self.totals.add(application_name, start_time, end_time)
+
+    def hold_closed(self, record: tuple) -> None:
+        """
+        Keep a closed session in the journal until the writer has committed
+        it, the next session overwrites the open one right away
+
+            Parameters:
+                record (tuple): The session or gap record given to the writer
+        """
+        if record[0] is not None:
+            self.journal.hold(*record)
+
+    def release_written(self, batch: list) -> None:
+        """
+        Release the sessions of a committed batch from the journal
+
+            Parameters:
+                batch (list): The records the writer committed
+        """
+        for record in batch:
+            if record[0] is not None:
+                self.journal.release(*record)
+
+    @staticmethod
+    def to_record(application_name: str, start_time: float, end_time: float):
+        """
+        Turn a reported session into a record for the writer, counting gaps
+        and dropped sessions
+
+            Parameters:
+                application_name (str): The name of the application, or None
+                    for a span where the window could not be determined
+                start_time (float): The start time
+                end_time (float): The end time
+
+            Returns:
+                tuple: The session or gap record, or None if the session has
+                    no name and is dropped
+        """
+        if application_name is None:
+            _GAPS_RECORDED.inc()
+            return (None, start_time, end_time, WindowInfoGetter.last_error or "unknown")
+        if application_name.strip() == "":
+            _SESSIONS_DROPPED.inc()
+            return None
+        return (application_name, start_time, end_time)
+
+    def start_scan(self, should_continue: callable = None):
+        """
+        Scan for the current window until should_continue() is False
+
+            Parameters:
+                should_continue (callable): Checked before every tick, by
+                    default the scanning attribute is
+        """
+        print("Scanning")
+        scanning = should_continue or (lambda: self.scanning)
+
+        def on_open(window_name, start_time):
+            if window_name is None:
+                self.journal.clear()
+            else:
+                self.journal.begin(window_name, start_time)
+            self.totals.open(window_name, start_time)
+
+        def on_change(window, now):
+            owner_name, window_name = window or (None, None)
+            with self._scan_lock:
+                if self._scan_open:
+                    coalescer.change(window_name, now, owner_name)
+
+        def on_tick(now):
+            with self._scan_lock:
+                if self._scan_open:
+                    coalescer.tick(now)
+                    self.journal.heartbeat(now)
+
+        with self._scan_lock:
+            self.coalescer = coalescer = SessionCoalescer(
+                self.report, self.min_dwell, on_open
+            )
+            # The first sample opens the first session
+            self._scan_open = True
+        self.sampler.run(on_change, lambda: self._scan_open and scanning(), on_tick)
+
+        self.finish_scan(time.time())
+        _LOG.log(logging.DEBUG, "sampler_stats", **self.sampler.stats())
+        _LOG.log(logging.DEBUG, "coalescer_stats", **coalescer.stats())
+
+    def finish_scan(self, end_time: float) -> bool:
+        """
+        Close the open session, the scan loop ends at its next tick and
+        anything it samples until then is dropped
+
+            Parameters:
+                end_time (float): The unix time the session ends at
+
+            Returns:
+                bool: False if no session was open
+        """
+        with self._scan_lock:
+            if not self._scan_open:
+                return False
+            self._scan_open = False
+            self.coalescer.close(end_time)
+            self.journal.clear()
+        return True
+
+    def replay_journal(self) -> None:
+        """
+        Save the session that was still open when the program last stopped,
+        and the closed ones the writer had not committed yet. They are
+        committed before the journal is cleared, so a second crash cannot
+        lose them
+        """
+        sessions = self.journal.held()
+        recovered = self.journal.recover()
+        if recovered is not None:
+            print(f"Recovered open session: {recovered[0]}")
+            sessions.append(recovered)
+        if not sessions:
+            return
+        # A session committed just before the crash is still held
+        records = [
+            record
+            for record in (self.to_record(*session) for session in sessions)
+            if record is not None and not self._is_committed(record)
+        ]
+        self.database.add_many(records)
+        for record in records:
+            self.totals.add(*record)
+        self.journal.clear()
+        self.journal.release_all()
+
+    def _is_committed(self, record: tuple) -> bool:
+        application_name, start_time, _ = record
+        day = LiveTotals.day_of(start_time)
+        return any(
+            row[1] == round(start_time)
+            for row in self.database.iter_sessions(application_name, day, day)
+        )
+
+    @staticmethod
+    def current_window() -> tuple:
+        """
+        Get the application that owns the current window and the name the
+        window is tracked under
+
+            Returns:
+                str, str: The application name and the window name, the
+                    application name for unnamed windows, or None if the
+                    backend could not tell
+        """
+        window = WindowInfoGetter.get_current_window()
+        if window == GAP:
+            return None
+        owner_name, window_name = window
+        if window_name == "Unknown":
+            window_name = owner_name + " - Application"
+        return owner_name, window_name
+
+    def stop_scan(self) -> None:
+        """
+        Ask a scan loop started with start_scan() to stop, it stops after its
+        current tick
+        """
+        self.scanning = False
+        self.sampler.wake()
+
+    def shutdown(self) -> None:
+        """
+        Stop scanning, write everything pending and close the storage
+        """
+        self.stop_scan()
+        if self.scanner is not None:
+            self.scanner.stop()
+        self.writer.stop()
+        self.journal.close()
+        self.database.close()
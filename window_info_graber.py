@@ -5,28 +5,125 @@ Author: Christoffer von Matérn @Birdey
 
 Date: 28-06-2021
 
-Version: 1.0
+Version: 1.1
 
 Version history:
     1.0: Created the class
+    1.1: Backend errors back off instead of sleeping and are reported as gaps
 """
 
-# pylint: disable=no-name-in-module
+# pylint: disable=no-name-in-module, import-error, import-outside-toplevel
 
+# The platform modules are imported by the backend that uses them, the first
+# time it is used, so importing this module stays cheap everywhere.
+
+import bisect
+import os
 import sys
 import importlib.util
-from time import sleep
+import logging
+from time import monotonic, perf_counter
+
+from metrics import METRICS
+from resilience import CircuitBreaker, RateLimitedLogger
+
+_WINDOW_LATENCY = METRICS.histogram(
+    "get_current_window_seconds", "Time to get the active window from the backend"
+)
+_BACKEND_ERRORS = METRICS.counter("backend_errors_total", "Backend exceptions")
+_LOG = RateLimitedLogger(logging.getLogger("timetracker.backend"), interval=60.0)
+
+# Returned instead of a window while the backend is failing, the time until
+# it recovers is recorded as a gap rather than a session
+GAP = (None, None)
+
+
+class SyntheticWindowSource:
+    """
+    Replays a recorded focus trace as if it was the active window, so the
+    tracker can run and be load tested without a desktop
+
+        Example
+        -------
+            >>> source = SyntheticWindowSource([(5, "Safari", "Docs"), (2, "iTerm2", "Terminal")])
+            >>> WindowInfoGetter.use_backend(source)
+
+        Methods
+        --------
+            >>> from_file(path, speed, loop): Load a trace from a JSON file
+            >>> finished(): Whether the whole trace has been replayed
+    """
 
-if importlib.util.find_spec("win32gui") is not None:
-    import win32gui  # pylint: disable=import-error
+    def __init__(
+        self, trace: list, speed: float = 1.0, loop: bool = False, clock: callable = monotonic
+    ) -> None:
+        """
+        Create the source
+
+            Parameters:
+                trace (list[tuple]): The (seconds, application_name, window_name) entries
+                speed (float): How many trace seconds pass per real second
+                loop (bool): Start over when the trace ends instead of staying on the last entry
+                clock (callable): Returns the current time in seconds
+        """
+        if not trace:
+            raise ValueError("The focus trace is empty")
+        self.trace = [(application, window) for _, application, window in trace]
+        self.offsets = []
+        total = 0.0
+        for seconds, _, _ in trace:
+            self.offsets.append(total)
+            total += seconds
+        self.duration = total
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+        self.started = None
+
+    @classmethod
+    def from_file(cls, path: str, speed: float = 1.0, loop: bool = False):
+        """
+        Load a trace from a JSON file holding a list of [seconds, application, window]
+
+            Parameters:
+                path (str): The path to the trace file
+                speed (float): How many trace seconds pass per real second
+                loop (bool): Start over when the trace ends
 
-if importlib.util.find_spec("AppKit") is not None:
-    from AppKit import NSWorkspace
-    from Quartz import (
-        CGWindowListCopyWindowInfo,
-        kCGWindowListOptionOnScreenOnly,
-        kCGNullWindowID,
-    )
+            Returns:
+                SyntheticWindowSource: The source
+        """
+        import json
+
+        with open(path, encoding="utf-8") as trace_file:
+            return cls([tuple(entry) for entry in json.load(trace_file)], speed, loop)
+
+    def elapsed(self) -> float:
+        """
+        Get how many trace seconds have been replayed
+
+            Returns:
+                float: The trace time
+        """
+        if self.started is None:
+            self.started = self.clock()
+        return (self.clock() - self.started) * self.speed
+
+    def finished(self) -> bool:
+        """
+        Whether the whole trace has been replayed
+
+            Returns:
+                bool: True once the trace time has passed the end of the trace
+        """
+        return not self.loop and self.elapsed() >= self.duration
+
+    def __call__(self):
+        elapsed = self.elapsed()
+        if self.loop and self.duration:
+            elapsed %= self.duration
+        index = bisect.bisect_right(self.offsets, elapsed) - 1
+        return self.trace[max(index, 0)]
 
 
 class WindowInfoGetter:
@@ -40,129 +137,256 @@ class WindowInfoGetter:
         Methods
         --------
             >>> get_current_window(): Get the current window
+            >>> register_backend(name, is_available, getter): Add a window source
+            >>> use_backend(backend): Pick the window source by name or callable
+            >>> backend_name(): Get the name of the window source in use
     """
 
-    @staticmethod
-    def _get_active_window_win32():
-        window = win32gui.GetForegroundWindow()
-        window_name = win32gui.GetWindowText(window)
-        application_name = win32gui.GetClassName(window)
+    # name -> (is_available, getter), tried in insertion order
+    _backends = {}
+    _active_name = None
+    _active = None
+    _normalize = None
+
+    _x11_display = None
 
-        return WindowInfoGetter._review_active_info_win32(application_name, window_name)
+    # Shared by every backend, use_backend() starts it closed again
+    breaker = CircuitBreaker()
+    last_error = None
 
     @staticmethod
-    def _get_active_window_darwin():
-        curr_pid = NSWorkspace.sharedWorkspace().activeApplication()[
-            "NSApplicationProcessIdentifier"
-        ]
-        options = kCGWindowListOptionOnScreenOnly
-        window_list = CGWindowListCopyWindowInfo(options, kCGNullWindowID)
+    def register_backend(name: str, is_available: callable, getter: callable) -> None:
+        """
+        Add a window source to the registry
 
-        for window in window_list:
-            pid = window["kCGWindowOwnerPID"]
-            if curr_pid == pid:
-                application_name = window["kCGWindowOwnerName"]
-                window_name = window.get("kCGWindowName", "Unknown")
+            Parameters:
+                name (str): The name of the backend
+                is_available (callable): Returns True if the backend works on this machine
+                getter (callable): Returns (application_name, window_name)
+        """
+        WindowInfoGetter._backends[name] = (is_available, getter)
 
-        return WindowInfoGetter._review_active_info_darwin(
-            application_name, window_name
+    @staticmethod
+    def use_backend(backend=None) -> None:
+        """
+        Pick the window source, resolving it once instead of on every call
+
+            Parameters:
+                backend (str | callable): A registered backend name, a callable
+                    returning (application_name, window_name), or None to use
+                    $TIMETRACKER_BACKEND or the first available backend
+        """
+        if callable(backend):
+            WindowInfoGetter._activate(
+                getattr(backend, "__name__", type(backend).__name__), backend
+            )
+            return
+
+        backend = backend or os.environ.get("TIMETRACKER_BACKEND")
+        if backend == "synthetic":
+            WindowInfoGetter.use_backend(
+                SyntheticWindowSource.from_file(
+                    os.environ["TIMETRACKER_TRACE"],
+                    float(os.environ.get("TIMETRACKER_TRACE_SPEED", "1")),
+                )
+            )
+            return
+        if backend:
+            _, getter = WindowInfoGetter._backends[backend]
+            WindowInfoGetter._activate(backend, getter)
+            return
+
+        for name, (is_available, getter) in WindowInfoGetter._backends.items():
+            if is_available():
+                WindowInfoGetter._activate(name, getter)
+                return
+
+        WindowInfoGetter._activate(
+            "unknown", WindowInfoGetter._get_active_window_unknown
         )
 
     @staticmethod
-    def _review_active_info_darwin(application_name, window_name):
-        if application_name == "Safari":
-            if " - Safari" in window_name:
-                window_name = window_name[: -len(" - Safari")]
-        elif application_name == "Google Chrome":
-            if " - Google Chrome" in window_name:
-                window_name = window_name[: -len(" - Google Chrome")]
-        elif "Code" in application_name:
-            window_name = "Visual Studio Code"
-        elif application_name == "iTerm2":
-            window_name = "Terminal"
+    def _activate(name: str, getter: callable) -> None:
+        from normalizer import TitleNormalizer
 
-        return application_name, window_name
+        WindowInfoGetter.breaker.record_success()
+        WindowInfoGetter._normalize = TitleNormalizer.for_backend(name).normalize
+        WindowInfoGetter._active_name = name
+        WindowInfoGetter._active = getter
 
     @staticmethod
-    def _review_active_info_win32(application_name, window_name):
-        window_name = window_name.replace("-", "—")
-        window_name_sections = window_name.split("—")
-        application_name = window_name_sections.pop(
-            len(window_name_sections) - 1
-        ).strip()
-        window_name = window_name_sections.pop().strip()
-        print(f"Application name: {application_name} - Window name: {window_name}")
-        return application_name, window_name
+    def backend_name() -> str:
+        """
+        Get the name of the window source in use
+
+            Returns:
+                str: The backend name
+        """
+        if WindowInfoGetter._active is None:
+            WindowInfoGetter.use_backend()
+        return WindowInfoGetter._active_name
 
     @staticmethod
-    def get_current_window():
+    def _get_active_window_unknown():
+        return "UnknownApplication", "UnknownWindowName"
+
+    @staticmethod
+    def _process_name(pid: int) -> str:
         """
-        Get the current window
+        Get the name of a process from /proc
 
             Parameters:
-                event_window_num (int): The number of the window
+                pid (int): The process id
 
             Returns:
-                str, str: The name of the application and the name of the window
+                str: The process name, or None if the process is gone
         """
         try:
-            if sys.platform == "darwin":
-                return WindowInfoGetter._get_active_window_darwin()
-            if sys.platform == "win32":
-                return WindowInfoGetter._get_active_window_win32()
+            with open(f"/proc/{pid}/comm", encoding="utf-8") as comm:
+                return comm.read().strip()
+        except OSError:
+            return None
 
-        except KeyboardInterrupt:
-            print("Stopping time tracker")
-            sys.exit()
+    @staticmethod
+    def _x11_available() -> bool:
+        if not sys.platform.startswith("linux") or not os.environ.get("DISPLAY"):
+            return False
+        if importlib.util.find_spec("Xlib") is None:
+            return False
+        from Xlib.display import Display
+        from Xlib.error import DisplayError
 
-        except SystemExit:
-            print("Stopping time tracker")
-            sys.exit()
+        try:
+            WindowInfoGetter._x11_display = Display()
+        except DisplayError:
+            return False
+        return True
 
-        except NameError as error:
-            WindowInfoGetter._print_error_message(error)
+    @staticmethod
+    def _get_active_window_x11():
+        from Xlib import X
+        from Xlib.display import Display
 
-        except ModuleNotFoundError as error:
-            WindowInfoGetter._print_error_message(error)
+        display = WindowInfoGetter._x11_display
+        if display is None:
+            display = WindowInfoGetter._x11_display = Display()
+        root = display.screen().root
 
-        except ValueError as error:
-            WindowInfoGetter._print_error_message(error)
+        active = root.get_full_property(
+            display.intern_atom("_NET_ACTIVE_WINDOW"), X.AnyPropertyType
+        )
+        if active is None or not active.value or not active.value[0]:
+            return WindowInfoGetter._get_active_window_unknown()
+        window = display.create_resource_object("window", active.value[0])
 
-        except Exception as error:
-            WindowInfoGetter._print_error_message(error)
+        title = window.get_full_property(
+            display.intern_atom("_NET_WM_NAME"), display.intern_atom("UTF8_STRING")
+        )
+        if title is None:
+            title = window.get_full_property(X.WM_NAME, X.AnyPropertyType)
+        window_name = title.value if title is not None else "Unknown"
+        if isinstance(window_name, bytes):
+            window_name = window_name.decode("utf-8", "replace")
+
+        application_name = None
+        pid = window.get_full_property(
+            display.intern_atom("_NET_WM_PID"), X.AnyPropertyType
+        )
+        if pid is not None and pid.value:
+            application_name = WindowInfoGetter._process_name(pid.value[0])
+        if application_name is None:
+            wm_class = window.get_wm_class()
+            application_name = wm_class[1] if wm_class else "UnknownApplication"
 
-        return "UnknownApplication", "UnknownWindowName"
+        return application_name, window_name or "Unknown"
+
+    @staticmethod
+    def _get_active_window_win32():
+        import win32gui
+
+        window = win32gui.GetForegroundWindow()
+        window_name = win32gui.GetWindowText(window)
+        application_name = win32gui.GetClassName(window)
 
-    # def _print_exception_message(self, exception: Exception):
-    #     """
-    #     Print the exception message
-
-    #         Parameters:
-    #             exception (Exception): The exception
-    #     """
-    #     print("===================================")
-    #     print(f"{exception.name}: \n'{exception}'")
-    #     print(f"file name: {sys.exc_info()[-1].tb_frame.f_code.co_filename}")
-    #     print(f"error line number: {sys.exc_info()[-1].tb_lineno}")
-    #     print("-----------------------------------")
-    #     print(f"Traceback: \n{exception.with_traceback()}"
-    #     print("-----------------------------------")
-    #     print("===================================")
+        return application_name, window_name
 
     @staticmethod
-    def _print_error_message(error):
+    def _get_active_window_darwin():
+        from AppKit import NSWorkspace
+        from Quartz import (
+            CGWindowListCopyWindowInfo,
+            kCGWindowListOptionOnScreenOnly,
+            kCGNullWindowID,
+        )
+
+        curr_pid = NSWorkspace.sharedWorkspace().activeApplication()[
+            "NSApplicationProcessIdentifier"
+        ]
+        options = kCGWindowListOptionOnScreenOnly
+        window_list = CGWindowListCopyWindowInfo(options, kCGNullWindowID)
+
+        for window in window_list:
+            pid = window["kCGWindowOwnerPID"]
+            if curr_pid == pid:
+                application_name = window["kCGWindowOwnerName"]
+                window_name = window.get("kCGWindowName", "Unknown")
+
+        return application_name, window_name
+
+    @staticmethod
+    def get_current_window():
         """
-        Print the error message
+        Get the current window. A failing backend never blocks: the error is
+        logged (rate limited), and while the backend keeps failing it is only
+        retried with exponential backoff. GAP is returned in the meantime.
 
-            Parameters:
-                error_message (Error): The error
-        """
-        print("===================================")
-        print(f"{error.name}: \n'{error}'")
-        print(f"file name: {sys.exc_info()[-1].tb_frame.f_code.co_filename}")
-        print(f"error line number: {sys.exc_info()[-1].tb_lineno}")
-        print("-----------------------------------")
-        print(f"Traceback: \n{error.with_traceback()}")
-        print("-----------------------------------")
-        print("===================================")
-        sleep(10)
+            Returns:
+                str, str: The name of the application and the name of the
+                    window, or GAP if the backend could not tell
+        """
+        breaker = WindowInfoGetter.breaker
+        if not breaker.allow():
+            return GAP
+
+        started = perf_counter()
+        try:
+            if WindowInfoGetter._active is None:
+                WindowInfoGetter.use_backend()
+            window = WindowInfoGetter._normalize(*WindowInfoGetter._active())
+
+        except Exception as error:  # pylint: disable=broad-except
+            _BACKEND_ERRORS.inc()
+            breaker.record_failure()
+            WindowInfoGetter.last_error = type(error).__name__
+            _LOG.warning(
+                "backend_error",
+                backend=WindowInfoGetter._active_name,
+                error=type(error).__name__,
+                message=str(error),
+                failures=breaker.failures,
+                retry_in=round(breaker.retry_in(), 3),
+            )
+            return GAP
+
+        finally:
+            _WINDOW_LATENCY.observe(perf_counter() - started)
+
+        breaker.record_success()
+        return window
+
+
+WindowInfoGetter.register_backend(
+    "darwin",
+    lambda: sys.platform == "darwin" and importlib.util.find_spec("AppKit") is not None,
+    WindowInfoGetter._get_active_window_darwin,
+)
+WindowInfoGetter.register_backend(
+    "win32",
+    lambda: sys.platform == "win32" and importlib.util.find_spec("win32gui") is not None,
+    WindowInfoGetter._get_active_window_win32,
+)
+WindowInfoGetter.register_backend(
+    "x11",
+    WindowInfoGetter._x11_available,
+    WindowInfoGetter._get_active_window_x11,
+)
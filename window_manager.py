@@ -3,8 +3,181 @@ This module is responsible for creating and rendering the main window.
 
 Classes:
     WindowManager
+    VirtualTable
 """
 import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualTable:
+    """
+    A scrollable, sortable table that only draws the rows that are visible.
+    A fixed pool of canvas text items is reused while scrolling, so the cost
+    of drawing does not depend on the number of rows. Click a header to sort.
+    """
+
+    row_height = 20
+    header_height = 22
+
+    def __init__(
+        self, master, columns: list[tuple], pos: tuple[int], size: tuple[int]
+    ) -> None:
+        """
+        Create the table
+
+            Parameters:
+                master (tk.Misc): The window to place the table in
+                columns (list[tuple]): (title, width) or (title, width, formatter)
+                    for every column, the formatter turns a value into text
+                pos (tuple[int]): The position of the table
+                size (tuple[int]): The size of the table, scrollbar included
+        """
+        self.columns = [
+            (column[0], column[1], column[2] if len(column) > 2 else str)
+            for column in columns
+        ]
+        self.rows = []
+        self._positions = None
+        self.first_row = 0
+        self.sort_column = None
+        self.sort_reverse = False
+
+        width, height = size
+        self.visible_rows = max((height - self.header_height) // self.row_height, 1)
+
+        self.canvas = tk.Canvas(
+            master, width=width - 16, height=height, highlightthickness=0
+        )
+        self.canvas.place(x=pos[0], y=pos[1], width=width - 16, height=height)
+        self.scrollbar = ttk.Scrollbar(master, orient="vertical", command=self.yview)
+        self.scrollbar.place(x=pos[0] + width - 16, y=pos[1], width=16, height=height)
+
+        self.cells = []
+        pos_x = 0
+        for index, (title, column_width, _) in enumerate(self.columns):
+            header = self.canvas.create_text(
+                pos_x + 4, 2, text=title, anchor="nw", font="TkHeadingFont"
+            )
+            self.canvas.tag_bind(
+                header, "<Button-1>", lambda _, column=index: self.sort_by(column)
+            )
+            self.cells.append(
+                [
+                    self.canvas.create_text(
+                        pos_x + 4,
+                        self.header_height + row * self.row_height,
+                        text="",
+                        anchor="nw",
+                    )
+                    for row in range(self.visible_rows)
+                ]
+            )
+            pos_x += column_width
+        # The text each cell shows, so redrawing skips the cells that did not change
+        self.texts = [[""] * self.visible_rows for _ in self.columns]
+
+        self.canvas.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda _: self.yview("scroll", -3, "units"))
+        self.canvas.bind("<Button-5>", lambda _: self.yview("scroll", 3, "units"))
+
+    def set_rows(self, rows: list[tuple]) -> None:
+        """
+        Replace the rows of the table, keeping the current sort order
+
+            Parameters:
+                rows (list[tuple]): The rows, one value per column
+        """
+        self.rows = list(rows)
+        self._positions = None
+        if self.sort_column is not None:
+            self._sort()
+        self._scroll_to(self.first_row)
+
+    def update_rows(self, rows: list[tuple]) -> None:
+        """
+        Replace the rows with the same first value and add the new ones,
+        only the cells whose text changed are redrawn
+
+            Parameters:
+                rows (list[tuple]): The changed rows, one value per column
+        """
+        if not rows:
+            return
+        if self._positions is None:
+            self._positions = {row[0]: index for index, row in enumerate(self.rows)}
+        for row in rows:
+            index = self._positions.get(row[0])
+            if index is None:
+                self._positions[row[0]] = len(self.rows)
+                self.rows.append(row)
+            else:
+                self.rows[index] = row
+        if self.sort_column is not None:
+            self._sort()
+        self._scroll_to(self.first_row)
+
+    def sort_by(self, column: int, reverse: bool = None) -> None:
+        """
+        Sort by a column, sorting the same column again reverses the order
+
+            Parameters:
+                column (int): The index of the column
+                reverse (bool): Sort largest first, by default the order only
+                    reverses when the same column is sorted again
+        """
+        if reverse is not None:
+            self.sort_column = column
+            self.sort_reverse = reverse
+        elif self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self._sort()
+        self._scroll_to(0)
+
+    def _sort(self) -> None:
+        self.rows.sort(key=lambda row: row[self.sort_column], reverse=self.sort_reverse)
+        self._positions = None
+
+    def yview(self, *args) -> None:
+        """
+        Scroll the table, takes the arguments a scrollbar passes to its command
+        """
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.visible_rows
+            self._scroll_to(self.first_row + amount)
+
+    def _on_mouse_wheel(self, event) -> None:
+        self.yview("scroll", -3 if event.delta > 0 else 3, "units")
+
+    def _scroll_to(self, first_row: int) -> None:
+        last_first_row = max(len(self.rows) - self.visible_rows, 0)
+        self.first_row = min(max(first_row, 0), last_first_row)
+        self._draw()
+
+    def _draw(self) -> None:
+        for column, (_, _, formatter) in enumerate(self.columns):
+            for offset, cell in enumerate(self.cells[column]):
+                index = self.first_row + offset
+                if index < len(self.rows):
+                    text = formatter(self.rows[index][column])
+                else:
+                    text = ""
+                if self.texts[column][offset] != text:
+                    self.texts[column][offset] = text
+                    self.canvas.itemconfigure(cell, text=text)
+
+        if self.rows:
+            first = self.first_row / len(self.rows)
+            last = min(self.first_row + self.visible_rows, len(self.rows)) / len(self.rows)
+            self.scrollbar.set(first, last)
+        else:
+            self.scrollbar.set(0, 1)
 
 
 class WindowManager:
@@ -52,16 +225,77 @@ class WindowManager:
         """
         self.window.update()
 
-    def add_text(self, text: str, pos: tuple[int]) -> None:
+    def add_text(self, text: str, pos: tuple[int]) -> tk.Label:
         """
         Show text on the main window
 
             Parameters:
                 text (str): The text to show
                 pos (tuple[int]): The position of the text
+
+            Returns:
+                tk.Label: The label showing the text
         """
         label = tk.Label(self.window, text=text)
         label.place(x=pos[0], y=pos[1])
+        return label
+
+    def add_table(
+        self, columns: list[tuple], rows: list[tuple], pos: tuple[int], size: tuple[int]
+    ) -> VirtualTable:
+        """
+        Add a virtualized table to the main window
+
+            Parameters:
+                columns (list[tuple]): (title, width) or (title, width, formatter)
+                    for every column
+                rows (list[tuple]): The rows, one value per column
+                pos (tuple[int]): The position of the table
+                size (tuple[int]): The size of the table
+
+            Returns:
+                VirtualTable: The table
+        """
+        table = VirtualTable(self.window, columns, pos, size)
+        table.set_rows(rows)
+        return table
+
+    def add_live_table(
+        self,
+        columns: list[tuple],
+        poll: callable,
+        pos: tuple[int],
+        size: tuple[int],
+        interval: int = 250,
+    ) -> VirtualTable:
+        """
+        Add a table that polls for changed rows every interval milliseconds
+        until the window is closed
+
+            Parameters:
+                columns (list[tuple]): (title, width) or (title, width, formatter)
+                    for every column
+                poll (callable): Returns the rows that changed since the last
+                    call, matched to the shown rows by their first value
+                pos (tuple[int]): The position of the table
+                size (tuple[int]): The size of the table
+                interval (int): The milliseconds between polls
+
+            Returns:
+                VirtualTable: The table
+        """
+        table = VirtualTable(self.window, columns, pos, size)
+
+        def refresh():
+            try:
+                table.update_rows(poll())
+                self.window.after(interval, refresh)
+            except tk.TclError:
+                # The window was closed
+                pass
+
+        refresh()
+        return table
 
     def add_button(
         self, text: str, pos: tuple[int], size: tuple[int], callback: callable
@@ -0,0 +1,319 @@
+"""
+Buffered background writer for the database
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from db import Database
+from resilience import RateLimitedLogger
+
+_LOG = RateLimitedLogger(logging.getLogger("timetracker.writer"), interval=60.0)
+
+
+class BufferedWriter:
+    """
+    Collects session records on a bounded queue and writes them to the
+    database in batches from a dedicated thread. A batch that fails to
+    write is kept and retried, so a locked or full database never stops the
+    thread. While the database is busy or locked, a merge or a full vacuum
+    holding the write lock for example, the batch is retried with a growing
+    delay for as long as it takes and the bounded queue holds the records
+    that come in meanwhile. Other errors drop the batch after max_retries
+    failures.
+
+        Example
+        -------
+            >>> writer = BufferedWriter(database)
+            >>> writer.start()
+            >>> writer.put(("Safari", start_time, end_time))
+            >>> writer.stop()
+
+        Methods
+        --------
+            >>> start(): Start the writer thread
+            >>> put(record): Queue a record for writing
+            >>> write(batch): Write a batch on the calling thread
+            >>> flush(): Block until every queued record is written
+            >>> stop(): Drain the queue and stop the writer thread
+            >>> stats(): Get the queue and flush counters
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        database: Database,
+        max_batch: int = 100,
+        max_age: float = 5.0,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 30.0,
+        on_written: callable = None,
+    ) -> None:
+        """
+        Create the writer
+
+            Parameters:
+                database (Database): The database to write to
+                max_batch (int): Flush when this many records are buffered
+                max_age (float): Flush when the oldest buffered record is this many seconds old
+                max_queue (int): The maximum number of records waiting on the queue
+                max_retries (int): The number of retries before a batch that
+                    fails to write for another reason than a busy database
+                    is dropped
+                retry_delay (float): The seconds before the first retry of a
+                    batch, doubled for every further retry
+                max_retry_delay (float): The maximum seconds between retries
+                on_written (callable): Called with every batch once it is
+                    committed, on the thread that wrote it
+        """
+        self.database = database
+        self.max_batch = max_batch
+        self.max_age = max_age
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.on_written = on_written
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._stopping = threading.Event()
+
+        self.flush_count = 0
+        self.rows_written = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+        self.write_errors = 0
+        self.rows_dropped = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The number of records waiting on the queue
+        """
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """
+        Start the writer thread
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="BufferedWriter", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, record: tuple) -> None:
+        """
+        Queue a record for writing, blocking while the queue is full
+
+            Parameters:
+                record (tuple): The (application, start_time, end_time) session,
+                    or (None, start_time, end_time, reason) for a gap
+        """
+        self._queue.put(record)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Block until every record queued so far is written, or dropped after
+        failing to write max_retries times for another reason than a busy
+        database
+
+            Parameters:
+                timeout (float): The maximum number of seconds to wait
+
+            Returns:
+                bool: True if the queue was flushed in time
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self.write(self._drain())
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Write every queued record and stop the writer thread
+
+            Parameters:
+                timeout (float): The maximum number of seconds to wait
+        """
+        if self._thread is None:
+            self.write(self._drain())
+            return
+        # Wakes the thread even while it leaves the full queue alone between
+        # retries
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(self._STOP)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        """
+        Get the queue and flush counters
+
+            Returns:
+                dict: The counters
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "flush_count": self.flush_count,
+            "rows_written": self.rows_written,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "avg_flush_latency": (
+                self.total_flush_latency / self.flush_count if self.flush_count else 0.0
+            ),
+            "write_errors": self.write_errors,
+            "rows_dropped": self.rows_dropped,
+        }
+
+    def _drain(self) -> list:
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return batch
+            if isinstance(item, tuple):
+                batch.append(item)
+            elif isinstance(item, threading.Event):
+                item.set()
+
+    @staticmethod
+    def is_busy(error: Exception) -> bool:
+        """
+        Check if a write failed only because another connection holds the
+        database, so the same batch will succeed later
+
+            Parameters:
+                error (Exception): The error raised by the write
+
+            Returns:
+                bool: True for a busy or locked database
+        """
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and (
+            "locked" in message or "busy" in message
+        )
+
+    def _next_retry(self, failures: int) -> float:
+        return min(self.retry_delay * 2 ** (failures - 1), self.max_retry_delay)
+
+    def _write(self, batch: list) -> Exception:
+        if not batch:
+            return None
+        sessions = [record for record in batch if record[0] is not None]
+        gaps = [record[1:] for record in batch if record[0] is None]
+        started = time.perf_counter()
+        try:
+            self.database.add_many(sessions, gaps)
+        except Exception as error:  # pylint: disable=broad-except
+            self.write_errors += 1
+            _LOG.warning(
+                "write_error",
+                error=type(error).__name__,
+                message=str(error),
+                rows=len(batch),
+            )
+            return error
+        latency = time.perf_counter() - started
+
+        self.flush_count += 1
+        self.rows_written += len(sessions)
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self.total_flush_latency += latency
+        if self.on_written is not None:
+            self.on_written(batch)
+        return None
+
+    def write(self, batch: list) -> bool:
+        """
+        Write a batch right away on the calling thread, without the writer
+        thread, for callers that batch the records themselves. The batch is
+        retried like on the writer thread, blocking the caller meanwhile
+
+            Parameters:
+                batch (list): The records to write in one transaction
+
+            Returns:
+                bool: False if the batch was dropped
+        """
+        failures = 0
+        while True:
+            error = self._write(batch)
+            if error is None:
+                return True
+            failures += 1
+            if not self.is_busy(error) and failures > self.max_retries:
+                self.rows_dropped += len(batch)
+                return False
+            time.sleep(self._next_retry(failures))
+
+    def _run(self) -> None:
+        batch = []
+        deadline = None
+        failures = 0
+        waiting = []
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if failures and len(batch) >= self.max_batch:
+                # A full batch waiting for a retry leaves new records on the
+                # bounded queue, so put() blocks instead of the batch growing
+                item = self._STOP if self._stopping.wait(timeout) else None
+            else:
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+            if isinstance(item, tuple):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_age
+                # A full batch is written right away, unless it is waiting
+                # for a retry
+                if len(batch) < self.max_batch or failures:
+                    continue
+            elif item is None and deadline is not None and time.monotonic() < deadline:
+                continue
+            elif isinstance(item, threading.Event):
+                waiting.append(item)
+
+            if item is self._STOP:
+                batch.extend(self._drain())
+                self.write(batch)
+                for event in waiting:
+                    event.set()
+                return
+            error = self._write(batch)
+            if error is None:
+                batch = []
+                deadline = None
+                failures = 0
+            else:
+                failures += 1
+                if not self.is_busy(error) and failures > self.max_retries:
+                    self.rows_dropped += len(batch)
+                    batch = []
+                    deadline = None
+                    failures = 0
+                else:
+                    deadline = time.monotonic() + self._next_retry(failures)
+
+            if not batch:
+                for event in waiting:
+                    event.set()
+                waiting = []